@@ -1,10 +1,54 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Optional, List, Dict
 
 class Settings(BaseSettings):
     # MongoDB settings
     MONGODB_URL: str
     DATABASE_NAME: str
+    MONGODB_MAX_POOL_SIZE: int = 100
+    MONGODB_MIN_POOL_SIZE: int = 10
+    MONGODB_MAX_IDLE_TIME_MS: int = 300000
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS: int = 5000
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    MONGODB_CONNECT_TIMEOUT_MS: int = 5000
+
+    # Logging; LOG_LEVELS sets per-logger levels, e.g. {"pymongo": "WARNING", "app.routes.contacts": "DEBUG"}
+    LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: Dict[str, str] = {}
+    LOG_FORMAT: str = "json"
+    # Debug records allowed per call site per minute, and the fraction of them kept
+    LOG_DEBUG_PER_MINUTE: int = 60
+    LOG_DEBUG_SAMPLE_RATE: float = 1.0
+
+    # Users allowed to see operational endpoints under /api/system
+    ADMIN_EMAILS: List[str] = []
+
+    # Prometheus /metrics; scrapes need "Authorization: Bearer <token>" when a token is set
+    METRICS_TOKEN: Optional[str] = None
+    # Directory shared by the uvicorn workers so any worker's scrape covers all of them
+    METRICS_MULTIPROC_DIR: Optional[str] = None
+    METRICS_FLUSH_SECONDS: int = 15
+
+    # Slow query log
+    SLOW_QUERY_THRESHOLD_MS: float = 100
+    SLOW_QUERY_MAX_SHAPES: int = 500
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE: float = 0.1
+    SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS: int = 600
+    SLOW_QUERY_EXPLAIN_POLL_SECONDS: int = 5
+
+    # Request tracing; a caller's sampled traceparent is only honoured when
+    # TRACING_TRUST_PARENT is set (e.g. behind a gateway that samples)
+    TRACING_SAMPLE_RATE: float = 0.0
+    TRACING_TRUST_PARENT: bool = False
+    TRACING_SERVICE_NAME: str = "muntu-api"
+    TRACING_OTLP_ENDPOINT: Optional[str] = None
+    TRACING_EXPORT_INTERVAL_SECONDS: int = 5
+    TRACING_EXPORT_BATCH_SIZE: int = 200
+
+    # Response compression; brotli is used when the package is installed and the client accepts it
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
 
     # JWT settings
     JWT_SECRET: str
@@ -22,6 +66,95 @@ class Settings(BaseSettings):
     AGENT_EMAIL_ADDRESS: str
     GOOGLE_API_KEY: str
 
+    # Assistant metrics job
+    ASSISTANT_METRICS_INTERVAL_SECONDS: int = 300
+    ASSISTANT_METRICS_SETTLE_SECONDS: int = 30
+    ASSISTANT_METRICS_MAX_WINDOW_HOURS: int = 24
+
+    # Team member metrics job
+    TEAM_METRICS_INTERVAL_SECONDS: int = 300
+    TEAM_METRICS_SETTLE_SECONDS: int = 30
+    TEAM_METRICS_MAX_WINDOW_HOURS: int = 24
+
+    # Conversation assignment routing
+    ROUTING_ORDER: list = ["assistant", "team_member"]
+    ROUTING_TEAM_MEMBER_ROLES: list = ["agent", "admin", "member"]
+    ROUTING_REBUILD_INTERVAL_SECONDS: int = 600
+    # Candidates tried per assignment when other workers have raised their load
+    ROUTING_CLAIM_ATTEMPTS: int = 3
+
+    # Conversation SLAs
+    SLA_FIRST_RESPONSE_MINUTES: int = 60
+    SLA_RESOLUTION_MINUTES: int = 1440
+    SLA_HORIZON_SECONDS: int = 300
+    SLA_REFILL_INTERVAL_SECONDS: int = 60
+
+    # Team invites
+    TEAM_INVITE_EXPIRE_DAYS: int = 7
+    TEAM_INVITE_BATCH_LIMIT: int = 500
+
+    # Organization cache
+    ORGANIZATION_CACHE_SIZE: int = 10000
+    ORGANIZATION_CACHE_TTL_SECONDS: int = 60
+
+    # Channel registry
+    CHANNEL_CACHE_SIZE: int = 10000
+    CHANNEL_CACHE_TTL_SECONDS: int = 60
+    CHANNEL_CACHE_MISS_TTL_SECONDS: int = 10
+
+    # Google endpoints; point these at scripts/fake_gmail_server.py for offline runs
+    GMAIL_API_BASE_URL: str = "https://gmail.googleapis.com/gmail/v1"
+    GOOGLE_TOKEN_URI: str = "https://oauth2.googleapis.com/token"
+    GOOGLE_AUTH_URI: str = "https://accounts.google.com/o/oauth2/auth"
+
+    # Gmail API client
+    GMAIL_HTTP_TIMEOUT_SECONDS: float = 20.0
+    GMAIL_HTTP_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    GMAIL_HTTP_MAX_CONNECTIONS: int = 100
+    GMAIL_HTTP_MAX_ATTEMPTS: int = 3
+    GMAIL_FETCH_CONCURRENCY: int = 10
+
+    # Gmail push notifications and sync
+    GMAIL_PUSH_VERIFICATION_TOKEN: Optional[str] = None
+    GMAIL_SYNC_WORKERS: int = 4
+    GMAIL_SYNC_BATCH_SIZE: int = 50
+
+    # Gmail token refresh
+    GMAIL_TOKEN_SCAN_INTERVAL_SECONDS: int = 60
+    GMAIL_TOKEN_REFRESH_LEAD_SECONDS: int = 600
+    GMAIL_TOKEN_REFRESH_JITTER_SECONDS: int = 300
+    GMAIL_TOKEN_REFRESH_CONCURRENCY: int = 10
+    GMAIL_CREDENTIALS_CACHE_SIZE: int = 10000
+    GMAIL_CREDENTIALS_CACHE_TTL_SECONDS: int = 3600
+
+    # Gmail watch renewal
+    GMAIL_WATCH_SCAN_INTERVAL_SECONDS: int = 300
+    GMAIL_WATCH_RENEW_BEFORE_HOURS: int = 24
+    GMAIL_WATCH_RENEWAL_BATCH: int = 500
+    GMAIL_WATCH_RENEWAL_CONCURRENCY: int = 5
+    GMAIL_WATCH_RENEWALS_PER_SECOND: float = 2.0
+    GMAIL_WATCH_RETRY_BASE_SECONDS: int = 300
+    GMAIL_WATCH_RETRY_MAX_SECONDS: int = 21600
+    GMAIL_WATCH_MAX_FAILURES: int = 5
+
+    # Gmail outbound queue
+    GMAIL_OUTBOUND_WORKERS: int = 4
+    GMAIL_OUTBOUND_POLL_SECONDS: int = 5
+    GMAIL_OUTBOUND_LEASE_SECONDS: int = 120
+    GMAIL_OUTBOUND_MAX_ATTEMPTS: int = 8
+    GMAIL_OUTBOUND_RETRY_BASE_SECONDS: int = 30
+    GMAIL_OUTBOUND_RETRY_MAX_SECONDS: int = 3600
+    GMAIL_QUOTA_UNITS_PER_SECOND: float = 250.0
+
+    # Gmail history backfill
+    GMAIL_BACKFILL_DAYS: int = 90
+    GMAIL_BACKFILL_INTERVAL_SECONDS: int = 30
+    GMAIL_BACKFILL_LEASE_SECONDS: int = 300
+    GMAIL_BACKFILL_PAGE_SIZE: int = 500
+    GMAIL_BACKFILL_CONCURRENCY: int = 20
+    GMAIL_BACKFILL_UNITS_PER_SECOND: float = 200.0
+    GMAIL_BACKFILL_MAX_FAILURES: int = 5
+
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -30,8 +163,3 @@ class Settings(BaseSettings):
         alias_generator = lambda x: x.upper()  # This will look for uppercase env variables
 
 settings = Settings()
-
-# Print debug info on startup
-print("Settings loaded:")
-print(f"JWT_SECRET: {settings.JWT_SECRET[:5]}...")
-print(f"JWT_ALGORITHM: {settings.JWT_ALGORITHM}") 
\ No newline at end of file
@@ -1,42 +1,261 @@
-from motor.motor_asyncio import AsyncIOMotorClient
+from typing import Optional, List
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 from .config import settings
+from .utils.mongo_monitoring import pool_metrics, command_metrics
+from .utils.slow_queries import slow_query_log
+from .utils.tracing import mongo_spans
+import asyncio
 import logging
-from pymongo import IndexModel, ASCENDING
+from pymongo import IndexModel, ASCENDING, DESCENDING
 
 logger = logging.getLogger(__name__)
 
-# Create Motor client
-print(f"Connecting to MongoDB at: {settings.MONGODB_URL}")
-client = AsyncIOMotorClient(settings.MONGODB_URL)
+# Created per worker process by connect(); never at import time, so the
+# server can pre-fork workers without sharing sockets or monitor threads.
+client: Optional[AsyncIOMotorClient] = None
 
-# Get database
-db = client[settings.DATABASE_NAME]
 
-# Test connection
+def connect() -> AsyncIOMotorClient:
+    global client
+    if client is None:
+        logger.info(f"Connecting to MongoDB database {settings.DATABASE_NAME}")
+        client = AsyncIOMotorClient(
+            settings.MONGODB_URL,
+            maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+            minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+            maxIdleTimeMS=settings.MONGODB_MAX_IDLE_TIME_MS,
+            waitQueueTimeoutMS=settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+            serverSelectionTimeoutMS=settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+            connectTimeoutMS=settings.MONGODB_CONNECT_TIMEOUT_MS,
+            event_listeners=[pool_metrics, command_metrics, slow_query_log, mongo_spans]
+        )
+    return client
+
+
+def close():
+    global client
+    if client is not None:
+        client.close()
+        client = None
+
+
+def get_database() -> AsyncIOMotorDatabase:
+    return connect()[settings.DATABASE_NAME]
+
+
+class DatabaseProxy:
+    """Stands in for the database so modules can keep `from ..database import db`.
+
+    Attribute and item access resolve against the current process's client,
+    connecting on first use.
+    """
+
+    def __getattr__(self, name: str):
+        return getattr(get_database(), name)
+
+    def __getitem__(self, name: str):
+        return get_database()[name]
+
+
+db = DatabaseProxy()
+
+# Test connection, open the pool and make sure indexes exist
 async def connect_and_init_db():
     try:
-        await client.admin.command('ping')
-        print("Successfully connected to MongoDB")
+        mongo = connect()
+        # Concurrent pings check out (and so open) minPoolSize connections up front
+        await asyncio.gather(*(
+            mongo.admin.command('ping')
+            for _ in range(max(settings.MONGODB_MIN_POOL_SIZE, 1))
+        ))
+        logger.info("Successfully connected to MongoDB")
     except Exception as e:
-        print(f"Failed to connect to MongoDB: {str(e)}")
+        logger.error(f"Failed to connect to MongoDB: {str(e)}")
         raise e
 
+    # Raises, and so fails startup, only if an index the code relies on is missing
+    await init_db(mongo)
+
+
+async def ensure_indexes(collection, indexes: List[IndexModel], failed: List[str], required: bool = False):
+    """Create each index on its own, so one conflict doesn't skip the rest.
+
+    Failures are logged per index. Names of failed required indexes are
+    added to `failed`.
+    """
+    for index in indexes:
+        name = index.document["name"]
+        try:
+            await collection.create_indexes([index])
+        except Exception as e:
+            logger.error(f"Error creating index {collection.name}.{name}: {str(e)}")
+            if required:
+                failed.append(f"{collection.name}.{name}")
+
+
+async def expire_duplicate_invites(db: AsyncIOMotorDatabase):
+    """Mark all but the newest pending invite per (organization_id, email) expired."""
+    duplicates = db.team_invites.aggregate([
+        {"$match": {"status": "pending"}},
+        {"$sort": {"created_at": -1, "_id": -1}},
+        {"$group": {
+            "_id": {"organization_id": "$organization_id", "email": "$email"},
+            "ids": {"$push": "$_id"}
+        }},
+        {"$match": {"ids.1": {"$exists": True}}}
+    ], allowDiskUse=True)
+    stale = []
+    async for group in duplicates:
+        stale.extend(group["ids"][1:])
+    if stale:
+        result = await db.team_invites.update_many(
+            {"_id": {"$in": stale}, "status": "pending"},
+            {"$set": {"status": "expired"}}
+        )
+        logger.warning(f"Expired {result.modified_count} duplicate pending team invites")
+
+
 async def init_db(client: AsyncIOMotorClient):
-    db = client.muntuai
+    db = client[settings.DATABASE_NAME]
+    # Required indexes enforce uniqueness or expiry that the code depends on
+    # for correctness; the rest only make queries faster
+    failed: List[str] = []
 
-    # Create indexes
-    await db.users.create_indexes([
+    await ensure_indexes(db.users, [
         IndexModel([("email", ASCENDING)], unique=True)
-    ])
-    
-    await db.organizations.create_indexes([
+    ], failed, required=True)
+    await ensure_indexes(db.users, [
+        IndexModel([("organization_id", ASCENDING)])
+    ], failed)
+
+    await ensure_indexes(db.organizations, [
         IndexModel([("owner_id", ASCENDING)], unique=True)
-    ])
-    
-    await db.conversations.create_indexes([
+    ], failed)
+
+    await ensure_indexes(db.conversations, [
         IndexModel([("organization_id", ASCENDING)]),
         IndexModel([("customer_id", ASCENDING)]),
-        IndexModel([("assistant_id", ASCENDING)])
-    ])
-    
-    # Add more indexes as needed 
\ No newline at end of file
+        IndexModel([("assistant_id", ASCENDING)]),
+        IndexModel([("status", ASCENDING)]),
+        IndexModel([("created_at", ASCENDING)]),
+        IndexModel([("assigned_at", ASCENDING)], sparse=True),
+        IndexModel([("resolved_at", ASCENDING)], sparse=True)
+    ], failed)
+    # The SLA refill scans these for every outstanding deadline
+    await ensure_indexes(db.conversations, [
+        IndexModel(
+            [("sla.first_response_due", ASCENDING)],
+            partialFilterExpression={"sla.first_response_pending": True}
+        ),
+        IndexModel(
+            [("sla.resolution_due", ASCENDING)],
+            partialFilterExpression={"sla.resolution_pending": True}
+        )
+    ], failed, required=True)
+
+    await ensure_indexes(db.messages, [
+        IndexModel([("conversation_id", ASCENDING), ("created_at", ASCENDING)]),
+        IndexModel([("sender.type", ASCENDING), ("created_at", ASCENDING)])
+    ], failed)
+
+    # Metric rollups upsert one document per agent and day
+    await ensure_indexes(db.assistant_metrics_daily, [
+        IndexModel([("assistant_id", ASCENDING), ("date", ASCENDING)], unique=True)
+    ], failed, required=True)
+    await ensure_indexes(db.team_member_metrics_daily, [
+        IndexModel([("team_member_id", ASCENDING), ("date", ASCENDING)], unique=True)
+    ], failed, required=True)
+
+    # Invites from before expiry existed would otherwise never be TTL'd, yet
+    # would still hold the (organization_id, email) slot against re-invites
+    try:
+        await db.team_invites.update_many(
+            {"status": "pending", "expires_at": {"$exists": False}},
+            [{"$set": {"expires_at": {"$add": [
+                {"$ifNull": ["$created_at", "$$NOW"]},
+                settings.TEAM_INVITE_EXPIRE_DAYS * 24 * 60 * 60 * 1000
+            ]}}}]
+        )
+    except Exception as e:
+        logger.error(f"Error backfilling invite expiry: {str(e)}")
+
+    # Before invites were unique, every POST /invite added another pending one;
+    # keep the newest per address so the unique index below can be built
+    try:
+        await expire_duplicate_invites(db)
+    except Exception as e:
+        logger.error(f"Error expiring duplicate invites: {str(e)}")
+
+    # Pending invites expire through the TTL monitor and are unique per organization
+    await ensure_indexes(db.team_invites, [
+        IndexModel(
+            [("expires_at", ASCENDING)],
+            expireAfterSeconds=0,
+            partialFilterExpression={"status": "pending"}
+        ),
+        IndexModel(
+            [("organization_id", ASCENDING), ("email", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"status": "pending"}
+        )
+    ], failed, required=True)
+
+    # Gmail ingestion is keyed on Gmail's own ids
+    await ensure_indexes(db.messages, [
+        IndexModel(
+            [("external.message_id", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"external.message_id": {"$exists": True}}
+        )
+    ], failed, required=True)
+    await ensure_indexes(db.conversations, [
+        IndexModel(
+            [("organization_id", ASCENDING), ("external.thread_id", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"external.thread_id": {"$exists": True}}
+        )
+    ], failed, required=True)
+    # Outbound queue: due pending messages and lapsed sending leases
+    await ensure_indexes(db.messages, [
+        IndexModel(
+            [("status", ASCENDING), ("outbound.next_attempt_at", ASCENDING)],
+            partialFilterExpression={"outbound.next_attempt_at": {"$exists": True}}
+        )
+    ], failed)
+    await ensure_indexes(db.customers, [
+        IndexModel([("organization_id", ASCENDING), ("email", ASCENDING)])
+    ], failed)
+
+    # List endpoints sort by, and compute their ETags from, the latest updated_at
+    await ensure_indexes(db.conversations, [
+        IndexModel([("organization_id", ASCENDING), ("updated_at", DESCENDING)]),
+        IndexModel([("organization_id", ASCENDING), ("status", ASCENDING), ("updated_at", DESCENDING)])
+    ], failed)
+    await ensure_indexes(db.contacts, [
+        IndexModel([("organization_id", ASCENDING), ("updated_at", DESCENDING)])
+    ], failed)
+    await ensure_indexes(db.assistants, [
+        IndexModel([("organization_id", ASCENDING), ("updated_at", DESCENDING)])
+    ], failed)
+
+    await ensure_indexes(db.channels, [
+        IndexModel([("type", ASCENDING), ("identifier", ASCENDING), ("status", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("metadata.token_expiry", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("metadata.watch_expiry", ASCENDING)])
+    ], failed)
+
+    # Per-second quota counters shared by the workers
+    await ensure_indexes(db.rate_limits, [
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0)
+    ], failed)
+
+    # One backfill per channel
+    await ensure_indexes(db.gmail_backfills, [
+        IndexModel([("channel_id", ASCENDING)], unique=True)
+    ], failed, required=True)
+    await ensure_indexes(db.gmail_backfills, [
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)])
+    ], failed)
+
+    if failed:
+        raise RuntimeError(f"Required indexes could not be created: {', '.join(failed)}")
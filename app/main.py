@@ -1,25 +1,47 @@
 from fastapi import FastAPI, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.security import OAuth2PasswordBearer
-from .routes import auth, users, organizations, assistants, conversations, customers, catalog, team, products, contacts, integrations
-from .middleware.auth import verify_auth
+from .routes import auth, users, organizations, assistants, conversations, customers, catalog, team, products, contacts, integrations, webhooks, system
+from .middleware.auth import AuthMiddleware
+from .middleware.compression import CompressionMiddleware
+from .middleware.errors import ErrorMiddleware
+from .middleware.metrics import MetricsMiddleware
+from .middleware.tracing import TracingMiddleware
+from .services.assistant_metrics import assistant_metrics_job
+from .services.team_metrics import team_metrics_job
+from .services.assignment_router import assignment_router
+from .services.sla_scheduler import sla_scheduler
+from .services.gmail_service import gmail_service, gmail_token_manager
+from .services.gmail_sync import gmail_sync_worker
+from .services.gmail_watch import gmail_watch_renewer
+from .services.gmail_outbound import gmail_outbound
+from .services.gmail_backfill import gmail_backfill_job
+from .services.metrics_flush import metrics_flush_job
+from .services.slow_query_explainer import slow_query_explainer
+from .services.trace_exporter import trace_exporter
+from .utils.metrics import REGISTRY
+from .utils.logs import setup_logging, shutdown_logging
 from .config import settings
+from . import database
+from contextlib import asynccontextmanager
+import hmac
 from dotenv import load_dotenv
+import asyncio
+import logging
 import os
 from pathlib import Path
 
+setup_logging()
+logger = logging.getLogger(__name__)
+
 # Get the absolute path to the .env file
 env_path = Path(__file__).parent.parent / '.env'
-print(f"Loading environment variables from: {env_path}")
+logger.debug(f"Loading environment variables from: {env_path}")
 
 # Load environment variables
 load_dotenv(dotenv_path=env_path)
-
-# Debug print environment variables
-print("Environment variables loaded:")
-print(f"GOOGLE_CLIENT_ID: {os.getenv('GOOGLE_CLIENT_ID', 'Not found')}")
-print(f"GOOGLE_OAUTH_REDIRECT_URI: {os.getenv('GOOGLE_OAUTH_REDIRECT_URI', 'Not found')}")
+logger.debug(f"GOOGLE_OAUTH_REDIRECT_URI: {os.getenv('GOOGLE_OAUTH_REDIRECT_URI', 'Not found')}")
 
 # Verify required environment variables
 required_vars = [
@@ -39,15 +61,54 @@ oauth2_scheme = OAuth2PasswordBearer(
     description="JWT Bearer token authentication"
 )
 
+# Background jobs, started in every worker; exclusive ones coordinate through leases
+def background_jobs():
+    return [
+        assistant_metrics_job,
+        team_metrics_job,
+        assignment_router,
+        sla_scheduler,
+        gmail_sync_worker,
+        gmail_token_manager,
+        gmail_watch_renewer,
+        gmail_outbound,
+        gmail_backfill_job,
+        metrics_flush_job,
+        slow_query_explainer,
+        trace_exporter
+    ]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Each worker process opens and warms its own Mongo connection pool
+    await database.connect_and_init_db()
+
+    jobs = background_jobs()
+    for job in jobs:
+        job.start()
+
+    yield
+
+    # Uvicorn has stopped accepting requests and drained in-flight ones by now
+    await asyncio.gather(*(job.stop() for job in jobs), return_exceptions=True)
+    await gmail_service.close()
+    database.close()
+    shutdown_logging()
+
 app = FastAPI(
     title="Muntu API",
     description="Muntu AI Customer Service Platform API",
     version="1.0.0",
     docs_url="/docs",
-    openapi_url="/openapi.json"
+    openapi_url="/openapi.json",
+    lifespan=lifespan
 )
 
-# Configure CORS
+# Middleware is plain ASGI; the last one added runs first. Outermost to innermost:
+# tracing, metrics, compression, CORS, error handling, auth. CORS headers are
+# then also added to 401 and 500 responses.
+app.add_middleware(AuthMiddleware)
+app.add_middleware(ErrorMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],
@@ -55,38 +116,9 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-# Error handler for all exceptions
-@app.exception_handler(Exception)
-async def global_exception_handler(request: Request, exc: Exception):
-    print(f"Global error handler: {str(exc)}")
-    return JSONResponse(
-        status_code=500,
-        content={"detail": str(exc)}
-    )
-
-@app.middleware("http")
-async def auth_middleware(request: Request, call_next):
-    # Skip auth for OPTIONS requests
-    if request.method == "OPTIONS":
-        response = await call_next(request)
-        return response
-    
-    # Skip auth for auth routes and docs
-    if request.url.path.startswith("/api/auth/") or request.url.path in ["/docs", "/openapi.json"]:
-        response = await call_next(request)
-        return response
-    
-    try:
-        await verify_auth(request)
-        response = await call_next(request)
-        return response
-    except Exception as e:
-        print(f"Auth middleware error: {str(e)}")
-        return JSONResponse(
-            status_code=401,
-            content={"detail": str(e)}
-        )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
 
 # Include routers with auth dependencies
 app.include_router(
@@ -165,6 +197,29 @@ app.include_router(
     dependencies=[Depends(oauth2_scheme)]
 )
 
+app.include_router(
+    system.router,
+    prefix="/api/system",
+    tags=["System"],
+    dependencies=[Depends(oauth2_scheme)]
+)
+
+# Webhooks authenticate with their own verification tokens
+app.include_router(
+    webhooks.router,
+    prefix="/api/webhooks",
+    tags=["Webhooks"]
+)
+
 @app.get("/")
 async def root():
-    return {"message": "Welcome to Muntu API"} 
\ No newline at end of file
+    return {"message": "Welcome to Muntu API"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Prometheus scrape endpoint."""
+    if settings.METRICS_TOKEN:
+        expected = f"Bearer {settings.METRICS_TOKEN}"
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), expected):
+            return JSONResponse(status_code=401, content={"detail": "Invalid metrics token"})
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,44 @@
+from fastapi.responses import JSONResponse
+from ..utils.tracing import current_request_id
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ErrorMiddleware:
+    """Turns unhandled exceptions into a 500 JSON response.
+
+    Errors are logged with their traceback; clients get a generic message
+    and the request ID to quote, not the exception text. If the response
+    has already started (e.g. a stream failing midway) there is nothing
+    left to replace, so the error is logged and re-raised to drop the
+    connection.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_wrapper(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            logger.exception(f"Unhandled error on {scope['method']} {scope['path']}: {str(e)}")
+            if response_started:
+                raise
+            response = JSONResponse(
+                status_code=500,
+                content={"detail": "Internal server error", "request_id": current_request_id()}
+            )
+            await response(scope, receive, send)
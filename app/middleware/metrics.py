@@ -0,0 +1,44 @@
+import time
+
+from ..utils.metrics import (
+    http_requests_total, http_request_duration_seconds, http_requests_in_flight,
+    current_scope, route_template
+)
+
+
+class MetricsMiddleware:
+    """Counts and times HTTP requests by route template.
+
+    Plain ASGI rather than @app.middleware("http"), so it adds no task or
+    body buffering per request. The router records the matched endpoint in
+    the scope, which is mapped back to its path template.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = current_scope.set(scope)
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec()
+            current_scope.reset(token)
+            method = scope["method"]
+            route = route_template(scope)
+            http_request_duration_seconds.observe(time.perf_counter() - started, (method, route))
+            http_requests_total.inc((method, route, str(status)))
@@ -0,0 +1,46 @@
+from ..utils.metrics import route_template
+from ..utils.tracing import Span, current_trace, start_trace, finish_trace
+
+
+class TracingMiddleware:
+    """Assigns each request an ID and, when sampled, a root span.
+
+    Plain ASGI; the X-Request-ID header is added to the response start
+    message, so streaming bodies pass through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {
+            key.decode("latin-1"): value.decode("latin-1")
+            for key, value in scope["headers"]
+            if key in (b"x-request-id", b"traceparent")
+        }
+        trace = start_trace(headers)
+        request_id_header = (b"x-request-id", trace.request_id.encode("latin-1"))
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [request_id_header]
+                if trace.sampled:
+                    root.set("http.status_code", message["status"])
+            await send(message)
+
+        token = current_trace.set(trace)
+        try:
+            if not trace.sampled:
+                await self.app(scope, receive, send_wrapper)
+                return
+            root = Span(trace, "http.request", "server", {"http.method": scope["method"]})
+            with root:
+                await self.app(scope, receive, send_wrapper)
+                root.set("http.route", route_template(scope))
+            finish_trace(trace, root)
+        finally:
+            current_trace.reset(token)
@@ -24,4 +24,7 @@ class Conversation(ConversationBase):
     id: str
     metrics: ConversationMetrics
     created_at: datetime
-    updated_at: datetime 
\ No newline at end of file
+    updated_at: datetime
+
+class ConversationStatusUpdate(BaseModel):
+    status: str  # active, resolved, pending
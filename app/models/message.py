@@ -16,6 +16,9 @@ class MessageBase(BaseModel):
 
 class Message(MessageBase):
     id: str
-    status: str = "sent"  # sent, delivered, read
+    status: str = "sent"  # pending, sending, sent, failed, delivered, read
     ai_metadata: Optional[Dict] = None  # confidence, verified, verifiedBy
-    created_at: datetime 
\ No newline at end of file
+    created_at: datetime 
+
+class MessageReply(BaseModel):
+    body: str
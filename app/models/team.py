@@ -35,4 +35,11 @@ class TeamInviteBase(BaseModel):
     expires_at: datetime
 
 class TeamInvite(TeamInviteBase):
-    id: str 
\ No newline at end of file
+    id: str
+
+class TeamInviteCreate(BaseModel):
+    email: EmailStr
+    role: str = 'agent'  # 'admin' | 'agent'
+
+class TeamInviteBatch(BaseModel):
+    invites: List[TeamInviteCreate]
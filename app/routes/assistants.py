@@ -1,27 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException, Body, Request
+from fastapi import APIRouter, Depends, HTTPException, Body, Request, Response, Query
 from ..models.assistant import Assistant, AssistantCreate
 from ..utils.auth import get_current_user
+from ..utils.organization import get_current_organization, require_organization
 from ..database import db
-from datetime import datetime
-from typing import Dict
+from ..utils.etag import list_etag, etag_matches, not_modified, set_validators
+from ..services.assistant_metrics import assistant_metrics_job
+from ..services.assignment_router import assignment_router
+from datetime import datetime, timedelta
+from typing import Dict, Optional
 from bson import ObjectId
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 @router.get("/")
-async def get_assistants(current_user: dict = Depends(get_current_user)):
+async def get_assistants(
+    request: Request,
+    response: Response,
+    organization: Optional[dict] = Depends(get_current_organization)
+):
     try:
         # Check if user has an organization
-        if not current_user.get("organization_id"):
+        if not organization:
             return {
                 "assistants": [],
                 "message": "Please complete organization setup in onboarding"
             }
 
+        # The metrics job stamps metrics_updated_at, not updated_at
+        query = {"organization_id": str(organization["_id"])}
+        etag = await list_etag(db.assistants, query, timestamp_fields=("updated_at", "metrics_updated_at"))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        set_validators(response, etag)
+
         # Fetch assistants for the organization
-        assistants = await db.assistants.find({
-            "organization_id": current_user["organization_id"]
-        }).to_list(None)
+        assistants = await db.assistants.find(query).to_list(None)
 
         # Format assistants for response
         formatted_assistants = [
@@ -46,7 +62,7 @@ async def get_assistants(current_user: dict = Depends(get_current_user)):
         return {"assistants": formatted_assistants}
 
     except Exception as e:
-        print(f"Error fetching assistants: {str(e)}")
+        logger.error(f"Error fetching assistants: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/", response_model=Assistant)
@@ -78,10 +94,49 @@ async def create_assistant(
         result = await db.assistants.insert_one(assistant)
         created_assistant = await db.assistants.find_one({"_id": result.inserted_id})
         if created_assistant:
+            assignment_router.register_assistant(created_assistant)
             created_assistant["id"] = str(created_assistant["_id"])
             del created_assistant["_id"]
         return created_assistant
 
     except Exception as e:
-        print(f"Create assistant error: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        logger.error(f"Create assistant error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{assistant_id}/metrics")
+async def get_assistant_metrics(
+    assistant_id: str,
+    organization: dict = Depends(require_organization),
+    days: int = Query(30, ge=1, le=365)
+):
+    try:
+        if not ObjectId.is_valid(assistant_id):
+            raise HTTPException(status_code=404, detail="Assistant not found")
+
+        # Verify assistant exists and belongs to the user's organization
+        assistant = await db.assistants.find_one(
+            {
+                "_id": ObjectId(assistant_id),
+                "organization_id": str(organization["_id"])
+            },
+            projection={"metrics": 1, "metrics_updated_at": 1}
+        )
+        if not assistant:
+            raise HTTPException(status_code=404, detail="Assistant not found")
+
+        # Daily series precomputed by the assistant metrics job
+        start = (datetime.utcnow() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        series = await assistant_metrics_job.get_time_series(assistant_id, start)
+
+        return {
+            "assistant_id": assistant_id,
+            "metrics": assistant.get("metrics", {}),
+            "metrics_updated_at": assistant.get("metrics_updated_at"),
+            "series": series
+        }
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error fetching assistant metrics: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
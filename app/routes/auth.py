@@ -7,6 +7,9 @@ from datetime import datetime, timedelta, timezone
 from typing import Dict
 from ..models.auth import LoginData, SignupData
 from pydantic import ValidationError
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -61,7 +64,7 @@ async def signup(user_data: UserCreate):
             }
         }
     except Exception as e:
-        print(f"Signup error: {str(e)}")
+        logger.error(f"Signup error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/login")
@@ -106,7 +109,7 @@ async def login(login_data: LoginData):
     except HTTPException as he:
         raise he
     except Exception as e:
-        print(f"Login error: {str(e)}")
+        logger.error(f"Login error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/me", response_model=User)
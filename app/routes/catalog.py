@@ -3,6 +3,9 @@ from ..models.catalog import CatalogItem, CatalogItemBase
 from ..utils.auth import get_current_user
 from datetime import datetime
 from fastapi import HTTPException
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -51,5 +54,5 @@ async def create_catalog_item(
         return created_item
 
     except Exception as e:
-        print(f"Create catalog item error: {str(e)}")
+        logger.error(f"Create catalog item error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
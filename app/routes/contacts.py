@@ -1,10 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from ..models.contact import Contact, ContactCreate
 from ..utils.auth import get_current_user
+from ..utils.organization import get_current_organization
 from ..database import db
+from ..utils.etag import list_etag, etag_matches, not_modified, set_validators
 from datetime import datetime
 from bson import ObjectId
-from typing import List
+from typing import List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -14,8 +19,6 @@ async def create_contact(
     current_user: dict = Depends(get_current_user)
 ):
     try:
-        print(f"Received contact data: {contact_data}")
-        
         # Create contact document
         contact_dict = {
             "name": contact_data.name,
@@ -30,46 +33,49 @@ async def create_contact(
             "type": "lead"
         }
         
-        print(f"Prepared contact document: {contact_dict}")
-        
         # Insert contact
         result = await db.contacts.insert_one(contact_dict)
-        print(f"Insert result: {result.inserted_id}")
         
         # Get the created contact
         created_contact = await db.contacts.find_one({"_id": result.inserted_id})
         if created_contact:
             created_contact["id"] = str(created_contact["_id"])
             del created_contact["_id"]
-            print(f"Created contact: {created_contact}")
+            logger.debug(f"Created contact {created_contact['id']}")
             return Contact(**created_contact)
         
         raise HTTPException(status_code=404, detail="Contact not found after creation")
         
     except Exception as e:
         error_msg = f"Error creating contact: {str(e)}"
-        print(error_msg)
-        if hasattr(e, '__dict__'):
-            print(f"Error details: {e.__dict__}")
+        logger.error(error_msg)
         raise HTTPException(
             status_code=422,
             detail=error_msg
         )
 
 @router.get("/")
-async def get_contacts(current_user: dict = Depends(get_current_user)):
+async def get_contacts(
+    request: Request,
+    response: Response,
+    organization: Optional[dict] = Depends(get_current_organization)
+):
     try:
         # Check if user has an organization
-        if not current_user.get("organization_id"):
+        if not organization:
             return {
                 "contacts": [],
                 "message": "Please complete organization setup in onboarding"
             }
 
+        query = {"organization_id": str(organization["_id"])}
+        etag = await list_etag(db.contacts, query)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        set_validators(response, etag)
+
         # Fetch contacts for the organization
-        contacts = await db.contacts.find({
-            "organization_id": current_user["organization_id"]
-        }).to_list(None)
+        contacts = await db.contacts.find(query).to_list(None)
 
         # Format contacts for response
         formatted_contacts = [
@@ -90,5 +96,5 @@ async def get_contacts(current_user: dict = Depends(get_current_user)):
         return {"contacts": formatted_contacts}
 
     except Exception as e:
-        print(f"Error fetching contacts: {str(e)}")
+        logger.error(f"Error fetching contacts: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
@@ -1,27 +1,48 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from ..models.conversation import Conversation, ConversationBase
+from ..models.conversation import Conversation, ConversationBase, ConversationStatusUpdate
+from ..models.message import MessageReply
 from ..utils.auth import get_current_user
+from ..utils.organization import require_organization
 from datetime import datetime
-from fastapi import Request
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
 from ..database import db
+from ..services.assignment_router import assignment_router, OPEN_STATUSES
+from ..services.sla_scheduler import sla_scheduler
+from ..services.conversation_service import open_conversation
+from ..services.gmail_outbound import queue_email_reply
+from ..services.attachments import open_attachment
+from ..utils.etag import list_etag, etag_matches, not_modified, set_validators
 from bson import ObjectId
+from urllib.parse import quote
+from pymongo import ReturnDocument
 from typing import Optional, List, Dict, Union
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 @router.get("/", response_model=list[Conversation])
 async def get_conversations(
-    current_user: dict = Depends(get_current_user),
+    request: Request,
+    response: Response,
+    organization: dict = Depends(require_organization),
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
     status: Optional[str] = None
 ):
     try:
         # Build query filter
-        query = {"organization_id": current_user["organization_id"]}
+        query = {"organization_id": str(organization["_id"])}
         if status:
             query["status"] = status
 
+        etag = await list_etag(db.conversations, query, skip, limit)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        set_validators(response, etag)
+
         # Fetch conversations with pagination
         conversations = await db.conversations.find(query)\
             .sort("updated_at", -1)\
@@ -80,13 +101,13 @@ async def get_conversations(
 
         return transformed_conversations
     except Exception as e:
-        print(f"Error fetching conversations: {str(e)}")
+        logger.error(f"Error fetching conversations: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{conversation_id}/messages")
 async def get_messages(
     conversation_id: str,
-    current_user: dict = Depends(get_current_user),
+    organization: dict = Depends(require_organization),
     before: Optional[str] = None,
     limit: int = Query(50, ge=1, le=100)
 ):
@@ -94,7 +115,7 @@ async def get_messages(
         # Verify conversation exists and user has access
         conversation = await db.conversations.find_one({
             "_id": ObjectId(conversation_id),
-            "organization_id": current_user["organization_id"]
+            "organization_id": str(organization["_id"])
         })
         
         if not conversation:
@@ -117,44 +138,193 @@ async def get_messages(
 
         return messages[::-1]  # Reverse to get chronological order
     except Exception as e:
-        print(f"Error fetching messages: {str(e)}")
+        logger.error(f"Error fetching messages: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/{conversation_id}/messages")
+async def send_message(
+    conversation_id: str,
+    reply: MessageReply,
+    current_user: dict = Depends(get_current_user),
+    organization: dict = Depends(require_organization)
+):
+    """Reply to a conversation. Email replies are queued and sent in the background."""
+    try:
+        if not reply.body.strip():
+            raise HTTPException(status_code=400, detail="Message body is required")
+
+        conversation = await db.conversations.find_one({
+            "_id": ObjectId(conversation_id),
+            "organization_id": str(organization["_id"])
+        })
+        if not conversation:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+
+        sender = {"type": "team", "id": str(current_user["_id"])}
+        if conversation.get("channel", {}).get("type") == "email":
+            # Reply from the mailbox the thread came in on, else the organization's Gmail channel
+            channel_id = conversation.get("external", {}).get("channel_id")
+            if not channel_id:
+                channel = await db.channels.find_one(
+                    {
+                        "businessId": str(organization["_id"]),
+                        "type": "email",
+                        "status": "active",
+                        "metadata.provider": "gmail"
+                    },
+                    projection={"_id": 1}
+                )
+                if not channel:
+                    raise HTTPException(status_code=400, detail="No connected email channel")
+                channel_id = str(channel["_id"])
+            message = await queue_email_reply(conversation, channel_id, sender, reply.body)
+        else:
+            message = {
+                "conversation_id": conversation_id,
+                "sender": sender,
+                "content": {"type": "text", "body": reply.body, "metadata": {}},
+                "status": "sent",
+                "created_at": datetime.utcnow()
+            }
+            result = await db.messages.insert_one(message)
+            message["_id"] = result.inserted_id
+
+        await db.conversations.update_one(
+            {"_id": conversation["_id"]},
+            {"$set": {"updated_at": message["created_at"]}}
+        )
+        await sla_scheduler.on_message(conversation_id, sender["type"], message["created_at"])
+
+        message["id"] = str(message.pop("_id"))
+        message.pop("outbound", None)
+        return message
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Send message error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{conversation_id}/attachments/{file_id}")
+async def download_attachment(
+    conversation_id: str,
+    file_id: str,
+    organization: dict = Depends(require_organization)
+):
+    try:
+        conversation = await db.conversations.find_one(
+            {
+                "_id": ObjectId(conversation_id),
+                "organization_id": str(organization["_id"])
+            },
+            projection={"_id": 1}
+        )
+        message = conversation and await db.messages.find_one(
+            {"conversation_id": conversation_id, "content.attachments.file_id": file_id},
+            projection={"_id": 1}
+        )
+        grid_out = message and await open_attachment(file_id)
+        if not grid_out:
+            raise HTTPException(status_code=404, detail="Attachment not found")
+
+        async def chunks():
+            while True:
+                chunk = await grid_out.readchunk()
+                if not chunk:
+                    break
+                yield chunk
+
+        metadata = grid_out.metadata or {}
+        return StreamingResponse(
+            chunks(),
+            media_type=metadata.get("content_type", "application/octet-stream"),
+            headers={
+                "Content-Disposition": f"attachment; filename*=UTF-8''{quote(grid_out.filename)}",
+                "Content-Length": str(grid_out.length)
+            }
+        )
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Download attachment error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/", response_model=Conversation)
 async def create_conversation(
     conversation_data: ConversationBase,
-    request: Request
+    request: Request,
+    role: Optional[str] = None
 ):
     try:
-        # Create conversation with all required fields
-        conversation = {
-            "organization_id": conversation_data.organization_id,
-            "customer_id": conversation_data.customer_id,
-            "assigned_to": {
-                "assistant_id": conversation_data.assigned_to.get("assistant_id", ""),
-                "team_member_id": conversation_data.assigned_to.get("team_member_id")
-            },
-            "channel": {
-                "type": conversation_data.channel.get("type", ""),
-                "identifier": conversation_data.channel.get("identifier", "")
-            },
-            "status": conversation_data.status or "active",
-            "metrics": {
-                "response_time": 0.0,
-                "resolution_time": 0.0,
-                "customer_satisfaction": None
-            },
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }
+        # Routes, starts SLA timers and inserts the conversation
+        conversation = await open_conversation(
+            conversation_data.organization_id,
+            conversation_data.customer_id,
+            conversation_data.channel,
+            assigned_to=conversation_data.assigned_to,
+            status=conversation_data.status or "active",
+            role=role
+        )
 
-        result = await db.conversations.insert_one(conversation)
-        created_conversation = await db.conversations.find_one({"_id": result.inserted_id})
+        created_conversation = await db.conversations.find_one({"_id": conversation["_id"]})
         if created_conversation:
             created_conversation["id"] = str(created_conversation["_id"])
             del created_conversation["_id"]
         return created_conversation
 
     except Exception as e:
-        print(f"Create conversation error: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        logger.error(f"Create conversation error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.put("/{conversation_id}/status")
+async def update_conversation_status(
+    conversation_id: str,
+    status_data: ConversationStatusUpdate,
+    organization: dict = Depends(require_organization)
+):
+    try:
+        if status_data.status not in ("active", "resolved", "pending"):
+            raise HTTPException(status_code=400, detail="Invalid conversation status")
+
+        now = datetime.utcnow()
+        update = {"$set": {"status": status_data.status, "updated_at": now}}
+        if status_data.status == "resolved":
+            # resolved_at feeds the team metrics job and resolution time
+            update["$set"]["resolved_at"] = now
+        else:
+            update["$unset"] = {"resolved_at": ""}
+
+        previous = await db.conversations.find_one_and_update(
+            {
+                "_id": ObjectId(conversation_id),
+                "organization_id": str(organization["_id"])
+            },
+            update,
+            projection={"status": 1, "assigned_to": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+        if not previous:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+
+        # Keep the routing load table in step with open/closed transitions
+        was_open = previous.get("status") in OPEN_STATUSES
+        is_open = status_data.status in OPEN_STATUSES
+        if was_open and not is_open:
+            await assignment_router.record_release(previous.get("assigned_to"))
+        elif is_open and not was_open:
+            await assignment_router.record_assignment(previous.get("assigned_to"))
+        if was_open != is_open:
+            await sla_scheduler.on_status(conversation_id, status_data.status)
+
+        return {
+            "id": conversation_id,
+            "status": status_data.status,
+            "updated_at": now
+        }
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Update conversation status error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
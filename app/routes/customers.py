@@ -2,6 +2,9 @@ from fastapi import APIRouter, Depends, Request, HTTPException
 from ..models.customer import Customer, CustomerBase
 from ..utils.auth import get_current_user
 from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -37,5 +40,5 @@ async def create_customer(
         return created_customer
 
     except Exception as e:
-        print(f"Create customer error: {str(e)}")
+        logger.error(f"Create customer error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
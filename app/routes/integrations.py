@@ -1,10 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from typing import Optional
-from ..services.gmail_service import gmail_service
+from ..services.gmail_service import gmail_service, gmail_token_manager
+from ..services.gmail_backfill import queue_backfill
+from ..services.channel_registry import channel_registry
 from ..utils.auth import get_current_user
+from ..utils.organization import require_organization
 from ..database import db
 from datetime import datetime
+from bson import ObjectId
 import os
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -14,15 +21,12 @@ async def gmail_connect(current_user: dict = Depends(get_current_user)):
     Initiate Gmail OAuth flow
     """
     try:
-        print(f"Starting Gmail OAuth flow for user: {current_user['email']}")
-        
+        logger.debug(f"Starting Gmail OAuth flow for user: {current_user['_id']}")
+
         # Verify environment variables
         client_id = os.getenv("GOOGLE_CLIENT_ID")
         redirect_uri = os.getenv("GOOGLE_OAUTH_REDIRECT_URI")
         
-        print(f"Using client_id: {client_id[:10]}...")
-        print(f"Using redirect_uri: {redirect_uri}")
-        
         if not client_id or not redirect_uri:
             raise HTTPException(
                 status_code=500,
@@ -40,40 +44,36 @@ async def gmail_connect(current_user: dict = Depends(get_current_user)):
             redirect_uri=redirect_uri
         )
         
-        print(f"Generated auth URL: {auth_url}")
         return {"auth_url": auth_url}
         
     except Exception as e:
-        print(f"Error in gmail_connect: {str(e)}")
+        logger.error(f"Error in gmail_connect: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/email/oauth/callback/gmail")
 async def gmail_callback(
     code: str,
     state: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
+    organization: dict = Depends(require_organization)
 ):
     """
     Handle Gmail OAuth callback
     """
     try:
-        print(f"Received callback with code: {code[:10]}...")  # Debug log
-        
-        # Create flow and fetch token
-        flow = gmail_service.create_oauth_flow(state=state)
-        flow.fetch_token(code=code)
-        credentials = flow.credentials
+        # Exchange the code for tokens
+        credentials = await gmail_service.fetch_credentials(code)
 
         # Get user email using Gmail API
-        service = gmail_service.build_service(credentials)
-        profile = service.users().getProfile(userId='me').execute()
-        email = profile['emailAddress']
+        profile = await gmail_service.client.get_profile(credentials.token)
+        email = profile['emailAddress'].lower()
+
+        logger.debug(f"Gmail OAuth callback for mailbox: {email}")
 
-        print(f"Got email profile for: {email}")  # Debug log
+        organization_id = str(organization["_id"])
 
         # Create or update channel
         channel_data = {
-            "businessId": current_user["organization_id"],
+            "businessId": organization_id,
             "type": "email",
             "identifier": email,
             "status": "active",
@@ -81,8 +81,10 @@ async def gmail_callback(
                 "provider": "gmail",
                 "access_token": credentials.token,
                 "refresh_token": credentials.refresh_token,
-                "token_expiry": credentials.expiry.isoformat(),
-                "watch_active": False
+                "token_expiry": credentials.expiry,
+                "watch_active": False,
+                # Due immediately, so the renewal job retries if the watch below fails
+                "watch_expiry": datetime.utcnow()
             },
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow()
@@ -90,7 +92,7 @@ async def gmail_callback(
 
         # Check if channel already exists
         existing_channel = await db.channels.find_one({
-            "businessId": current_user["organization_id"],
+            "businessId": organization_id,
             "type": "email",
             "identifier": email
         })
@@ -106,15 +108,29 @@ async def gmail_callback(
                 }}
             )
             channel_id = str(existing_channel["_id"])
-            print(f"Updated existing channel: {channel_id}")  # Debug log
+            gmail_token_manager.invalidate(channel_id)
+            logger.info(f"Reconnected Gmail channel: {channel_id}")
         else:
             # Create new channel
             result = await db.channels.insert_one(channel_data)
             channel_id = str(result.inserted_id)
-            print(f"Created new channel: {channel_id}")  # Debug log
+            logger.info(f"Created Gmail channel: {channel_id}")
 
-        # Set up Gmail watch
-        await gmail_service.setup_watch(channel_id)
+        # Also drops a cached "no such mailbox" left by earlier notifications
+        channel_registry.invalidate(channel_id, "email", email)
+
+        # Set up Gmail watch; on failure the renewal job picks the channel up
+        try:
+            await gmail_service.setup_watch(channel_id)
+        except Exception as e:
+            logger.warning(f"Watch setup failed for channel {channel_id}, will retry: {str(e)}")
+
+        # Import recent mail in the background
+        await queue_backfill({
+            "_id": channel_id,
+            "businessId": organization_id,
+            "identifier": email
+        })
 
         return {
             "success": True,
@@ -123,30 +139,32 @@ async def gmail_callback(
         }
 
     except Exception as e:
-        print(f"Error in gmail_callback: {str(e)}")  # Debug log
+        logger.error(f"Error in gmail_callback: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/gmail/disconnect/{channel_id}")
 async def gmail_disconnect(
     channel_id: str,
-    current_user: dict = Depends(get_current_user)
+    organization: dict = Depends(require_organization)
 ):
     """
     Disconnect Gmail integration
     """
     try:
         # Get channel
-        channel = await db.channels.find_one({"_id": channel_id})
+        if not ObjectId.is_valid(channel_id):
+            raise HTTPException(status_code=404, detail="Channel not found")
+        channel = await db.channels.find_one({"_id": ObjectId(channel_id)})
         if not channel:
             raise HTTPException(status_code=404, detail="Channel not found")
 
         # Verify ownership
-        if channel["businessId"] != current_user["organization_id"]:
+        if channel["businessId"] != str(organization["_id"]):
             raise HTTPException(status_code=403, detail="Not authorized")
 
         # Update channel status
         await db.channels.update_one(
-            {"_id": channel_id},
+            {"_id": channel["_id"]},
             {
                 "$set": {
                     "status": "inactive",
@@ -155,7 +173,12 @@ async def gmail_disconnect(
             }
         )
 
+        gmail_token_manager.invalidate(channel_id)
+        channel_registry.invalidate(channel_id, channel["type"], channel["identifier"])
+
         return {"success": True}
 
+    except HTTPException as he:
+        raise he
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
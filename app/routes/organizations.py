@@ -2,11 +2,15 @@ from fastapi import APIRouter, Depends, HTTPException, Body, Request
 from ..models.organization import Organization, OrganizationBase
 from ..models.business import Business, BusinessCreate
 from ..utils.auth import get_current_user
+from ..utils.organization import get_current_organization as current_organization, invalidate_organization
 from ..database import db
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Optional
 from bson import ObjectId
 from ..models.user import UserCreate
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -16,11 +20,9 @@ async def get_organizations(current_user: dict = Depends(get_current_user)):
     return [] 
 
 @router.get("/current")
-async def get_current_organization(current_user: dict = Depends(get_current_user)):
+async def get_current_organization(organization: Optional[dict] = Depends(current_organization)):
     try:
-        # Find organization by owner_id instead of organization_id
-        organization = await db.organizations.find_one({"owner_id": current_user["_id"]})
-        
+        # Resolved (and cached) from ownership or membership
         if not organization:
             return {
                 "message": "Organization not found. Please complete onboarding.",
@@ -47,7 +49,7 @@ async def get_current_organization(current_user: dict = Depends(get_current_user
             "needs_onboarding": False
         }
     except Exception as e:
-        print(f"Error fetching organization: {str(e)}")
+        logger.error(f"Error fetching organization: {str(e)}")
         return {
             "message": f"Error fetching organization: {str(e)}",
             "organization": None,
@@ -57,9 +59,8 @@ async def get_current_organization(current_user: dict = Depends(get_current_user
 @router.post("/")
 async def create_organization(org_data: dict, current_user: dict = Depends(get_current_user)):
     try:
-        print(f"Received organization data: {org_data}")
-        print(f"Current user: {current_user}")
-        
+        logger.debug(f"Creating organization for user {current_user['_id']}")
+
         # Validate required fields
         required_fields = ["name", "industry", "business_type", "size"]
         missing_fields = [field for field in required_fields if not org_data.get(field)]
@@ -72,7 +73,6 @@ async def create_organization(org_data: dict, current_user: dict = Depends(get_c
         # Check if user already has an organization
         existing_org = await db.organizations.find_one({"owner_id": current_user["_id"]})
         if existing_org:
-            print(f"User already has organization: {existing_org}")
             raise HTTPException(
                 status_code=400,
                 detail="User already has an organization"
@@ -94,14 +94,13 @@ async def create_organization(org_data: dict, current_user: dict = Depends(get_c
             "updated_at": now,
             "owner_id": current_user["_id"]
         }
-        
-        print(f"Attempting to create organization: {organization}")
 
         try:
             # Insert organization
             result = await db.organizations.insert_one(organization)
             organization_id = str(result.inserted_id)
-            print(f"Organization created successfully with ID: {organization_id}")
+            logger.info(f"Organization created with ID: {organization_id}")
+            invalidate_organization(user_id=str(current_user["_id"]))
 
             # Return the created organization in the same format as get_current_organization
             return {
@@ -122,36 +121,33 @@ async def create_organization(org_data: dict, current_user: dict = Depends(get_c
                 "needs_onboarding": False
             }
         except Exception as db_error:
-            print(f"Database error: {str(db_error)}")
-            print(f"Error type: {type(db_error)}")
-            import traceback
-            print(f"Traceback: {traceback.format_exc()}")
+            logger.exception(f"Database error creating organization: {str(db_error)}")
             raise HTTPException(status_code=500, detail=f"Database error: {str(db_error)}")
 
     except HTTPException as he:
         # Re-raise HTTP exceptions
         raise he
     except Exception as e:
-        print(f"Error creating organization: {str(e)}")
-        print(f"Error type: {type(e)}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception(f"Error creating organization: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/current")
 async def update_organization(
     org_data: dict,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    organization: Optional[dict] = Depends(current_organization)
 ):
     try:
-        # Find organization by owner_id
-        organization = await db.organizations.find_one({"owner_id": current_user["_id"]})
         if not organization:
             raise HTTPException(
                 status_code=404,
                 detail="No organization found. Please complete onboarding."
             )
 
+        # Only the owner can change the organization profile
+        if organization.get("owner_id") != current_user["_id"]:
+            raise HTTPException(status_code=403, detail="Not authorized")
+
         # Update organization
         update_data = {
             "name": org_data.get("name"),
@@ -170,15 +166,18 @@ async def update_organization(
         update_data = {k: v for k, v in update_data.items() if v is not None}
 
         result = await db.organizations.update_one(
-            {"owner_id": current_user["_id"]},
+            {"_id": organization["_id"]},
             {"$set": update_data}
         )
+        invalidate_organization(organization_id=str(organization["_id"]))
 
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Organization not found")
 
         return {"message": "Organization updated successfully"}
 
+    except HTTPException as he:
+        raise he
     except Exception as e:
-        print(f"Error updating organization: {str(e)}")
+        logger.error(f"Error updating organization: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
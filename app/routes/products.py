@@ -4,6 +4,9 @@ from ..utils.auth import get_current_user
 from ..database import db
 from datetime import datetime
 from bson import ObjectId
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -48,5 +51,5 @@ async def create_product(
         return created_product
 
     except Exception as e:
-        print(f"Create product error: {str(e)}")
+        logger.error(f"Create product error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
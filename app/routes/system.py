@@ -0,0 +1,30 @@
+from typing import Literal
+from fastapi import APIRouter, Depends, Query
+from ..config import settings
+from ..utils.auth import require_admin
+from ..utils.mongo_monitoring import pool_metrics
+from ..utils.slow_queries import slow_query_log
+
+router = APIRouter()
+
+@router.get("/db-pool")
+async def get_db_pool_metrics(current_user: dict = Depends(require_admin)):
+    """Mongo connection pool statistics for the worker serving this request."""
+    return pool_metrics.snapshot()
+
+@router.get("/slow-queries")
+async def get_slow_queries(
+    limit: int = Query(20, ge=1, le=500),
+    sort: Literal["total_ms", "max_ms", "mean_ms", "count"] = "total_ms",
+    current_user: dict = Depends(require_admin)
+):
+    """Slowest query shapes seen by the worker serving this request, with sampled explain plans."""
+    return {
+        "threshold_ms": settings.SLOW_QUERY_THRESHOLD_MS,
+        "shapes": slow_query_log.top(limit, sort)
+    }
+
+@router.delete("/slow-queries")
+async def reset_slow_queries(current_user: dict = Depends(require_admin)):
+    slow_query_log.reset()
+    return {"message": "Slow query log cleared"}
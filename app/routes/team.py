@@ -1,26 +1,55 @@
-from fastapi import APIRouter, Depends, HTTPException
-from ..models.team import TeamMember, TeamInvite
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from ..models.team import TeamMember, TeamInvite, TeamInviteCreate, TeamInviteBatch
 from ..utils.auth import get_current_user
+from ..utils.organization import get_current_organization, require_organization
 from ..database import db
-from typing import List
-from datetime import datetime
+from ..config import settings
+from ..utils.etag import list_etag, etag_matches, not_modified, set_validators
+from ..services.team_metrics import DEFAULT_METRICS
+from typing import List, Optional
+from datetime import datetime, timedelta
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError, BulkWriteError
+import logging
+
+logger = logging.getLogger(__name__)
+
+INVITE_ROLES = ["admin", "agent"]
+DUPLICATE_KEY_ERROR = 11000
 
 router = APIRouter()
 
 @router.get("/members")
-async def get_team_members(current_user: dict = Depends(get_current_user)):
+async def get_team_members(
+    request: Request,
+    response: Response,
+    organization: Optional[dict] = Depends(get_current_organization)
+):
     try:
         # Check if user has an organization
-        if not current_user.get("organization_id"):
+        if not organization:
             return {
                 "members": [],
                 "message": "Please complete organization setup in onboarding"
             }
 
-        members = await db.users.find({
-            "organization_id": current_user["organization_id"]
-        }).to_list(None)
+        # Metrics are precomputed by the team metrics job, which stamps metrics_updated_at
+        query = {"organization_id": str(organization["_id"])}
+        etag = await list_etag(db.users, query, timestamp_fields=("updated_at", "metrics_updated_at"))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        set_validators(response, etag)
+
+        members = await db.users.find(
+            query,
+            projection={
+                "email": 1,
+                "first_name": 1,
+                "last_name": 1,
+                "role": 1,
+                "metrics": 1
+            }
+        ).to_list(None)
 
         return {
             "members": [
@@ -29,27 +58,31 @@ async def get_team_members(current_user: dict = Depends(get_current_user)):
                     "email": member["email"],
                     "first_name": member.get("first_name", ""),
                     "last_name": member.get("last_name", ""),
-                    "role": member.get("role", "member")
+                    "role": member.get("role", "member"),
+                    "metrics": {**DEFAULT_METRICS, **member.get("metrics", {})}
                 }
                 for member in members
             ]
         }
     except Exception as e:
-        print(f"Error fetching team members: {str(e)}")
+        logger.error(f"Error fetching team members: {str(e)}")
         return {"members": [], "error": str(e)}
 
 @router.get("/invites")
-async def get_team_invites(current_user: dict = Depends(get_current_user)):
+async def get_team_invites(organization: Optional[dict] = Depends(get_current_organization)):
     try:
         # Check if user has an organization
-        if not current_user.get("organization_id"):
+        if not organization:
             return {
                 "invites": [],
                 "message": "Please complete organization setup in onboarding"
             }
 
+        # The TTL monitor runs about once a minute, so also filter on expiry
         invites = await db.team_invites.find({
-            "organization_id": current_user["organization_id"]
+            "organization_id": str(organization["_id"]),
+            "status": "pending",
+            "expires_at": {"$gt": datetime.utcnow()}
         }).to_list(None)
 
         return {
@@ -57,44 +90,125 @@ async def get_team_invites(current_user: dict = Depends(get_current_user)):
                 {
                     "id": str(invite["_id"]),
                     "email": invite["email"],
+                    "role": invite.get("role", "agent"),
                     "status": invite["status"],
-                    "created_at": invite["created_at"]
+                    "created_at": invite["created_at"],
+                    "expires_at": invite["expires_at"]
                 }
                 for invite in (invites or [])
             ]
         }
     except Exception as e:
-        print(f"Error fetching team invites: {str(e)}")
+        logger.error(f"Error fetching team invites: {str(e)}")
         return {"invites": [], "error": str(e)}
 
+def _build_invite(invite_data: TeamInviteCreate, organization: dict, current_user: dict, now: datetime) -> dict:
+    if invite_data.role not in INVITE_ROLES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid role for {invite_data.email}: {invite_data.role}"
+        )
+
+    return {
+        "email": invite_data.email.lower(),
+        "role": invite_data.role,
+        "organization_id": str(organization["_id"]),
+        "invited_by": str(current_user["_id"]),
+        "status": "pending",
+        "created_at": now,
+        "expires_at": now + timedelta(days=settings.TEAM_INVITE_EXPIRE_DAYS)
+    }
+
 @router.post("/invite")
 async def invite_team_member(
-    invite_data: dict,
-    current_user: dict = Depends(get_current_user)
+    invite_data: TeamInviteCreate,
+    current_user: dict = Depends(get_current_user),
+    organization: dict = Depends(require_organization)
 ):
     try:
-        # Check if user has an organization
-        if not current_user.get("organization_id"):
+        # Create invite
+        invite = _build_invite(invite_data, organization, current_user, datetime.utcnow())
+
+        try:
+            result = await db.team_invites.insert_one(invite)
+        except DuplicateKeyError:
+            raise HTTPException(
+                status_code=409,
+                detail=f"A pending invitation already exists for {invite['email']}"
+            )
+        
+        return {
+            "id": str(result.inserted_id),
+            "message": f"Invitation sent to {invite['email']}"
+        }
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error creating team invite: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/invites/batch")
+async def invite_team_members(
+    batch_data: TeamInviteBatch,
+    current_user: dict = Depends(get_current_user),
+    organization: dict = Depends(require_organization)
+):
+    try:
+        if not batch_data.invites:
+            raise HTTPException(status_code=400, detail="No invites provided")
+
+        if len(batch_data.invites) > settings.TEAM_INVITE_BATCH_LIMIT:
             raise HTTPException(
                 status_code=400,
-                detail="Please complete organization setup in onboarding"
+                detail=f"At most {settings.TEAM_INVITE_BATCH_LIMIT} invites per batch"
             )
 
-        # Create invite
-        invite = {
-            "email": invite_data["email"],
-            "organization_id": current_user["organization_id"],
-            "invited_by": str(current_user["_id"]),
-            "status": "pending",
-            "created_at": datetime.utcnow()
-        }
+        # Validate everything up front and drop repeats within the batch
+        now = datetime.utcnow()
+        invites = []
+        seen = set()
+        duplicates = []
+        for invite_data in batch_data.invites:
+            invite = _build_invite(invite_data, organization, current_user, now)
+            if invite["email"] in seen:
+                duplicates.append(invite["email"])
+                continue
+            seen.add(invite["email"])
+            invites.append(invite)
+
+        # One round trip; the unique index rejects emails that already have a pending invite
+        inserted_ids = {}
+        try:
+            result = await db.team_invites.insert_many(invites, ordered=False)
+            inserted_ids = dict(enumerate(result.inserted_ids))
+        except BulkWriteError as bwe:
+            failed = set()
+            for error in bwe.details.get("writeErrors", []):
+                if error.get("code") != DUPLICATE_KEY_ERROR:
+                    raise
+                failed.add(error["index"])
+                duplicates.append(invites[error["index"]]["email"])
+            inserted_ids = {
+                index: invite["_id"]
+                for index, invite in enumerate(invites)
+                if index not in failed
+            }
 
-        result = await db.team_invites.insert_one(invite)
-        
         return {
-            "id": str(result.inserted_id),
-            "message": f"Invitation sent to {invite_data['email']}"
+            "invites": [
+                {
+                    "id": str(inserted_ids[index]),
+                    "email": invites[index]["email"],
+                    "role": invites[index]["role"],
+                    "expires_at": invites[index]["expires_at"]
+                }
+                for index in sorted(inserted_ids)
+            ],
+            "duplicates": duplicates,
+            "message": f"Invitations sent to {len(inserted_ids)} of {len(batch_data.invites)} addresses"
         }
+    except HTTPException as he:
+        raise he
     except Exception as e:
-        print(f"Error creating team invite: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        logger.error(f"Error creating team invites: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
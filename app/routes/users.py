@@ -5,6 +5,9 @@ from ..database import db
 from datetime import datetime
 from typing import Dict
 from bson import ObjectId
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -32,9 +35,10 @@ async def update_user_profile(
         }
         
         if update_data:
+            # Team member lists revalidate against updated_at
             result = await db.users.update_one(
                 {"_id": current_user["_id"]},
-                {"$set": update_data}
+                {"$set": {**update_data, "updated_at": datetime.utcnow()}}
             )
             
             if not result.modified_count:
@@ -66,5 +70,5 @@ async def update_user_profile(
             
         return updated_user
     except Exception as e:
-        print(f"Update profile error: {str(e)}")
+        logger.error(f"Update profile error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
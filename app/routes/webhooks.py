@@ -0,0 +1,32 @@
+from fastapi import APIRouter, HTTPException, Request, Response
+from typing import Optional
+from ..services.gmail_sync import gmail_sync_worker
+from ..config import settings
+import base64
+import hmac
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+@router.post("/gmail", status_code=204)
+async def gmail_push(request: Request, token: Optional[str] = None):
+    """
+    Receive Gmail Pub/Sub push notifications
+    """
+    expected = settings.GMAIL_PUSH_VERIFICATION_TOKEN
+    if not expected or not token or not hmac.compare_digest(token, expected):
+        raise HTTPException(status_code=403, detail="Invalid verification token")
+
+    # Always acknowledge: Pub/Sub redelivers anything that isn't a 2xx, and
+    # the sync itself runs in the background
+    try:
+        envelope = await request.json()
+        data = json.loads(base64.b64decode(envelope["message"]["data"]))
+        gmail_sync_worker.notify(data["emailAddress"], data.get("historyId"))
+    except Exception as e:
+        logger.warning(f"Ignoring malformed Gmail notification: {str(e)}")
+
+    return Response(status_code=204)
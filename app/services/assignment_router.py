@@ -0,0 +1,335 @@
+from typing import Optional, Dict, Any, List, Tuple, Set
+import asyncio
+import heapq
+import itertools
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from ..database import db
+from ..config import settings
+from .scheduler import PeriodicJob
+
+OPEN_STATUSES = ["active", "pending"]
+ANY = "*"
+
+AgentKey = Tuple[str, str]  # (kind, id)
+PoolKey = Tuple[str, str, str, str]  # (organization_id, kind, channel, role)
+
+
+class Agent:
+    __slots__ = ("kind", "id", "organization_id", "channels", "role", "open_count", "version")
+
+    def __init__(self, kind: str, id: str, organization_id: str, channels: List[str], role: str, open_count: int = 0):
+        self.kind = kind
+        self.id = id
+        self.organization_id = organization_id
+        self.channels = channels
+        self.role = role
+        self.open_count = open_count
+        self.version = 0
+
+    @property
+    def key(self) -> AgentKey:
+        return (self.kind, self.id)
+
+    def pools(self) -> List[PoolKey]:
+        """Every pool this agent can be picked from."""
+        # Team members can take any channel; assistants only the ones they are set up for
+        channels = [ANY] if self.kind == "team_member" else list(self.channels) + [ANY]
+        roles = [self.role, ANY] if self.role else [ANY]
+        return [
+            (self.organization_id, self.kind, channel, role)
+            for channel in channels
+            for role in roles
+        ]
+
+
+class LoadTable:
+    """Open-conversation counts per agent, kept in one min-heap per eligibility pool.
+
+    Heap entries are (open_count, seq, version, agent). Changing an agent's
+    load bumps its version and pushes fresh entries, so older entries become
+    stale and are discarded lazily when they reach the top. Picking and
+    updating an agent are both O(log n) in the size of the pool.
+    """
+
+    def __init__(self):
+        self.agents: Dict[AgentKey, Agent] = {}
+        self.pools: Dict[PoolKey, List[list]] = {}
+        self.members: Dict[PoolKey, Set[AgentKey]] = {}
+        self._seq = itertools.count()
+
+    def _push(self, agent: Agent):
+        for pool in agent.pools():
+            heap = self.pools.setdefault(pool, [])
+            heapq.heappush(heap, [agent.open_count, next(self._seq), agent.version, agent])
+            # Rebuild heaps that are mostly stale entries
+            if len(heap) > 2 * len(self.members.get(pool, ())) + 16:
+                self._compact(pool)
+
+    def _compact(self, pool: PoolKey):
+        heap = [
+            [agent.open_count, next(self._seq), agent.version, agent]
+            for agent in (self.agents[key] for key in self.members.get(pool, ()) if key in self.agents)
+        ]
+        heapq.heapify(heap)
+        self.pools[pool] = heap
+
+    def add(self, agent: Agent):
+        existing = self.agents.get(agent.key)
+        if existing:
+            # Keep the tracked load when an agent's settings change
+            agent.open_count = existing.open_count
+            self.remove(existing.key)
+        self.agents[agent.key] = agent
+        for pool in agent.pools():
+            self.members.setdefault(pool, set()).add(agent.key)
+        self._push(agent)
+
+    def remove(self, key: AgentKey):
+        agent = self.agents.pop(key, None)
+        if not agent:
+            return
+        agent.version += 1
+        for pool in agent.pools():
+            self.members.get(pool, set()).discard(key)
+
+    def adjust(self, key: AgentKey, delta: int):
+        agent = self.agents.get(key)
+        if not agent:
+            return
+        agent.open_count = max(0, agent.open_count + delta)
+        agent.version += 1
+        self._push(agent)
+
+    def least_loaded(self, pool: PoolKey) -> Optional[Agent]:
+        heap = self.pools.get(pool)
+        while heap:
+            open_count, _, version, agent = heap[0]
+            if self.agents.get(agent.key) is agent and agent.version == version:
+                return agent
+            heapq.heappop(heap)
+        return None
+
+
+def load_id(key: AgentKey) -> str:
+    return f"{key[0]}:{key[1]}"
+
+
+class AssignmentRouter(PeriodicJob):
+    """Assigns new conversations to the least-loaded eligible agent.
+
+    Every worker routes, so the authoritative load is a per-agent counter
+    in `routing_load` that all of them update. The in-memory table is this
+    worker's view of those counts and only picks the candidate: a pick is
+    taken with a conditional `$inc` that fails if other workers have since
+    given the agent more conversations, in which case the table catches up
+    and the next candidate is tried. A periodic rebuild recounts open
+    conversations, correcting both the table and the counters. Only one
+    rebuild runs at a time, and changes made while it reads Mongo are
+    replayed onto the new table before it is swapped in.
+    """
+
+    name = "assignment_router"
+    exclusive = False
+
+    def __init__(self):
+        super().__init__(interval=settings.ROUTING_REBUILD_INTERVAL_SECONDS)
+        self.table = LoadTable()
+        self._ready = asyncio.Event()
+        self._rebuild_lock = asyncio.Lock()
+        # Changes made to the live table while a rebuild is reading Mongo
+        self._pending: Optional[List[Tuple[str, Any, int]]] = None
+
+    async def run_once(self):
+        await self.rebuild()
+
+    async def rebuild(self):
+        """Reload agents and their open conversation counts from Mongo."""
+        async with self._rebuild_lock:
+            await self._rebuild()
+
+    async def _ensure_ready(self):
+        if self._ready.is_set():
+            return
+        # Requests arriving before the first rebuild share it instead of each running one
+        async with self._rebuild_lock:
+            if not self._ready.is_set():
+                await self._rebuild()
+
+    async def _rebuild(self):
+        self._pending = []
+        try:
+            table = await self._load_table()
+            await self._publish_loads(table)
+            # A replayed change whose write the count already saw is counted
+            # twice until the next rebuild; dropping it would be off until then too
+            for op, arg, delta in self._pending:
+                if op == "add":
+                    table.add(arg)
+                else:
+                    table.adjust(arg, delta)
+            # No await since the replay, so the swap sees every change
+            self.table = table
+            self._ready.set()
+        finally:
+            self._pending = None
+
+    async def _load_table(self) -> LoadTable:
+        table = LoadTable()
+
+        async for assistant in db.assistants.find(
+            {"is_active": {"$ne": False}, "status": {"$ne": "inactive"}},
+            projection={"organization_id": 1, "channels": 1, "role": 1}
+        ):
+            if assistant.get("organization_id"):
+                table.add(self._assistant_agent(assistant))
+
+        async for member in db.users.find(
+            {
+                "organization_id": {"$exists": True},
+                "role": {"$in": settings.ROUTING_TEAM_MEMBER_ROLES},
+                "status": {"$ne": "inactive"}
+            },
+            projection={"organization_id": 1, "role": 1}
+        ):
+            if member.get("organization_id"):
+                table.add(Agent(
+                    "team_member",
+                    str(member["_id"]),
+                    member["organization_id"],
+                    [],
+                    member.get("role", "")
+                ))
+
+        counts = db.conversations.aggregate([
+            {"$match": {"status": {"$in": OPEN_STATUSES}}},
+            {"$group": {
+                "_id": {
+                    "assistant_id": "$assigned_to.assistant_id",
+                    "team_member_id": "$assigned_to.team_member_id"
+                },
+                "open": {"$sum": 1}
+            }}
+        ])
+        async for row in counts:
+            for key in self._agent_keys(row["_id"]):
+                table.adjust(key, row["open"])
+        return table
+
+    async def _publish_loads(self, table: LoadTable):
+        """Reset the shared counters to a fresh count.
+
+        Changes other workers make between the count and this write are
+        lost until the next rebuild, like any other drift.
+        """
+        ops = [
+            UpdateOne({"_id": load_id(key)}, {"$set": {"open": agent.open_count}}, upsert=True)
+            for key, agent in table.agents.items()
+        ]
+        if ops:
+            await db.routing_load.bulk_write(ops, ordered=False)
+
+    async def _claim(self, agent: Agent) -> bool:
+        """Count a conversation against `agent` unless it has more than this worker knows of."""
+        expected = agent.open_count
+        try:
+            await db.routing_load.update_one(
+                {"_id": load_id(agent.key), "open": {"$lte": expected}},
+                {"$inc": {"open": 1}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # The counter exists but is higher: other workers assigned to this agent
+            shared = await db.routing_load.find_one({"_id": load_id(agent.key)})
+            if shared and shared.get("open", 0) > agent.open_count:
+                self.table.adjust(agent.key, shared["open"] - agent.open_count)
+            return False
+
+    async def _shared_adjust(self, key: AgentKey, delta: int):
+        query: Dict[str, Any] = {"_id": load_id(key)}
+        if delta < 0:
+            query["open"] = {"$gte": -delta}
+        await db.routing_load.update_one(query, {"$inc": {"open": delta}}, upsert=delta > 0)
+
+    def _add(self, agent: Agent):
+        self.table.add(agent)
+        if self._pending is not None:
+            self._pending.append(("add", agent, 0))
+
+    def _adjust(self, key: AgentKey, delta: int):
+        self.table.adjust(key, delta)
+        if self._pending is not None:
+            self._pending.append(("adjust", key, delta))
+
+    def _assistant_agent(self, assistant: Dict[str, Any]) -> Agent:
+        return Agent(
+            "assistant",
+            str(assistant["_id"]),
+            assistant["organization_id"],
+            assistant.get("channels") or [],
+            assistant.get("role", "")
+        )
+
+    def _agent_keys(self, assigned_to: Optional[Dict[str, Any]]) -> List[AgentKey]:
+        assigned_to = assigned_to or {}
+        keys = []
+        if assigned_to.get("assistant_id"):
+            keys.append(("assistant", assigned_to["assistant_id"]))
+        if assigned_to.get("team_member_id"):
+            keys.append(("team_member", assigned_to["team_member_id"]))
+        return keys
+
+    def register_assistant(self, assistant: Dict[str, Any]):
+        """Make a newly created or updated assistant available for routing."""
+        if assistant.get("is_active", True) and assistant.get("organization_id"):
+            self._add(self._assistant_agent(assistant))
+
+    async def assign(
+        self,
+        organization_id: str,
+        channel_type: str = "",
+        role: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Pick the least-loaded eligible agent and count the new conversation against it."""
+        await self._ensure_ready()
+
+        for kind in settings.ROUTING_ORDER:
+            pool = (organization_id, kind, channel_type or ANY, role or ANY)
+            agent = None
+            for _ in range(settings.ROUTING_CLAIM_ATTEMPTS):
+                agent = self.table.least_loaded(pool)
+                if agent is None or await self._claim(agent):
+                    break
+            else:
+                # Loads keep moving under us; settle for the best candidate we know of
+                agent = self.table.least_loaded(pool)
+                if agent:
+                    await self._shared_adjust(agent.key, 1)
+
+            if agent:
+                self._adjust(agent.key, 1)
+                return {
+                    "assistant_id": agent.id if kind == "assistant" else "",
+                    "team_member_id": agent.id if kind == "team_member" else None
+                }
+
+        return {"assistant_id": "", "team_member_id": None}
+
+    async def record_assignment(self, assigned_to: Optional[Dict[str, Any]]):
+        """Count an externally chosen or reopened assignment."""
+        for key in self._agent_keys(assigned_to):
+            self._adjust(key, 1)
+            await self._shared_adjust(key, 1)
+
+    async def record_release(self, assigned_to: Optional[Dict[str, Any]]):
+        """Release the load held by a resolved conversation."""
+        for key in self._agent_keys(assigned_to):
+            self._adjust(key, -1)
+            await self._shared_adjust(key, -1)
+
+
+# Create a global instance
+assignment_router = AssignmentRouter()
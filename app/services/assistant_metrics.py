@@ -0,0 +1,187 @@
+from typing import Optional, Dict, Any, List
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from ..database import db
+from ..config import settings
+from ..utils.aggregation import response_time_stages, day_expr, ratio_expr, add_to_totals_stage
+from .scheduler import PeriodicJob
+
+# Counters kept per assistant and per assistant/day; rates are derived from them
+COUNTERS = [
+    "messages",
+    "confidence_sum",
+    "confidence_count",
+    "verified",
+    "response_time_sum",
+    "response_count"
+]
+
+
+def compute_rates(totals: Dict[str, Any]) -> Dict[str, float]:
+    """Derive AssistantMetrics values from raw counters."""
+    def ratio(numerator, denominator):
+        return totals.get(numerator, 0) / totals[denominator] if totals.get(denominator) else 0.0
+
+    return {
+        "accuracy_rate": ratio("confidence_sum", "confidence_count"),
+        "average_response_time": ratio("response_time_sum", "response_count"),
+        "verification_rate": ratio("verified", "messages")
+    }
+
+
+class AssistantMetricsJob(PeriodicJob):
+    """Incrementally folds new assistant messages into assistant metrics.
+
+    Each run aggregates only messages created since the stored watermark,
+    adds the per-day counters to `assistant_metrics_daily` and to the running
+    totals on the assistant document, then recomputes `metrics` from those
+    totals. Requests read the stored values and never aggregate. Documents
+    record the last window applied to them, so a window replayed after a
+    crash before the watermark was saved isn't counted twice.
+    """
+
+    name = "assistant_metrics"
+
+    def __init__(self):
+        super().__init__(interval=settings.ASSISTANT_METRICS_INTERVAL_SECONDS)
+        self.settle = timedelta(seconds=settings.ASSISTANT_METRICS_SETTLE_SECONDS)
+        self.max_window = timedelta(hours=settings.ASSISTANT_METRICS_MAX_WINDOW_HOURS)
+
+    async def _initial_watermark(self) -> datetime:
+        first = await db.messages.find_one(
+            {"sender.type": "assistant"},
+            sort=[("created_at", 1)],
+            projection={"created_at": 1}
+        )
+        if not first:
+            return datetime.utcnow() - self.settle
+        return first["created_at"] - timedelta(microseconds=1)
+
+    def build_pipeline(self, since: datetime, until: datetime) -> List[Dict[str, Any]]:
+        return [
+            {"$match": {
+                "sender.type": "assistant",
+                "created_at": {"$gt": since, "$lte": until}
+            }},
+            *response_time_stages(),
+            {"$group": {
+                "_id": {"assistant_id": "$sender.id", "date": day_expr()},
+                "messages": {"$sum": 1},
+                "confidence_sum": {"$sum": {"$ifNull": ["$ai_metadata.confidence", 0]}},
+                "confidence_count": {"$sum": {"$cond": [
+                    {"$isNumber": "$ai_metadata.confidence"}, 1, 0
+                ]}},
+                "verified": {"$sum": {"$cond": [
+                    {"$eq": ["$ai_metadata.verified", True]}, 1, 0
+                ]}},
+                "response_time_sum": {"$sum": {"$ifNull": ["$response_time", 0]}},
+                "response_count": {"$sum": {"$cond": [
+                    {"$ne": [{"$ifNull": ["$response_time", None]}, None]}, 1, 0
+                ]}}
+            }}
+        ]
+
+    async def process_window(self, since: datetime, until: datetime) -> int:
+        """Aggregate one window and apply it. Returns the number of assistant/day buckets."""
+        buckets = await db.messages.aggregate(
+            self.build_pipeline(since, until),
+            allowDiskUse=True
+        ).to_list(None)
+        if not buckets:
+            return 0
+
+        daily_ops = []
+        totals: Dict[str, Dict[str, float]] = {}
+        for bucket in buckets:
+            assistant_id = bucket["_id"]["assistant_id"]
+            if not assistant_id or not ObjectId.is_valid(assistant_id):
+                continue
+
+            increments = {counter: bucket[counter] for counter in COUNTERS}
+            daily_ops.append(UpdateOne(
+                {"assistant_id": assistant_id, "date": bucket["_id"]["date"]},
+                [add_to_totals_stage(None, increments, until), {"$set": {"updated_at": until}}],
+                upsert=True
+            ))
+
+            assistant_totals = totals.setdefault(assistant_id, dict.fromkeys(COUNTERS, 0))
+            for counter in COUNTERS:
+                assistant_totals[counter] += bucket[counter]
+
+        if daily_ops:
+            await db.assistant_metrics_daily.bulk_write(daily_ops, ordered=False)
+
+        assistant_ops = []
+        for assistant_id, increments in totals.items():
+            # Add to the running totals, then derive the public rates from them
+            assistant_ops.append(UpdateOne(
+                {"_id": ObjectId(assistant_id)},
+                [
+                    add_to_totals_stage("metrics_totals", increments, until),
+                    {"$set": {
+                        "metrics.accuracy_rate": ratio_expr(
+                            "$metrics_totals.confidence_sum", "$metrics_totals.confidence_count"
+                        ),
+                        "metrics.average_response_time": ratio_expr(
+                            "$metrics_totals.response_time_sum", "$metrics_totals.response_count"
+                        ),
+                        "metrics.verification_rate": ratio_expr(
+                            "$metrics_totals.verified", "$metrics_totals.messages"
+                        ),
+                        "metrics_updated_at": until
+                    }}
+                ]
+            ))
+
+        if assistant_ops:
+            await db.assistants.bulk_write(assistant_ops, ordered=False)
+
+        return len(buckets)
+
+    async def run_once(self):
+        state = await self.get_state()
+        since = state.get("watermark") or await self._initial_watermark()
+        # Leave a settle period so messages still being written are picked up next run
+        until = datetime.utcnow() - self.settle
+
+        # A window interrupted before its watermark was saved is replayed with
+        # the same end, which the documents it already reached recognise
+        window_end = state.get("window_end")
+        while since < until:
+            if window_end is None or window_end <= since:
+                window_end = min(since + self.max_window, until)
+                await self.save_state(window_end=window_end)
+            await self.process_window(since, window_end)
+            # Advance the watermark only once the window has been applied
+            await self.save_state(watermark=window_end)
+            since, window_end = window_end, None
+
+    async def get_time_series(
+        self,
+        assistant_id: str,
+        start: str,
+        end: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Daily metrics for one assistant between two YYYY-MM-DD dates (inclusive)."""
+        date_filter = {"$gte": start}
+        if end:
+            date_filter["$lte"] = end
+
+        days = await db.assistant_metrics_daily.find(
+            {"assistant_id": assistant_id, "date": date_filter}
+        ).sort("date", 1).to_list(None)
+
+        return [
+            {
+                "date": day["date"],
+                "messages": day.get("messages", 0),
+                **compute_rates(day)
+            }
+            for day in days
+        ]
+
+
+# Create a global instance
+assistant_metrics_job = AssistantMetricsJob()
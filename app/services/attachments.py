@@ -0,0 +1,94 @@
+from typing import Optional, Dict, Any, AsyncIterable, List
+import base64
+import logging
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+from ..database import get_database
+
+logger = logging.getLogger(__name__)
+
+BUCKET_NAME = "attachments"
+
+
+class Base64UrlDecoder:
+    """Decode base64url text fed in arbitrary pieces.
+
+    Only whole 4-character groups are decoded; the remainder is carried
+    into the next call, so chunks can split anywhere.
+    """
+
+    def __init__(self):
+        self._pending = ""
+
+    def decode(self, text: str) -> bytes:
+        text = self._pending + text.replace("\n", "").replace("\r", "")
+        usable = len(text) - len(text) % 4
+        self._pending = text[usable:]
+        return base64.urlsafe_b64decode(text[:usable])
+
+    def flush(self) -> bytes:
+        text, self._pending = self._pending, ""
+        if not text:
+            return b""
+        return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def attachment_bucket() -> AsyncIOMotorGridFSBucket:
+    return AsyncIOMotorGridFSBucket(get_database(), bucket_name=BUCKET_NAME)
+
+
+async def save_base64_stream(
+    chunks: AsyncIterable[str],
+    filename: str,
+    content_type: str,
+    metadata: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """Decode a base64url stream straight into GridFS. Returns the stored reference."""
+    decoder = Base64UrlDecoder()
+    upload = attachment_bucket().open_upload_stream(
+        filename,
+        metadata={**(metadata or {}), "content_type": content_type}
+    )
+    size = 0
+    try:
+        async for chunk in chunks:
+            data = decoder.decode(chunk)
+            if data:
+                await upload.write(data)
+                size += len(data)
+        data = decoder.flush()
+        if data:
+            await upload.write(data)
+            size += len(data)
+    except BaseException:
+        # Don't leave half-written chunks behind
+        await upload.abort()
+        raise
+    await upload.close()
+
+    return {
+        "file_id": str(upload._id),
+        "filename": filename,
+        "content_type": content_type,
+        "size": size
+    }
+
+
+async def open_attachment(file_id: str):
+    """GridFS download stream for a stored attachment, or None if it doesn't exist."""
+    try:
+        return await attachment_bucket().open_download_stream(ObjectId(file_id))
+    except Exception as e:
+        logger.warning(f"Error opening attachment {file_id}: {str(e)}")
+        return None
+
+
+async def delete_attachments(attachments: List[Dict[str, Any]]):
+    bucket = attachment_bucket()
+    for attachment in attachments:
+        try:
+            await bucket.delete(ObjectId(attachment["file_id"]))
+        except Exception as e:
+            logger.error(f"Error deleting attachment {attachment['file_id']}: {str(e)}")
@@ -0,0 +1,95 @@
+from typing import Optional, Dict, Any
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from ..database import db
+from ..config import settings
+from ..utils.cache import TTLCache
+
+# Cached fields: enough to route a message to its organization and channel.
+# Tokens and sync cursors change constantly, so callers read those by id.
+ROUTING_FIELDS = {
+    "businessId": 1,
+    "type": 1,
+    "identifier": 1,
+    "status": 1,
+    "metadata.provider": 1
+}
+
+# Remembers lookups that found nothing, e.g. notifications for a disconnected mailbox
+MISSING = object()
+
+
+class ChannelRegistry:
+    """In-process cache of active channels by id and by (type, identifier).
+
+    Inbound traffic names its channel by address, so most lookups are
+    served from memory. Entries expire after a short TTL, which bounds how
+    long another worker can keep routing to a channel disconnected
+    elsewhere; the worker handling the connect/disconnect invalidates its
+    own entries immediately.
+    """
+
+    def __init__(self):
+        self._by_key = TTLCache(
+            maxsize=settings.CHANNEL_CACHE_SIZE,
+            ttl=settings.CHANNEL_CACHE_TTL_SECONDS
+        )
+        self._by_id = TTLCache(
+            maxsize=settings.CHANNEL_CACHE_SIZE,
+            ttl=settings.CHANNEL_CACHE_TTL_SECONDS
+        )
+
+    def _remember(self, channel: Dict[str, Any]):
+        self._by_key.set((channel["type"], channel["identifier"].lower()), channel)
+        self._by_id.set(str(channel["_id"]), channel)
+
+    async def find(self, channel_type: str, identifier: str) -> Optional[Dict[str, Any]]:
+        """Active channel for an address, e.g. ("email", "support@acme.com")."""
+        key = (channel_type, identifier.lower())
+        channel = self._by_key.get(key)
+        if channel is None:
+            channel = await db.channels.find_one(
+                {"type": channel_type, "identifier": key[1], "status": "active"},
+                projection=ROUTING_FIELDS
+            )
+            if channel:
+                self._remember(channel)
+            else:
+                self._by_key.set(key, MISSING, ttl=settings.CHANNEL_CACHE_MISS_TTL_SECONDS)
+        return None if channel is MISSING else channel
+
+    async def get(self, channel_id: str) -> Optional[Dict[str, Any]]:
+        """Active channel by id."""
+        channel = self._by_id.get(channel_id)
+        if channel is not None:
+            return channel
+        try:
+            channel = await db.channels.find_one(
+                {"_id": ObjectId(channel_id), "status": "active"},
+                projection=ROUTING_FIELDS
+            )
+        except InvalidId:
+            return None
+        if channel:
+            self._remember(channel)
+        return channel
+
+    def invalidate(self, channel_id: Optional[str] = None, channel_type: Optional[str] = None, identifier: Optional[str] = None):
+        """Drop a channel after it was connected, disconnected or deactivated."""
+        if channel_id:
+            channel = self._by_id.get(channel_id)
+            self._by_id.delete(channel_id)
+            if channel:
+                self._by_key.delete((channel["type"], channel["identifier"].lower()))
+        if channel_type and identifier:
+            self._by_key.delete((channel_type, identifier.lower()))
+
+    def clear(self):
+        self._by_key.clear()
+        self._by_id.clear()
+
+
+# Create a global instance
+channel_registry = ChannelRegistry()
@@ -0,0 +1,139 @@
+from typing import Optional, Dict, Any
+from datetime import datetime
+from pymongo.errors import DuplicateKeyError
+
+from ..database import db
+from .assignment_router import assignment_router, OPEN_STATUSES
+from .sla_scheduler import sla_scheduler, build_sla
+
+
+def build_conversation(
+    organization_id: str,
+    customer_id: str,
+    channel: Dict[str, str],
+    assigned_to: Dict[str, Any],
+    status: str,
+    extra: Optional[Dict[str, Any]] = None,
+    created_at: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """Conversation document without routing or SLA side effects."""
+    now = datetime.utcnow()
+    return {
+        "organization_id": organization_id,
+        "customer_id": customer_id,
+        "assigned_to": assigned_to,
+        "channel": {
+            "type": channel.get("type", ""),
+            "identifier": channel.get("identifier", "")
+        },
+        "status": status,
+        "metrics": {
+            "response_time": 0.0,
+            "resolution_time": 0.0,
+            "customer_satisfaction": None
+        },
+        "created_at": created_at or now,
+        "updated_at": now,
+        **(extra or {})
+    }
+
+
+async def open_conversation(
+    organization_id: str,
+    customer_id: str,
+    channel: Dict[str, str],
+    assigned_to: Optional[Dict[str, Any]] = None,
+    status: str = "active",
+    role: Optional[str] = None,
+    extra: Optional[Dict[str, Any]] = None,
+    created_at: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """Create a conversation, routing it and starting its SLA timers.
+
+    Used by the conversations API and by channel ingestion. Raises
+    DuplicateKeyError if a unique index (e.g. on an external thread id)
+    rejects the insert; the routing load taken for it is released first.
+    """
+    assigned_to = {
+        "assistant_id": (assigned_to or {}).get("assistant_id", ""),
+        "team_member_id": (assigned_to or {}).get("team_member_id")
+    }
+
+    if status in OPEN_STATUSES:
+        if assigned_to["assistant_id"] or assigned_to["team_member_id"]:
+            # Explicit assignment from the client still counts towards load
+            await assignment_router.record_assignment(assigned_to)
+        else:
+            assigned_to = await assignment_router.assign(
+                organization_id,
+                channel.get("type", ""),
+                role=role
+            )
+
+    now = datetime.utcnow()
+    conversation = build_conversation(
+        organization_id,
+        customer_id,
+        channel,
+        assigned_to,
+        status,
+        extra=extra,
+        created_at=created_at or now
+    )
+    if assigned_to["assistant_id"] or assigned_to["team_member_id"]:
+        # created_at can be the channel's own (older) timestamp; rollups count assignments by this
+        conversation["assigned_at"] = now
+    if status in OPEN_STATUSES:
+        conversation["sla"] = build_sla(now)
+
+    try:
+        result = await db.conversations.insert_one(conversation)
+    except DuplicateKeyError:
+        if status in OPEN_STATUSES:
+            await assignment_router.record_release(assigned_to)
+        raise
+
+    if "sla" in conversation:
+        sla_scheduler.track_conversation(str(result.inserted_id), conversation["sla"])
+    return conversation
+
+
+async def reopen_conversation(conversation: Dict[str, Any]):
+    """Move a resolved conversation back to active, e.g. when the customer writes again.
+
+    Conversations that were never assigned (such as threads imported by the
+    Gmail backfill) are routed now. Either way the customer is owed a reply,
+    so the first-response and resolution timers start again.
+    """
+    now = datetime.utcnow()
+    assigned_to = conversation.get("assigned_to") or {}
+    routed = not (assigned_to.get("assistant_id") or assigned_to.get("team_member_id"))
+    if routed:
+        assigned_to = await assignment_router.assign(
+            conversation.get("organization_id", ""),
+            (conversation.get("channel") or {}).get("type", "")
+        )
+
+    sla = build_sla(now)
+    fields = {
+        "status": "active",
+        "updated_at": now,
+        **{f"sla.{key}": value for key, value in sla.items()}
+    }
+    if routed and (assigned_to["assistant_id"] or assigned_to["team_member_id"]):
+        fields["assigned_to"] = assigned_to
+        fields["assigned_at"] = now
+
+    result = await db.conversations.update_one(
+        {"_id": conversation["_id"], "status": {"$nin": OPEN_STATUSES}},
+        {"$set": fields, "$unset": {"resolved_at": ""}}
+    )
+    if not result.modified_count:
+        # Reopened elsewhere first; give back the load assign() took
+        if routed:
+            await assignment_router.record_release(assigned_to)
+        return
+
+    if not routed:
+        await assignment_router.record_assignment(assigned_to)
+    sla_scheduler.track_conversation(str(conversation["_id"]), sla)
@@ -0,0 +1,317 @@
+from typing import Optional, Dict, Any, List
+from datetime import datetime, timedelta
+import asyncio
+import logging
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from ..database import db
+from ..config import settings
+from ..utils.rate_limit import TokenBucket
+from .gmail_client import GmailApiError
+from .gmail_service import gmail_service
+from .gmail_ingest import parse_message, is_inbound, build_message, store_attachments
+from .attachments import delete_attachments
+from .conversation_service import build_conversation
+from .channel_registry import channel_registry
+from .scheduler import PeriodicJob, WORKER_ID
+
+logger = logging.getLogger(__name__)
+
+# Gmail quota units per call
+LIST_QUOTA_UNITS = 5
+GET_QUOTA_UNITS = 5
+
+
+async def queue_backfill(channel: Dict[str, Any]):
+    """Schedule a one-off history import for a newly connected mailbox."""
+    now = datetime.utcnow()
+    await db.gmail_backfills.update_one(
+        {"channel_id": str(channel["_id"])},
+        {"$setOnInsert": {
+            "channel_id": str(channel["_id"]),
+            "organization_id": channel["businessId"],
+            "mailbox": channel["identifier"],
+            "query": f"in:inbox newer_than:{settings.GMAIL_BACKFILL_DAYS}d",
+            "status": "pending",
+            "page_token": None,
+            "imported": 0,
+            "created_at": now,
+            "updated_at": now
+        }},
+        upsert=True
+    )
+
+
+class GmailBackfillJob(PeriodicJob):
+    """Imports the recent history of newly connected Gmail mailboxes.
+
+    Each mailbox has a `gmail_backfills` document that is claimed with a
+    lease, so every worker can take a different mailbox and a crashed
+    worker's backfill is picked up again. A backfill pages `messages.list`,
+    fetches each page with bounded concurrency and writes it with bulk
+    inserts, then checkpoints the next page token. Re-running a page after
+    a restart is harmless: messages already stored are skipped by Gmail id.
+    Calls go through a token bucket set below Gmail's per-user quota so
+    live sync and replies on the same mailbox still get through.
+
+    Imported threads are stored as resolved history: they are not routed
+    and start no SLA timers until the customer writes again.
+    """
+
+    name = "gmail_backfill"
+    exclusive = False
+
+    def __init__(self):
+        super().__init__(interval=settings.GMAIL_BACKFILL_INTERVAL_SECONDS)
+        self.lease = timedelta(seconds=settings.GMAIL_BACKFILL_LEASE_SECONDS)
+
+    async def claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        return await db.gmail_backfills.find_one_and_update(
+            {
+                "status": {"$in": ["pending", "running"]},
+                "$or": [
+                    {"lease_until": {"$exists": False}},
+                    {"lease_until": {"$lt": now}}
+                ]
+            },
+            {"$set": {
+                "status": "running",
+                "lease_owner": WORKER_ID,
+                "lease_until": now + self.lease,
+                "updated_at": now
+            }},
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def checkpoint(self, backfill: Dict[str, Any], imported: int = 0, **fields) -> bool:
+        """Save progress and extend the lease. False if another worker took over."""
+        now = datetime.utcnow()
+        result = await db.gmail_backfills.update_one(
+            {"_id": backfill["_id"], "lease_owner": WORKER_ID},
+            {
+                "$set": {**fields, "lease_until": now + self.lease, "updated_at": now},
+                "$inc": {"imported": imported}
+            }
+        )
+        return result.modified_count == 1
+
+    async def fetch(self, access_token: str, message_ids: List[str], bucket: TokenBucket) -> List[Dict[str, Any]]:
+        semaphore = asyncio.Semaphore(settings.GMAIL_BACKFILL_CONCURRENCY)
+
+        async def fetch_one(message_id: str):
+            async with semaphore:
+                await bucket.acquire(GET_QUOTA_UNITS)
+                try:
+                    return await gmail_service.client.get_message(access_token, message_id)
+                except GmailApiError as e:
+                    if e.status_code == 404:
+                        return None
+                    raise
+
+        messages = await asyncio.gather(*(fetch_one(message_id) for message_id in message_ids))
+        return [message for message in messages if message]
+
+    async def upsert_customers(self, organization_id: str, parsed: List[Dict[str, Any]]) -> Dict[str, str]:
+        """Customer ids by email, creating missing customers in one bulk write."""
+        now = datetime.utcnow()
+        latest: Dict[str, Dict[str, Any]] = {}
+        for message in parsed:
+            current = latest.get(message["from_email"])
+            if current is None or message["internal_date"] > current["internal_date"]:
+                latest[message["from_email"]] = message
+
+        await db.customers.bulk_write([
+            UpdateOne(
+                {"organization_id": organization_id, "email": email},
+                {
+                    "$setOnInsert": {
+                        "organization_id": organization_id,
+                        "email": email,
+                        "name": message["from_name"] or email,
+                        "phone": "",
+                        "channels": [{"type": "email", "identifier": email, "verified": False}],
+                        "tags": [],
+                        "created_at": now
+                    },
+                    "$max": {"last_contact": message["internal_date"]},
+                    "$set": {"updated_at": now}
+                },
+                upsert=True
+            )
+            for email, message in latest.items()
+        ], ordered=False)
+
+        customers = await db.customers.find(
+            {"organization_id": organization_id, "email": {"$in": list(latest)}},
+            projection={"email": 1}
+        ).to_list(None)
+        return {customer["email"]: str(customer["_id"]) for customer in customers}
+
+    async def upsert_threads(
+        self,
+        backfill: Dict[str, Any],
+        parsed: List[Dict[str, Any]],
+        customer_ids: Dict[str, str]
+    ) -> Dict[str, str]:
+        """Conversation ids by Gmail thread id, inserting missing threads in bulk."""
+        organization_id = backfill["organization_id"]
+        threads: Dict[str, List[Dict[str, Any]]] = {}
+        for message in parsed:
+            threads.setdefault(message["thread_id"], []).append(message)
+
+        query = {"organization_id": organization_id, "external.thread_id": {"$in": list(threads)}}
+        existing = await db.conversations.find(query, projection={"external.thread_id": 1}).to_list(None)
+        known = {conversation["external"]["thread_id"] for conversation in existing}
+
+        new_conversations = []
+        for thread_id, messages in threads.items():
+            if thread_id in known:
+                continue
+            messages.sort(key=lambda message: message["internal_date"])
+            first, last = messages[0], messages[-1]
+            conversation = build_conversation(
+                organization_id,
+                customer_ids[first["from_email"]],
+                {"type": "email", "identifier": backfill["mailbox"]},
+                {"assistant_id": "", "team_member_id": None},
+                "resolved",
+                extra={
+                    "subject": first["subject"],
+                    "external": {
+                        "provider": "gmail",
+                        "channel_id": backfill["channel_id"],
+                        "thread_id": thread_id
+                    },
+                    "resolved_at": last["internal_date"]
+                },
+                created_at=first["internal_date"]
+            )
+            conversation["updated_at"] = last["internal_date"]
+            new_conversations.append(conversation)
+
+        if new_conversations:
+            try:
+                await db.conversations.insert_many(new_conversations, ordered=False)
+            except BulkWriteError as e:
+                # Live sync may have opened some of these threads meanwhile
+                if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                    raise
+
+        conversations = await db.conversations.find(query, projection={"external.thread_id": 1}).to_list(None)
+        return {conversation["external"]["thread_id"]: str(conversation["_id"]) for conversation in conversations}
+
+    async def import_page(self, backfill: Dict[str, Any], channel: Dict[str, Any], access_token: str, message_ids: List[str], bucket: TokenBucket) -> int:
+        """Fetch and store one page of messages. Returns the number inserted."""
+        stored = await db.messages.find(
+            {"external.message_id": {"$in": message_ids}},
+            projection={"external.message_id": 1}
+        ).to_list(None)
+        skip = {message["external"]["message_id"] for message in stored}
+        message_ids = [message_id for message_id in message_ids if message_id not in skip]
+        if not message_ids:
+            return 0
+
+        parsed = [
+            message
+            for message in map(parse_message, await self.fetch(access_token, message_ids, bucket))
+            if is_inbound(message, backfill["mailbox"]) and message["from_email"]
+        ]
+        if not parsed:
+            return 0
+
+        customer_ids = await self.upsert_customers(backfill["organization_id"], parsed)
+        conversation_ids = await self.upsert_threads(backfill, parsed, customer_ids)
+
+        documents = []
+        try:
+            for message in parsed:
+                attachments = await store_attachments(channel, message, access_token, bucket) if message["attachments"] else []
+                documents.append(build_message(
+                    conversation_ids[message["thread_id"]],
+                    customer_ids[message["from_email"]],
+                    message,
+                    attachments
+                ))
+        except BaseException:
+            for document in documents:
+                await delete_attachments(document["content"]["attachments"])
+            raise
+
+        try:
+            result = await db.messages.insert_many(documents, ordered=False)
+            return len(result.inserted_ids)
+        except BulkWriteError as e:
+            # Messages that weren't written (e.g. stored by live sync meanwhile) don't keep their files
+            errors = e.details.get("writeErrors", [])
+            for error in errors:
+                await delete_attachments(documents[error["index"]]["content"]["attachments"])
+            if any(error.get("code") != 11000 for error in errors):
+                raise
+            return e.details.get("nInserted", 0)
+
+    async def process(self, backfill: Dict[str, Any]):
+        channel = await channel_registry.get(backfill["channel_id"])
+        if not channel:
+            await self.checkpoint(backfill, status="cancelled")
+            return
+
+        bucket = TokenBucket(settings.GMAIL_BACKFILL_UNITS_PER_SECOND)
+        page_token = backfill.get("page_token")
+        while not self._stopping.is_set():
+            access_token = await gmail_service.get_access_token(channel)
+            await bucket.acquire(LIST_QUOTA_UNITS)
+            page = await gmail_service.client.list_messages(
+                access_token,
+                query=backfill.get("query"),
+                page_token=page_token,
+                max_results=settings.GMAIL_BACKFILL_PAGE_SIZE
+            )
+            message_ids = [message["id"] for message in page.get("messages", [])]
+            imported = await self.import_page(backfill, channel, access_token, message_ids, bucket)
+
+            page_token = page.get("nextPageToken")
+            fields: Dict[str, Any] = {"page_token": page_token}
+            if not page_token:
+                fields.update(status="completed", completed_at=datetime.utcnow())
+            if not await self.checkpoint(backfill, imported, **fields):
+                logger.warning(f"Lost lease on backfill for {backfill['mailbox']}")
+                return
+            if not page_token:
+                logger.info(f"Backfill for {backfill['mailbox']} completed")
+                return
+
+    async def run_once(self):
+        backfill = None
+        while not self._stopping.is_set():
+            backfill = await self.claim()
+            if not backfill:
+                return
+            try:
+                await self.process(backfill)
+            except Exception as e:
+                failures = backfill.get("failures", 0) + 1
+                fields: Dict[str, Any] = {"failures": failures, "error": str(e)}
+                if failures >= settings.GMAIL_BACKFILL_MAX_FAILURES:
+                    fields["status"] = "failed"
+                # Retried from the last checkpoint once the lease lapses
+                await db.gmail_backfills.update_one(
+                    {"_id": backfill["_id"], "lease_owner": WORKER_ID},
+                    {"$set": fields}
+                )
+                logger.error(f"Error backfilling {backfill['mailbox']}: {str(e)}")
+                return
+
+        if backfill:
+            # Stopped mid-way: hand the lease back so another worker resumes now
+            await db.gmail_backfills.update_one(
+                {"_id": backfill["_id"], "lease_owner": WORKER_ID, "status": "running"},
+                {"$set": {"lease_until": datetime.utcnow()}}
+            )
+
+
+# Create a global instance
+gmail_backfill_job = GmailBackfillJob()
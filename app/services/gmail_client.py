@@ -0,0 +1,311 @@
+from typing import Optional, Dict, Any, List, AsyncIterator, TYPE_CHECKING
+import asyncio
+import random
+import re
+
+if TYPE_CHECKING:
+    import httpx
+
+from ..config import settings
+from ..utils.tracing import span
+
+GMAIL_API_BASE_URL = "https://gmail.googleapis.com/gmail/v1"
+GOOGLE_TOKEN_URI = "https://oauth2.googleapis.com/token"
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Start of the base64url "data" value in an attachments.get response
+ATTACHMENT_DATA_RE = re.compile(r'"data"\s*:\s*"')
+
+
+class GmailApiError(Exception):
+    """`ambiguous` is set when a non-idempotent request may have taken effect."""
+
+    def __init__(
+        self,
+        status_code: int,
+        message: str,
+        retry_after: Optional[float] = None,
+        ambiguous: bool = False
+    ):
+        super().__init__(f"Gmail API error {status_code}: {message}")
+        self.status_code = status_code
+        self.message = message
+        self.retry_after = retry_after
+        self.ambiguous = ambiguous
+
+    @property
+    def retryable(self) -> bool:
+        return self.status_code in RETRY_STATUSES
+
+
+class GmailClient:
+    """Asyncio Gmail REST client on a shared, pooled httpx.AsyncClient.
+
+    One client serves every connected mailbox, so connections to Google are
+    reused across channels and no call blocks the event loop.
+    """
+
+    def __init__(
+        self,
+        base_url: str = GMAIL_API_BASE_URL,
+        token_uri: str = GOOGLE_TOKEN_URI,
+        client_id: Optional[str] = None,
+        client_secret: Optional[str] = None
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.token_uri = token_uri
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.max_attempts = settings.GMAIL_HTTP_MAX_ATTEMPTS
+        self._client: Optional["httpx.AsyncClient"] = None
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        if self._client is None or self._client.is_closed:
+            # Imported on first use to keep it out of the API's cold start
+            import httpx
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(
+                    settings.GMAIL_HTTP_TIMEOUT_SECONDS,
+                    connect=settings.GMAIL_HTTP_CONNECT_TIMEOUT_SECONDS
+                ),
+                limits=httpx.Limits(
+                    max_connections=settings.GMAIL_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.GMAIL_HTTP_MAX_CONNECTIONS
+                )
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _send(self, method: str, url: str, idempotent: bool = True, **kwargs) -> "httpx.Response":
+        """Send a request, retrying rate limits and server errors with backoff.
+
+        Requests that must not run twice (`idempotent=False`) are only retried
+        when Google cannot have acted on them: failures to connect and 429s.
+        Timeouts and server errors after the request went out are raised
+        with `ambiguous` set, for the caller to check before sending again.
+        """
+        import httpx
+
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                with span("gmail.request", "client", attempt=attempt) as request_span:
+                    request_span.set("http.method", method)
+                    request_span.set("http.url", url)
+                    response = await self.client.request(method, url, **kwargs)
+                    request_span.set("http.status_code", response.status_code)
+            except httpx.TransportError as e:
+                # Connect and pool timeouts fail before anything is sent
+                safe = idempotent or isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+                if not safe or attempt == self.max_attempts:
+                    raise GmailApiError(503, f"{type(e).__name__}: {str(e)}", ambiguous=not safe)
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code < 400:
+                return response
+
+            retry_after = response.headers.get("Retry-After")
+            error = GmailApiError(
+                response.status_code,
+                self._error_message(response),
+                retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+                ambiguous=not idempotent and response.status_code >= 500
+            )
+            safe = idempotent or response.status_code == 429
+            if not error.retryable or not safe or attempt == self.max_attempts:
+                raise error
+            await asyncio.sleep(error.retry_after or self._backoff(attempt))
+
+    def _backoff(self, attempt: int) -> float:
+        return min(2 ** attempt, 32) * (0.5 + random.random() / 2)
+
+    def _error_message(self, response: "httpx.Response") -> str:
+        try:
+            body = response.json()
+        except ValueError:
+            return response.text[:200]
+        error = body.get("error")
+        if isinstance(error, dict):
+            return error.get("message", str(error))
+        return body.get("error_description") or str(error or body)
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        access_token: str,
+        params: Optional[Dict[str, Any]] = None,
+        json: Optional[Dict[str, Any]] = None,
+        idempotent: bool = True
+    ) -> Dict[str, Any]:
+        response = await self._send(
+            method,
+            f"{self.base_url}{path}",
+            idempotent=idempotent,
+            params=params,
+            json=json,
+            headers={"Authorization": f"Bearer {access_token}"}
+        )
+        return response.json() if response.content else {}
+
+    # OAuth token endpoint
+
+    async def exchange_code(self, code: str, redirect_uri: str) -> Dict[str, Any]:
+        """Exchange an authorization code for access and refresh tokens."""
+        # Codes are single-use, so a replayed exchange would only fail
+        response = await self._send("POST", self.token_uri, idempotent=False, data={
+            "grant_type": "authorization_code",
+            "code": code,
+            "redirect_uri": redirect_uri,
+            "client_id": self.client_id,
+            "client_secret": self.client_secret
+        })
+        return response.json()
+
+    async def refresh_access_token(self, refresh_token: str) -> Dict[str, Any]:
+        response = await self._send("POST", self.token_uri, data={
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+            "client_id": self.client_id,
+            "client_secret": self.client_secret
+        })
+        return response.json()
+
+    # users.*
+
+    async def get_profile(self, access_token: str) -> Dict[str, Any]:
+        return await self.request("GET", "/users/me/profile", access_token)
+
+    async def watch(self, access_token: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.request("POST", "/users/me/watch", access_token, json=body)
+
+    async def stop_watch(self, access_token: str) -> Dict[str, Any]:
+        return await self.request("POST", "/users/me/stop", access_token)
+
+    # users.history / users.messages
+
+    async def list_history(
+        self,
+        access_token: str,
+        start_history_id: str,
+        page_token: Optional[str] = None,
+        history_types: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        params = {"startHistoryId": start_history_id}
+        if page_token:
+            params["pageToken"] = page_token
+        if history_types:
+            params["historyTypes"] = history_types
+        return await self.request("GET", "/users/me/history", access_token, params=params)
+
+    async def list_messages(
+        self,
+        access_token: str,
+        query: Optional[str] = None,
+        page_token: Optional[str] = None,
+        max_results: int = 100
+    ) -> Dict[str, Any]:
+        params = {"maxResults": max_results}
+        if query:
+            params["q"] = query
+        if page_token:
+            params["pageToken"] = page_token
+        return await self.request("GET", "/users/me/messages", access_token, params=params)
+
+    async def get_message(self, access_token: str, message_id: str, format: str = "full") -> Dict[str, Any]:
+        return await self.request(
+            "GET",
+            f"/users/me/messages/{message_id}",
+            access_token,
+            params={"format": format}
+        )
+
+    async def get_messages(
+        self,
+        access_token: str,
+        message_ids: List[str],
+        format: str = "full",
+        concurrency: Optional[int] = None
+    ) -> List[Optional[Dict[str, Any]]]:
+        """Fetch several messages concurrently over the shared pool.
+
+        Messages deleted in the meantime come back as None.
+        """
+        semaphore = asyncio.Semaphore(concurrency or settings.GMAIL_FETCH_CONCURRENCY)
+
+        async def fetch(message_id: str):
+            async with semaphore:
+                try:
+                    return await self.get_message(access_token, message_id, format=format)
+                except GmailApiError as e:
+                    if e.status_code == 404:
+                        return None
+                    raise
+
+        return await asyncio.gather(*(fetch(message_id) for message_id in message_ids))
+
+    async def stream_attachment(
+        self,
+        access_token: str,
+        message_id: str,
+        attachment_id: str
+    ) -> AsyncIterator[str]:
+        """Yield an attachment's base64url data in chunks as it arrives.
+
+        attachments.get wraps the whole file in one JSON string, so rather
+        than parsing the body we scan the stream for the "data" value and
+        pass it through piecewise. Memory stays at one network chunk.
+        """
+        url = f"{self.base_url}/users/me/messages/{message_id}/attachments/{attachment_id}"
+        async with self.client.stream(
+            "GET",
+            url,
+            headers={"Authorization": f"Bearer {access_token}"}
+        ) as response:
+            if response.status_code >= 400:
+                await response.aread()
+                raise GmailApiError(response.status_code, self._error_message(response))
+
+            pending = ""
+            in_data = False
+            async for chunk in response.aiter_text():
+                if not in_data:
+                    pending += chunk
+                    match = ATTACHMENT_DATA_RE.search(pending)
+                    if not match:
+                        # Keep enough to match a key split across chunks
+                        pending = pending[-32:]
+                        continue
+                    in_data = True
+                    chunk = pending[match.end():]
+                    pending = ""
+
+                # base64url never contains a quote, so the first one ends the value
+                end = chunk.find('"')
+                if end == -1:
+                    if chunk:
+                        yield chunk
+                    continue
+                if end:
+                    yield chunk[:end]
+                return
+
+        raise GmailApiError(502, "Attachment response had no data")
+
+    async def send_message(
+        self,
+        access_token: str,
+        raw: str,
+        thread_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        body = {"raw": raw}
+        if thread_id:
+            body["threadId"] = thread_id
+        # A resend after a timeout could deliver the email twice
+        return await self.request("POST", "/users/me/messages/send", access_token, json=body, idempotent=False)
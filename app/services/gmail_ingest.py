@@ -0,0 +1,268 @@
+from typing import Optional, Dict, Any, List
+from datetime import datetime
+from email.utils import parseaddr, getaddresses
+import base64
+import html
+import re
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from ..database import db
+from ..utils.rate_limit import TokenBucket
+from .attachments import save_base64_stream, delete_attachments
+from .conversation_service import open_conversation, reopen_conversation
+from .gmail_service import gmail_service
+
+TAG_RE = re.compile(r"<[^>]+>")
+
+# attachments.get quota cost
+ATTACHMENT_QUOTA_UNITS = 5
+
+
+def decode_body(data: str) -> bytes:
+    """Decode Gmail's unpadded base64url body data."""
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def get_headers(payload: Dict[str, Any]) -> Dict[str, str]:
+    return {
+        header["name"].lower(): header["value"]
+        for header in payload.get("headers", [])
+    }
+
+
+def extract_text(payload: Dict[str, Any]) -> str:
+    """Return the plain-text body of a message, falling back to stripped HTML."""
+    html_body = None
+    stack = [payload]
+    while stack:
+        part = stack.pop(0)
+        mime_type = part.get("mimeType", "")
+        data = part.get("body", {}).get("data")
+        if data and not part.get("filename"):
+            if mime_type == "text/plain":
+                return decode_body(data).decode("utf-8", errors="replace")
+            if mime_type == "text/html" and html_body is None:
+                html_body = decode_body(data).decode("utf-8", errors="replace")
+        stack.extend(part.get("parts", []))
+
+    if html_body:
+        return html.unescape(TAG_RE.sub("", html_body)).strip()
+    return ""
+
+
+def find_attachments(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Attachment parts of a message. Large ones only carry an attachmentId."""
+    attachments = []
+    stack = [payload]
+    while stack:
+        part = stack.pop(0)
+        body = part.get("body", {})
+        if part.get("filename") and (body.get("attachmentId") or body.get("data")):
+            attachments.append({
+                "filename": part["filename"],
+                "mime_type": part.get("mimeType", "application/octet-stream"),
+                "size": body.get("size", 0),
+                "attachment_id": body.get("attachmentId"),
+                "data": body.get("data")
+            })
+        stack.extend(part.get("parts", []))
+    return attachments
+
+
+def parse_message(gmail_message: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten a Gmail API message (format=full) into the fields we store."""
+    payload = gmail_message.get("payload", {})
+    headers = get_headers(payload)
+    from_name, from_email = parseaddr(headers.get("from", ""))
+
+    return {
+        "gmail_id": gmail_message["id"],
+        "thread_id": gmail_message.get("threadId"),
+        "history_id": gmail_message.get("historyId"),
+        "label_ids": gmail_message.get("labelIds", []),
+        "internal_date": datetime.utcfromtimestamp(int(gmail_message.get("internalDate", 0)) / 1000),
+        "subject": headers.get("subject", ""),
+        "from_name": from_name,
+        "from_email": from_email.lower(),
+        "to": [address for _, address in getaddresses([headers.get("to", "")]) if address],
+        "rfc822_message_id": headers.get("message-id"),
+        "snippet": html.unescape(gmail_message.get("snippet", "")),
+        "body": extract_text(payload),
+        "attachments": find_attachments(payload)
+    }
+
+
+async def upsert_customer(organization_id: str, email: str, name: str, contacted_at: datetime) -> str:
+    """Find or create the customer behind an email address."""
+    now = datetime.utcnow()
+    customer = await db.customers.find_one_and_update(
+        {"organization_id": organization_id, "email": email},
+        {
+            "$setOnInsert": {
+                "organization_id": organization_id,
+                "email": email,
+                "name": name or email,
+                "phone": "",
+                "channels": [{"type": "email", "identifier": email, "verified": False}],
+                "tags": [],
+                "created_at": now
+            },
+            "$max": {"last_contact": contacted_at},
+            "$set": {"updated_at": now}
+        },
+        upsert=True,
+        projection={"_id": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return str(customer["_id"])
+
+
+async def find_or_open_thread(channel: Dict[str, Any], parsed: Dict[str, Any], customer_id: str) -> Dict[str, Any]:
+    """Conversation for a Gmail thread, created on the first message."""
+    organization_id = channel["businessId"]
+    query = {"organization_id": organization_id, "external.thread_id": parsed["thread_id"]}
+    conversation = await db.conversations.find_one(query)
+    if conversation:
+        return conversation
+
+    try:
+        return await open_conversation(
+            organization_id,
+            customer_id,
+            {"type": "email", "identifier": channel["identifier"]},
+            extra={
+                "subject": parsed["subject"],
+                "external": {
+                    "provider": "gmail",
+                    "channel_id": str(channel["_id"]),
+                    "thread_id": parsed["thread_id"]
+                }
+            },
+            created_at=parsed["internal_date"]
+        )
+    except DuplicateKeyError:
+        # Another worker opened the thread first
+        return await db.conversations.find_one(query)
+
+
+async def store_attachments(
+    channel: Dict[str, Any],
+    parsed: Dict[str, Any],
+    access_token: str,
+    quota: Optional[TokenBucket] = None
+) -> List[Dict[str, Any]]:
+    """Stream a message's attachments into GridFS and return their references.
+
+    Fetches of attachments not inlined in the message take units from
+    `quota` when one is given.
+    """
+    stored: List[Dict[str, Any]] = []
+    try:
+        for attachment in parsed["attachments"]:
+            if attachment["data"]:
+                async def inline(data=attachment["data"]):
+                    yield data
+                chunks = inline()
+            else:
+                if quota is not None:
+                    await quota.acquire(ATTACHMENT_QUOTA_UNITS)
+                chunks = gmail_service.client.stream_attachment(
+                    access_token,
+                    parsed["gmail_id"],
+                    attachment["attachment_id"]
+                )
+            stored.append(await save_base64_stream(
+                chunks,
+                attachment["filename"],
+                attachment["mime_type"],
+                metadata={
+                    "organization_id": channel["businessId"],
+                    "gmail_id": parsed["gmail_id"]
+                }
+            ))
+    except BaseException:
+        await delete_attachments(stored)
+        raise
+    return stored
+
+
+def build_message(
+    conversation_id: str,
+    customer_id: str,
+    parsed: Dict[str, Any],
+    attachments: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    return {
+        "conversation_id": conversation_id,
+        "sender": {"type": "customer", "id": customer_id},
+        "content": {
+            "type": "text",
+            "body": parsed["body"],
+            "attachments": attachments,
+            "metadata": {
+                "subject": parsed["subject"],
+                "from": parsed["from_email"],
+                "to": parsed["to"],
+                "snippet": parsed["snippet"]
+            }
+        },
+        "status": "delivered",
+        "external": {
+            "provider": "gmail",
+            "message_id": parsed["gmail_id"],
+            "thread_id": parsed["thread_id"],
+            "rfc822_message_id": parsed["rfc822_message_id"]
+        },
+        "created_at": parsed["internal_date"]
+    }
+
+
+async def store_message(
+    channel: Dict[str, Any],
+    parsed: Dict[str, Any],
+    access_token: str
+) -> Optional[str]:
+    """Write one inbound email into conversations/messages.
+
+    Idempotent: the unique index on `external.message_id` turns a
+    redelivered message into a no-op. Attachments go to GridFS and only
+    their references are kept on the message. Returns the new message id,
+    or None if it was already stored.
+    """
+    if await db.messages.find_one({"external.message_id": parsed["gmail_id"]}, projection={"_id": 1}):
+        return None
+
+    customer_id = await upsert_customer(
+        channel["businessId"],
+        parsed["from_email"],
+        parsed["from_name"],
+        parsed["internal_date"]
+    )
+    conversation = await find_or_open_thread(channel, parsed, customer_id)
+    conversation_id = str(conversation["_id"])
+
+    attachments = await store_attachments(channel, parsed, access_token)
+    try:
+        result = await db.messages.insert_one(build_message(conversation_id, customer_id, parsed, attachments))
+    except DuplicateKeyError:
+        await delete_attachments(attachments)
+        return None
+
+    await db.conversations.update_one(
+        {"_id": conversation["_id"]},
+        {"$set": {"updated_at": datetime.utcnow()}}
+    )
+    if conversation.get("status") == "resolved":
+        await reopen_conversation(conversation)
+
+    return str(result.inserted_id)
+
+
+def is_inbound(parsed: Dict[str, Any], mailbox: str) -> bool:
+    """Skip drafts and mail sent from the connected mailbox itself."""
+    labels: List[str] = parsed["label_ids"]
+    if "DRAFT" in labels or "SENT" in labels:
+        return False
+    return parsed["from_email"] != mailbox.lower()
@@ -0,0 +1,291 @@
+from typing import Optional, Dict, Any, List
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import random
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from ..database import db
+from ..config import settings
+from ..utils.rate_limit import SharedRateLimit
+from .gmail_client import GmailApiError
+from .gmail_service import gmail_service
+from .channel_registry import channel_registry
+
+logger = logging.getLogger(__name__)
+
+# messages.send costs 100 of the 250 quota units Gmail grants per user per second
+SEND_QUOTA_UNITS = 100
+
+
+def reply_subject(subject: str) -> str:
+    subject = subject or ""
+    return subject if subject.lower().startswith("re:") else f"Re: {subject}".strip()
+
+
+async def queue_email_reply(
+    conversation: Dict[str, Any],
+    channel_id: str,
+    sender: Dict[str, str],
+    body: str
+) -> Dict[str, Any]:
+    """Persist a reply as a pending message for the outbound workers."""
+    now = datetime.utcnow()
+    message = {
+        "conversation_id": str(conversation["_id"]),
+        "sender": sender,
+        "content": {"type": "text", "body": body, "metadata": {}},
+        "status": "pending",
+        "outbound": {
+            "provider": "gmail",
+            "channel_id": channel_id,
+            "attempts": 0,
+            "next_attempt_at": now
+        },
+        "created_at": now
+    }
+    result = await db.messages.insert_one(message)
+    message["_id"] = result.inserted_id
+    gmail_outbound.wake()
+    return message
+
+
+class GmailOutboundQueue:
+    """Sends queued email replies through the Gmail API.
+
+    Replies are written as `status: pending` messages and never sent from
+    the request. Workers claim one message at a time by flipping it to
+    `sending` and pushing `outbound.next_attempt_at` out by a lease, so a
+    message held by a crashed worker becomes due again once the lease
+    lapses. Each mailbox has a per-second budget sized to Gmail's per-user
+    quota, kept in Mongo so it holds across workers; a message whose
+    mailbox is out of quota is put back until the next second instead of
+    holding a worker. Rate limits and server errors are retried
+    with exponential backoff; other errors mark the message `failed`.
+
+    A send that timed out or hit a server error may still have gone out,
+    so its Message-ID is kept and the next attempt first searches the
+    mailbox for it, resending (with the same Message-ID) only if it isn't
+    there. Delivery is still at-least-once: a worker dying between Gmail
+    accepting the message and the status write will send it again after
+    the lease.
+    """
+
+    def __init__(self):
+        self.lease = timedelta(seconds=settings.GMAIL_OUTBOUND_LEASE_SECONDS)
+        self.quota = SharedRateLimit("gmail_quota", settings.GMAIL_QUOTA_UNITS_PER_SECOND)
+        self._wakeup = asyncio.Event()
+        self._workers: List[asyncio.Task] = []
+
+    def wake(self):
+        self._wakeup.set()
+
+    async def claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        return await db.messages.find_one_and_update(
+            {
+                "status": {"$in": ["pending", "sending"]},
+                "outbound.next_attempt_at": {"$lte": now}
+            },
+            {"$set": {
+                "status": "sending",
+                "outbound.next_attempt_at": now + self.lease
+            }},
+            sort=[("outbound.next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _defer(
+        self,
+        message: Dict[str, Any],
+        delay: float,
+        error: Optional[str] = None,
+        failed: bool = False,
+        fields: Optional[Dict[str, Any]] = None
+    ):
+        """Hand a claimed message back: due again after `delay`, or failed for good."""
+        update: Dict[str, Any] = {}
+        if failed:
+            update["$set"] = {"status": "failed"}
+            update["$unset"] = {"outbound.next_attempt_at": ""}
+        else:
+            update["$set"] = {
+                "status": "pending",
+                "outbound.next_attempt_at": datetime.utcnow() + timedelta(seconds=delay)
+            }
+        update["$set"].update(fields or {})
+        if error is not None:
+            update["$set"]["outbound.last_error"] = error
+            update["$inc"] = {"outbound.attempts": 1}
+        await db.messages.update_one({"_id": message["_id"], "status": "sending"}, update)
+
+    def _backoff(self, attempts: int, retry_after: Optional[float] = None) -> float:
+        delay = min(
+            settings.GMAIL_OUTBOUND_RETRY_BASE_SECONDS * 2 ** attempts,
+            settings.GMAIL_OUTBOUND_RETRY_MAX_SECONDS
+        )
+        delay *= 0.5 + random.random() / 2
+        return max(delay, retry_after or 0)
+
+    async def build(self, message: Dict[str, Any], channel: Dict[str, Any]) -> Dict[str, Any]:
+        """Gmail send body for a queued reply, threaded onto the customer's email."""
+        conversation = await db.conversations.find_one({"_id": ObjectId(message["conversation_id"])})
+        if not conversation:
+            raise ValueError("Conversation not found")
+        customer = await db.customers.find_one(
+            {"_id": ObjectId(conversation["customer_id"])},
+            projection={"email": 1}
+        )
+        if not customer or not customer.get("email"):
+            raise ValueError("Customer has no email address")
+
+        previous = await db.messages.find_one(
+            {
+                "conversation_id": message["conversation_id"],
+                "external.rfc822_message_id": {"$nin": [None, ""]}
+            },
+            projection={"external.rfc822_message_id": 1},
+            sort=[("created_at", -1)]
+        )
+        mime = gmail_service.build_raw_message(
+            sender=channel["identifier"],
+            to=customer["email"],
+            subject=reply_subject(conversation.get("subject", "")),
+            body=message["content"]["body"],
+            in_reply_to=previous["external"]["rfc822_message_id"] if previous else None,
+            # Reused after an unconfirmed send so the copy in the mailbox can be found
+            message_id=message["outbound"].get("rfc822_message_id")
+        )
+        mime["thread_id"] = conversation.get("external", {}).get("thread_id")
+        return mime
+
+    async def find_sent(self, access_token: str, rfc822_message_id: str) -> Optional[Dict[str, Any]]:
+        """The mailbox's copy of a message whose send may have gone through, if any."""
+        found = await gmail_service.client.list_messages(
+            access_token,
+            query=f"rfc822msgid:{rfc822_message_id}",
+            max_results=1
+        )
+        messages = found.get("messages") or []
+        return messages[0] if messages else None
+
+    async def process(self, message: Dict[str, Any]):
+        outbound = message["outbound"]
+        channel = await channel_registry.get(outbound["channel_id"])
+        if not channel:
+            await self._defer(message, 0, error="Email channel is not connected", failed=True)
+            return
+
+        if not await self.quota.try_acquire(outbound["channel_id"], SEND_QUOTA_UNITS):
+            await self._defer(message, self.quota.delay())
+            return
+
+        mime = None
+        try:
+            mime = await self.build(message, channel)
+            access_token = await gmail_service.get_access_token(channel)
+            response = None
+            if outbound.get("unconfirmed"):
+                response = await self.find_sent(access_token, mime["message_id"])
+            if response is None:
+                response = await gmail_service.client.send_message(
+                    access_token,
+                    mime["raw"],
+                    thread_id=mime["thread_id"]
+                )
+        except GmailApiError as e:
+            # Transport failures surface as 503s from the client
+            attempts = outbound.get("attempts", 0) + 1
+            failed = not e.retryable or attempts >= settings.GMAIL_OUTBOUND_MAX_ATTEMPTS
+            fields = None
+            if e.ambiguous and mime:
+                fields = {"outbound.unconfirmed": True, "outbound.rfc822_message_id": mime["message_id"]}
+            await self._defer(
+                message,
+                self._backoff(attempts, e.retry_after),
+                error=str(e),
+                failed=failed,
+                fields=fields
+            )
+            logger.warning(f"Error sending message {message['_id']} (attempt {attempts}): {str(e)}")
+            return
+        except Exception as e:
+            await self._defer(message, 0, error=str(e), failed=True)
+            logger.error(f"Error sending message {message['_id']}: {str(e)}")
+            return
+
+        now = datetime.utcnow()
+        await db.messages.update_one(
+            {"_id": message["_id"]},
+            {
+                "$set": {
+                    "status": "sent",
+                    "sent_at": now,
+                    "external": {
+                        "provider": "gmail",
+                        "message_id": response.get("id"),
+                        "thread_id": response.get("threadId"),
+                        "rfc822_message_id": mime["message_id"]
+                    }
+                },
+                "$unset": {
+                    "outbound.next_attempt_at": "",
+                    "outbound.last_error": "",
+                    "outbound.unconfirmed": ""
+                }
+            }
+        )
+        # Pick up the thread id if this is the first email on the conversation
+        if response.get("threadId"):
+            await db.conversations.update_one(
+                {"_id": ObjectId(message["conversation_id"]), "external.thread_id": {"$exists": False}},
+                {"$set": {
+                    "external": {
+                        "provider": "gmail",
+                        "channel_id": outbound["channel_id"],
+                        "thread_id": response["threadId"]
+                    }
+                }}
+            )
+
+    async def _worker(self):
+        while True:
+            # Cleared before claiming so a reply queued meanwhile still wakes us
+            self._wakeup.clear()
+            try:
+                message = await self.claim()
+            except Exception as e:
+                logger.error(f"Error claiming outbound message: {str(e)}")
+                message = None
+
+            if message is None:
+                # Idle until a reply is queued here or the poll interval passes
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), settings.GMAIL_OUTBOUND_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self.process(message)
+            except Exception as e:
+                logger.exception(f"Error processing outbound message {message['_id']}: {str(e)}")
+
+    def start(self):
+        if not self._workers:
+            self._workers = [
+                asyncio.create_task(self._worker())
+                for _ in range(settings.GMAIL_OUTBOUND_WORKERS)
+            ]
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+
+# Create a global instance
+gmail_outbound = GmailOutboundQueue()
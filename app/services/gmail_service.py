@@ -1,18 +1,24 @@
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, TYPE_CHECKING
+import logging
 import os
 from datetime import datetime, timedelta
 import base64
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
-from google.auth.exceptions import RefreshError
+from email.utils import formataddr, make_msgid
 from bson import ObjectId
 
 from ..database import db
 from ..config import settings
+from .gmail_client import GmailClient, GmailApiError
+from .gmail_tokens import GmailTokenManager
+
+logger = logging.getLogger(__name__)
+
+# The Google libraries are slow to import, so they load on first use
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import Flow
 
 # OAuth configuration
 SCOPES = [
@@ -30,28 +36,33 @@ class GmailService:
         client_secret = settings.GOOGLE_CLIENT_SECRET
         redirect_uri = settings.GOOGLE_OAUTH_REDIRECT_URI
 
-        # Debug print
-        print("\nGmailService Initialization:")
-        print(f"Settings loaded - Client ID: {'Present' if client_id else 'Missing'}")
-        print(f"Redirect URI: {redirect_uri}")
-        
+        logger.debug(f"GmailService initialized - client ID {'present' if client_id else 'missing'}, redirect URI {redirect_uri}")
+
         self.client_config = {
             "web": {
                 "client_id": client_id,
                 "client_secret": client_secret,
-                "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                "token_uri": "https://oauth2.googleapis.com/token",
+                "auth_uri": settings.GOOGLE_AUTH_URI,
+                "token_uri": settings.GOOGLE_TOKEN_URI,
                 "redirect_uris": [redirect_uri],
                 "javascript_origins": ["http://localhost:5173", "http://localhost:8000"]
             }
         }
 
-    def create_oauth_flow(self, state: Optional[str] = None) -> Flow:
+        # Shared async client for all Gmail and token endpoint calls
+        self.client = GmailClient(
+            base_url=settings.GMAIL_API_BASE_URL,
+            token_uri=self.client_config["web"]["token_uri"],
+            client_id=client_id,
+            client_secret=client_secret
+        )
+
+    def create_oauth_flow(self, state: Optional[str] = None) -> "Flow":
         """Create OAuth flow for Gmail authentication."""
+        from google_auth_oauthlib.flow import Flow
+
         try:
             redirect_uri = settings.GOOGLE_OAUTH_REDIRECT_URI
-            print(f"Creating OAuth flow with redirect URI: {redirect_uri}")
-            
             flow = Flow.from_client_config(
                 self.client_config,
                 scopes=SCOPES,
@@ -61,116 +72,158 @@ class GmailService:
             # Explicitly set the redirect URI
             flow.redirect_uri = redirect_uri
             
-            print("OAuth flow created successfully")
             return flow
             
         except Exception as e:
-            print(f"Error creating OAuth flow: {str(e)}")
+            logger.error(f"Error creating OAuth flow: {str(e)}")
             raise
 
-    def build_service(self, credentials: Credentials):
-        """Build Gmail service from credentials."""
-        return build('gmail', 'v1', credentials=credentials)
-
-    async def refresh_token_if_needed(self, channel_id: str) -> bool:
-        """Refresh token if expired or about to expire."""
-        channel = await db.channels.find_one({"_id": ObjectId(channel_id)})
-        if not channel:
-            return False
-
-        try:
-            # Check if token needs refresh (if expires in less than 5 minutes)
-            expiry = datetime.fromisoformat(str(channel["metadata"]["token_expiry"]))
-            if expiry - timedelta(minutes=5) <= datetime.utcnow():
-                print(f"Token needs refresh. Expiry: {expiry}, Current: {datetime.utcnow()}")
-                credentials = Credentials(
-                    token=channel["metadata"]["access_token"],
-                    refresh_token=channel["metadata"]["refresh_token"],
-                    token_uri=self.client_config["web"]["token_uri"],
-                    client_id=self.client_config["web"]["client_id"],
-                    client_secret=self.client_config["web"]["client_secret"],
-                    scopes=SCOPES
-                )
+    def credentials_from_token(self, token: Dict[str, Any], refresh_token: Optional[str] = None) -> "Credentials":
+        """Build Credentials from a token endpoint response."""
+        from google.oauth2.credentials import Credentials
 
-                if credentials.expired:
-                    print("Refreshing expired credentials")
-                    credentials.refresh(Request())
+        return Credentials(
+            token=token["access_token"],
+            refresh_token=token.get("refresh_token") or refresh_token,
+            token_uri=self.client_config["web"]["token_uri"],
+            client_id=self.client_config["web"]["client_id"],
+            client_secret=self.client_config["web"]["client_secret"],
+            scopes=SCOPES,
+            expiry=datetime.utcnow() + timedelta(seconds=int(token.get("expires_in", 3600)))
+        )
 
-                    # Update tokens in database
-                    await db.channels.update_one(
-                        {"_id": ObjectId(channel_id)},
-                        {"$set": {
-                            "metadata.access_token": credentials.token,
-                            "metadata.refresh_token": credentials.refresh_token,
-                            "metadata.token_expiry": credentials.expiry.isoformat()
-                        }}
-                    )
-                    print(f"Tokens updated. New expiry: {credentials.expiry}")
+    def credentials_from_channel(self, channel: Dict[str, Any]) -> "Credentials":
+        """Build Credentials from the tokens stored on a channel."""
+        from google.oauth2.credentials import Credentials
 
-            return True
+        expiry = channel["metadata"].get("token_expiry")
+        if isinstance(expiry, str):
+            expiry = datetime.fromisoformat(expiry)
+        return Credentials(
+            token=channel["metadata"]["access_token"],
+            refresh_token=channel["metadata"]["refresh_token"],
+            token_uri=self.client_config["web"]["token_uri"],
+            client_id=self.client_config["web"]["client_id"],
+            client_secret=self.client_config["web"]["client_secret"],
+            scopes=SCOPES,
+            expiry=expiry
+        )
 
-        except Exception as e:
-            print(f"Error refreshing token: {str(e)}")
-            # Token refresh failed
-            await db.channels.update_one(
-                {"_id": ObjectId(channel_id)},
-                {"$set": {"status": "inactive"}}
-            )
-            return False
+    async def fetch_credentials(self, code: str) -> "Credentials":
+        """Exchange an OAuth callback code for credentials without blocking the loop."""
+        token = await self.client.exchange_code(code, settings.GOOGLE_OAUTH_REDIRECT_URI)
+        return self.credentials_from_token(token)
+
+    async def refresh_credentials(self, credentials: "Credentials") -> "Credentials":
+        """Refresh an access token through the async client."""
+        token = await self.client.refresh_access_token(credentials.refresh_token)
+        return self.credentials_from_token(token, refresh_token=credentials.refresh_token)
+
+    async def get_access_token(self, channel: Dict[str, Any]) -> str:
+        """Return a usable access token for a channel, refreshing it if needed."""
+        credentials = await gmail_token_manager.get_credentials(channel)
+        return credentials.token
+
+    def build_raw_message(
+        self,
+        sender: str,
+        to: str,
+        subject: str,
+        body: str,
+        in_reply_to: Optional[str] = None,
+        references: Optional[str] = None,
+        sender_name: Optional[str] = None,
+        message_id: Optional[str] = None
+    ) -> Dict[str, str]:
+        """Build a plain-text MIME message for `messages.send`.
+
+        Returns the base64url `raw` payload and the Message-ID it carries,
+        which is generated unless `message_id` is given.
+        """
+        message = MIMEText(body, "plain", "utf-8")
+        message["To"] = to
+        message["From"] = formataddr((sender_name, sender)) if sender_name else sender
+        message["Subject"] = subject
+        message["Message-ID"] = message_id or make_msgid(domain=sender.split("@")[-1])
+        if in_reply_to:
+            # Lets the customer's client thread the reply
+            message["In-Reply-To"] = in_reply_to
+            message["References"] = references or in_reply_to
+
+        return {
+            "raw": base64.urlsafe_b64encode(message.as_bytes()).decode(),
+            "message_id": message["Message-ID"]
+        }
 
     async def setup_watch(self, channel_id: str) -> Dict[str, Any]:
         """Set up Gmail push notifications for new messages."""
-        print(f"Starting watch setup for channel: {channel_id}")
+        logger.debug(f"Starting watch setup for channel: {channel_id}")
         channel = await db.channels.find_one({"_id": ObjectId(channel_id)})
         if not channel:
             raise Exception("Channel not found")
 
-        credentials = Credentials(
-            token=channel["metadata"]["access_token"],
-            refresh_token=channel["metadata"]["refresh_token"],
-            token_uri=self.client_config["web"]["token_uri"],
-            client_id=self.client_config["web"]["client_id"],
-            client_secret=self.client_config["web"]["client_secret"],
-            scopes=SCOPES
-        )
-
-        service = build('gmail', 'v1', credentials=credentials)
+        access_token = await self.get_access_token(channel)
         
         try:
             # Use a single topic for all Gmail notifications
             topic_name = f"projects/{os.getenv('GOOGLE_CLOUD_PROJECT')}/topics/gmail-notifications"
-            print(f"Using Pub/Sub topic: {topic_name}")
-            
+
             request = {
                 'labelIds': ['INBOX'],
                 'topicName': topic_name,
                 'labelFilterAction': 'include',
                 'userId': 'me'
             }
-            print(f"Watch request payload: {request}")
-            
-            response = service.users().watch(userId='me', body=request).execute()
-            print(f"Watch response: {response}")
+
+            response = await self.client.watch(access_token, request)
+            logger.debug("Watch response for channel %s: %s", channel_id, response)
             
             if response:
                 update_data = {
                     "metadata.watch_active": True,
-                    "metadata.watch_expiry": datetime.fromtimestamp(int(response.get('expiration', 0)) / 1000),
-                    "metadata.history_id": response.get('historyId')
+                    "metadata.watch_expiry": datetime.fromtimestamp(int(response.get('expiration', 0)) / 1000)
                 }
-                print(f"Updating channel with watch data: {update_data}")
                 await db.channels.update_one(
                     {"_id": ObjectId(channel_id)},
                     {"$set": update_data}
                 )
+                # The response carries the mailbox's current history id. Only a
+                # new channel starts syncing from it; a renewal keeps the stored
+                # id, or changes not yet synced would be skipped
+                await db.channels.update_one(
+                    {"_id": ObjectId(channel_id), "metadata.history_id": None},
+                    {"$set": {"metadata.history_id": response.get('historyId')}}
+                )
             
             return response
             
         except Exception as e:
-            print(f"Error setting up Gmail watch: {str(e)}")
-            print(f"Error type: {type(e).__name__}")
-            print(f"Error details: {e.__dict__ if hasattr(e, '__dict__') else 'No additional details'}")
+            logger.error(f"Error setting up Gmail watch for channel {channel_id}: {type(e).__name__}: {str(e)}")
             raise
 
+class LazyGmailService:
+    """Builds the GmailService on first attribute access.
+
+    Importing a module that uses `gmail_service` stays cheap; the service
+    is constructed when an integration route or Gmail worker first needs it.
+    """
+
+    def __init__(self):
+        self._service: Optional[GmailService] = None
+
+    def __getattr__(self, name: str):
+        if self._service is None:
+            self._service = GmailService()
+        return getattr(self._service, name)
+
+    async def close(self):
+        """Close the HTTP client, if the service was ever built."""
+        if self._service is not None:
+            await self._service.client.close()
+
+
 # Create a global instance
-gmail_service = GmailService() 
\ No newline at end of file
+gmail_service = LazyGmailService()
+# Cached credentials and proactive refresh; a background job in every worker,
+# so it holds the lazy service and builds it only when a token is needed
+gmail_token_manager = GmailTokenManager(gmail_service) 
\ No newline at end of file
@@ -0,0 +1,167 @@
+from typing import Optional, Dict, Any, List, Set
+from datetime import datetime
+import asyncio
+import logging
+
+from ..database import db
+from ..config import settings
+from .gmail_client import GmailApiError
+from .gmail_service import gmail_service
+from .channel_registry import channel_registry
+from .gmail_ingest import parse_message, store_message, is_inbound
+
+logger = logging.getLogger(__name__)
+
+
+class GmailSyncWorker:
+    """Pulls new mail for mailboxes that received a Pub/Sub notification.
+
+    Notifications only enqueue the mailbox. While a mailbox is queued,
+    further notifications are folded into the same sync; if one arrives
+    while the mailbox is being synced it is queued once more afterwards.
+    Each sync reads `history.list` from the stored `history_id`, so a burst
+    of notifications costs one history walk rather than one per message.
+    """
+
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._notified: Dict[str, int] = {}
+        self._queued: Set[str] = set()
+        self._active: Set[str] = set()
+        self._dirty: Set[str] = set()
+        self._workers: List[asyncio.Task] = []
+
+    def notify(self, email_address: str, history_id: Optional[str] = None):
+        """Record a push notification for a mailbox. Never blocks."""
+        mailbox = email_address.lower()
+        if history_id and str(history_id).isdigit():
+            self._notified[mailbox] = max(self._notified.get(mailbox, 0), int(history_id))
+
+        if mailbox in self._active:
+            self._dirty.add(mailbox)
+        elif mailbox not in self._queued:
+            self._queued.add(mailbox)
+            self.queue.put_nowait(mailbox)
+
+    async def _worker(self):
+        while True:
+            mailbox = await self.queue.get()
+            self._queued.discard(mailbox)
+            self._active.add(mailbox)
+            notified_history_id = self._notified.pop(mailbox, None)
+            try:
+                await self.sync_mailbox(mailbox, notified_history_id)
+            except Exception as e:
+                logger.error(f"Error syncing mailbox {mailbox}: {str(e)}")
+            finally:
+                self._active.discard(mailbox)
+                self.queue.task_done()
+
+            if mailbox in self._dirty:
+                self._dirty.discard(mailbox)
+                self.notify(mailbox)
+
+    async def find_channel(self, mailbox: str) -> Optional[Dict[str, Any]]:
+        channel = await channel_registry.find("email", mailbox)
+        if not channel or channel.get("metadata", {}).get("provider") != "gmail":
+            return None
+        return channel
+
+    async def list_added_messages(self, access_token: str, start_history_id: str):
+        """Walk history since `start_history_id`. Returns (message ids, latest history id)."""
+        message_ids: List[str] = []
+        seen: Set[str] = set()
+        latest_history_id = start_history_id
+        page_token = None
+
+        while True:
+            page = await gmail_service.client.list_history(
+                access_token,
+                start_history_id,
+                page_token=page_token,
+                history_types=["messageAdded"]
+            )
+            for record in page.get("history", []):
+                for added in record.get("messagesAdded", []):
+                    message = added.get("message", {})
+                    if message.get("id") and message["id"] not in seen:
+                        seen.add(message["id"])
+                        message_ids.append(message["id"])
+
+            latest_history_id = page.get("historyId", latest_history_id)
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                return message_ids, latest_history_id
+
+    async def sync_mailbox(self, mailbox: str, notified_history_id: Optional[int] = None) -> int:
+        """Import messages added since the stored history id. Returns the number stored."""
+        channel = await self.find_channel(mailbox)
+        if not channel:
+            return 0
+
+        # The sync cursor moves on every notification, so it is never cached
+        state = await db.channels.find_one({"_id": channel["_id"]}, projection={"metadata.history_id": 1})
+        start_history_id = (state or {}).get("metadata", {}).get("history_id")
+        if not start_history_id:
+            # Nothing to diff against yet; start from this notification
+            if notified_history_id:
+                await self._save_history_id(channel, None, str(notified_history_id))
+            return 0
+
+        access_token = await gmail_service.get_access_token(channel)
+        try:
+            message_ids, latest_history_id = await self.list_added_messages(access_token, start_history_id)
+        except GmailApiError as e:
+            if e.status_code != 404:
+                raise
+            # History older than Gmail keeps; resume from the notification
+            logger.warning(f"History {start_history_id} expired for {mailbox}, resetting")
+            if notified_history_id:
+                await self._save_history_id(channel, start_history_id, str(notified_history_id))
+            return 0
+
+        stored = 0
+        batch_size = settings.GMAIL_SYNC_BATCH_SIZE
+        for offset in range(0, len(message_ids), batch_size):
+            messages = await gmail_service.client.get_messages(
+                access_token,
+                message_ids[offset:offset + batch_size]
+            )
+            for message in messages:
+                if not message:
+                    continue
+                parsed = parse_message(message)
+                if not is_inbound(parsed, mailbox):
+                    continue
+                if await store_message(channel, parsed, access_token):
+                    stored += 1
+
+        # Only advance once everything up to latest_history_id is stored
+        await self._save_history_id(channel, start_history_id, str(latest_history_id))
+        return stored
+
+    async def _save_history_id(self, channel: Dict[str, Any], expected: Optional[str], history_id: str):
+        await db.channels.update_one(
+            {"_id": channel["_id"], "metadata.history_id": expected},
+            {"$set": {
+                "metadata.history_id": history_id,
+                "metadata.last_synced_at": datetime.utcnow()
+            }}
+        )
+
+    def start(self):
+        if not self._workers:
+            self._workers = [
+                asyncio.create_task(self._worker())
+                for _ in range(settings.GMAIL_SYNC_WORKERS)
+            ]
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+
+# Create a global instance
+gmail_sync_worker = GmailSyncWorker()
@@ -0,0 +1,185 @@
+from typing import Dict, Any, Set, Union, Optional, TYPE_CHECKING
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import random
+
+from bson import ObjectId
+
+from ..database import db
+from ..config import settings
+from ..utils.cache import TTLCache
+from .gmail_client import GmailApiError
+from .channel_registry import channel_registry
+from .scheduler import PeriodicJob
+
+logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+
+# Token endpoint answers that mean the grant is gone, not that Google is struggling
+REVOKED_STATUSES = {400, 401}
+
+# Tokens closer than this to expiry are refreshed before use
+REQUEST_MARGIN = timedelta(minutes=1)
+
+
+class GmailTokenManager(PeriodicJob):
+    """Keeps Gmail access tokens fresh ahead of expiry.
+
+    Live Credentials are cached in memory per channel. Refreshes are
+    single-flight: concurrent callers for one channel share the same
+    in-flight refresh. The periodic scan (one worker at a time) picks up
+    channels whose `metadata.token_expiry` falls within the refresh lead and
+    spreads their refreshes over a jitter window, so tokens are renewed as
+    a steady trickle instead of at request time.
+    """
+
+    name = "gmail_token_refresh"
+
+    def __init__(self, gmail_service):
+        super().__init__(interval=settings.GMAIL_TOKEN_SCAN_INTERVAL_SECONDS)
+        self.service = gmail_service
+        self.lead = timedelta(seconds=settings.GMAIL_TOKEN_REFRESH_LEAD_SECONDS)
+        self.jitter = settings.GMAIL_TOKEN_REFRESH_JITTER_SECONDS
+        self._credentials = TTLCache(
+            maxsize=settings.GMAIL_CREDENTIALS_CACHE_SIZE,
+            ttl=settings.GMAIL_CREDENTIALS_CACHE_TTL_SECONDS
+        )
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._scheduled: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._semaphore = asyncio.Semaphore(settings.GMAIL_TOKEN_REFRESH_CONCURRENCY)
+
+    def _fresh(self, credentials: "Credentials", margin: timedelta) -> bool:
+        return credentials.expiry is not None and credentials.expiry - margin > datetime.utcnow()
+
+    def invalidate(self, channel_id: str):
+        self._credentials.delete(channel_id)
+
+    async def get_credentials(self, channel: Union[str, Dict[str, Any]]) -> "Credentials":
+        """Valid credentials for a channel id or document, refreshing only if needed."""
+        channel_id = channel if isinstance(channel, str) else str(channel["_id"])
+        credentials = self._credentials.get(channel_id)
+        # At request time only refresh tokens that are about to lapse
+        if credentials and self._fresh(credentials, REQUEST_MARGIN):
+            return credentials
+
+        # Registry entries carry no tokens; full channel documents do
+        if isinstance(channel, dict) and "access_token" in channel.get("metadata", {}):
+            credentials = self.service.credentials_from_channel(channel)
+            if self._fresh(credentials, REQUEST_MARGIN):
+                self._credentials.set(channel_id, credentials)
+                return credentials
+
+        return await self.refresh(channel_id)
+
+    async def refresh(self, channel_id: str, margin: Optional[timedelta] = None) -> "Credentials":
+        """Refresh a channel's token unless it is still valid for `margin`.
+
+        Concurrent callers for the same channel share one refresh.
+        """
+        future = self._inflight.get(channel_id)
+        if future is None:
+            future = asyncio.ensure_future(self._refresh(channel_id, margin or REQUEST_MARGIN))
+            self._inflight[channel_id] = future
+            future.add_done_callback(lambda _: self._inflight.pop(channel_id, None))
+        # Shield so one cancelled caller doesn't cancel the refresh for everyone else
+        return await asyncio.shield(future)
+
+    async def _refresh(self, channel_id: str, margin: timedelta) -> "Credentials":
+        channel = await db.channels.find_one({"_id": ObjectId(channel_id)})
+        if not channel or channel.get("status") != "active":
+            self.invalidate(channel_id)
+            raise GmailApiError(404, f"Channel {channel_id} is not active")
+
+        credentials = self.service.credentials_from_channel(channel)
+        # Another worker may already have refreshed it
+        if self._fresh(credentials, margin):
+            self._credentials.set(channel_id, credentials)
+            return credentials
+
+        try:
+            credentials = await self.service.refresh_credentials(credentials)
+        except GmailApiError as e:
+            if e.status_code in REVOKED_STATUSES:
+                # The grant was revoked or expired; the user has to reconnect
+                self.invalidate(channel_id)
+                channel_registry.invalidate(channel_id)
+                await db.channels.update_one(
+                    {"_id": channel["_id"]},
+                    {"$set": {
+                        "status": "inactive",
+                        "metadata.token_error": e.message,
+                        "updated_at": datetime.utcnow()
+                    }}
+                )
+            raise
+
+        await db.channels.update_one(
+            {"_id": channel["_id"]},
+            {"$set": {
+                "metadata.access_token": credentials.token,
+                "metadata.refresh_token": credentials.refresh_token,
+                "metadata.token_expiry": credentials.expiry
+            }}
+        )
+        self._credentials.set(channel_id, credentials)
+        return credentials
+
+    async def _refresh_later(self, channel_id: str, delay: float):
+        try:
+            await asyncio.sleep(delay)
+            async with self._semaphore:
+                await self.refresh(
+                    channel_id,
+                    margin=self.lead + timedelta(seconds=self.jitter + self.interval)
+                )
+        except Exception as e:
+            logger.error(f"Error refreshing token for channel {channel_id}: {str(e)}")
+        finally:
+            self._scheduled.discard(channel_id)
+
+    async def _normalize_expiry(self):
+        """Convert token expiries stored as ISO strings so the range query sees them."""
+        async for channel in db.channels.find(
+            {"metadata.token_expiry": {"$type": "string"}},
+            projection={"metadata.token_expiry": 1}
+        ).limit(1000):
+            await db.channels.update_one(
+                {"_id": channel["_id"]},
+                {"$set": {"metadata.token_expiry": datetime.fromisoformat(channel["metadata"]["token_expiry"])}}
+            )
+
+    async def run_once(self):
+        await self._normalize_expiry()
+
+        now = datetime.utcnow()
+        # Pick channels up while their whole jitter window is still ahead of them
+        horizon = now + self.lead + timedelta(seconds=self.jitter + self.interval)
+        cursor = db.channels.find(
+            {
+                "status": "active",
+                "metadata.provider": "gmail",
+                "metadata.token_expiry": {"$lte": horizon}
+            },
+            projection={"metadata.token_expiry": 1}
+        )
+        async for channel in cursor:
+            channel_id = str(channel["_id"])
+            if channel_id in self._scheduled:
+                continue
+            # Aim somewhere in the jitter window before the lead so refreshes don't bunch up
+            target = channel["metadata"]["token_expiry"] - self.lead - timedelta(seconds=random.uniform(0, self.jitter))
+            delay = max(0.0, (target - now).total_seconds())
+            self._scheduled.add(channel_id)
+            task = asyncio.create_task(self._refresh_later(channel_id, delay))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await super().stop()
@@ -0,0 +1,97 @@
+from typing import Dict, Any
+from datetime import datetime, timedelta
+import asyncio
+import logging
+
+from ..database import db
+from ..config import settings
+from ..utils.rate_limit import TokenBucket
+from .scheduler import PeriodicJob
+from .gmail_service import gmail_service
+
+logger = logging.getLogger(__name__)
+
+
+class GmailWatchRenewer(PeriodicJob):
+    """Renews Gmail watches before they expire.
+
+    Gmail stops sending notifications about 7 days after `users.watch`.
+    Each run takes the channels whose `metadata.watch_expiry` falls within
+    the renewal window (oldest first, via the index on that field), and
+    renews a bounded batch with limited concurrency, paced by a token
+    bucket so renewals trickle out instead of hitting Google's quota in
+    bursts. Failures are recorded on the channel and retried with backoff.
+    """
+
+    name = "gmail_watch_renewal"
+
+    def __init__(self, gmail_service):
+        super().__init__(interval=settings.GMAIL_WATCH_SCAN_INTERVAL_SECONDS)
+        self.service = gmail_service
+        self.renew_before = timedelta(hours=settings.GMAIL_WATCH_RENEW_BEFORE_HOURS)
+        self.bucket = TokenBucket(settings.GMAIL_WATCH_RENEWALS_PER_SECOND)
+
+    async def renew(self, channel: Dict[str, Any]) -> bool:
+        channel_id = str(channel["_id"])
+        await self.bucket.acquire()
+        try:
+            await self.service.setup_watch(channel_id)
+        except Exception as e:
+            failures = channel.get("metadata", {}).get("watch_failures", 0) + 1
+            backoff = min(
+                settings.GMAIL_WATCH_RETRY_BASE_SECONDS * 2 ** (failures - 1),
+                settings.GMAIL_WATCH_RETRY_MAX_SECONDS
+            )
+            update = {
+                "metadata.watch_failures": failures,
+                "metadata.watch_error": str(e),
+                "metadata.watch_retry_at": datetime.utcnow() + timedelta(seconds=backoff)
+            }
+            if failures >= settings.GMAIL_WATCH_MAX_FAILURES:
+                # Keep retrying, but surface that the mailbox is no longer syncing
+                update["metadata.watch_active"] = False
+                update["metadata.watch_failed"] = True
+            await db.channels.update_one({"_id": channel["_id"]}, {"$set": update})
+            logger.warning(f"Watch renewal failed for channel {channel_id} ({failures} failures): {str(e)}")
+            return False
+
+        await db.channels.update_one(
+            {"_id": channel["_id"]},
+            {"$unset": {
+                "metadata.watch_failures": "",
+                "metadata.watch_error": "",
+                "metadata.watch_retry_at": "",
+                "metadata.watch_failed": ""
+            }}
+        )
+        return True
+
+    async def run_once(self):
+        now = datetime.utcnow()
+        channels = await db.channels.find(
+            {
+                "status": "active",
+                "metadata.provider": "gmail",
+                "metadata.watch_expiry": {"$lte": now + self.renew_before},
+                "$or": [
+                    {"metadata.watch_retry_at": {"$exists": False}},
+                    {"metadata.watch_retry_at": {"$lte": now}}
+                ]
+            },
+            projection={"metadata.watch_expiry": 1, "metadata.watch_failures": 1}
+        ).sort("metadata.watch_expiry", 1).limit(settings.GMAIL_WATCH_RENEWAL_BATCH).to_list(None)
+        if not channels:
+            return
+
+        semaphore = asyncio.Semaphore(settings.GMAIL_WATCH_RENEWAL_CONCURRENCY)
+
+        async def renew(channel):
+            async with semaphore:
+                return await self.renew(channel)
+
+        results = await asyncio.gather(*(renew(channel) for channel in channels))
+        logger.info(f"Renewed {sum(results)} of {len(channels)} Gmail watches")
+
+
+# Create a global instance
+gmail_watch_renewer = GmailWatchRenewer(gmail_service)
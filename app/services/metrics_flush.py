@@ -0,0 +1,24 @@
+from ..config import settings
+from ..utils.metrics import dump_snapshot
+from .scheduler import PeriodicJob
+
+
+class MetricsFlushJob(PeriodicJob):
+    """Writes this worker's metrics to METRICS_MULTIPROC_DIR for the other workers' scrapes."""
+
+    name = "metrics_flush"
+    exclusive = False
+
+    def __init__(self):
+        super().__init__(interval=settings.METRICS_FLUSH_SECONDS)
+
+    async def run_once(self):
+        dump_snapshot()
+
+    def start(self):
+        if settings.METRICS_MULTIPROC_DIR:
+            super().start()
+
+
+# Create a global instance
+metrics_flush_job = MetricsFlushJob()
@@ -0,0 +1,123 @@
+from typing import Optional, Dict, Any
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import os
+import socket
+import uuid
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from ..database import db
+
+logger = logging.getLogger(__name__)
+
+# Identifies this process when holding job leases
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class PeriodicJob:
+    """Background job that runs `run_once` every `interval` seconds.
+
+    Only one process at a time runs a given job: each tick first acquires a
+    lease document in `job_state`, so scaling out web workers never makes an
+    incremental job process the same window twice. Job state such as
+    watermarks lives on the same document. Jobs that maintain per-process
+    state set `exclusive = False` to run in every worker.
+    """
+
+    name: str = "job"
+    exclusive: bool = True
+
+    def __init__(self, interval: float, lease_seconds: Optional[float] = None):
+        self.interval = interval
+        self.lease_seconds = lease_seconds or max(interval * 2, 60)
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+
+    async def run_once(self) -> None:
+        raise NotImplementedError
+
+    async def acquire_lease(self) -> bool:
+        """Take or extend the lease for this job. Returns False if another worker holds it."""
+        now = datetime.utcnow()
+        try:
+            state = await db.job_state.find_one_and_update(
+                {
+                    "_id": self.name,
+                    "$or": [
+                        {"lease_owner": WORKER_ID},
+                        {"lease_until": {"$lt": now}},
+                        {"lease_until": {"$exists": False}}
+                    ]
+                },
+                {"$set": {
+                    "lease_owner": WORKER_ID,
+                    "lease_until": now + timedelta(seconds=self.lease_seconds)
+                }},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Upsert raced with a document held by another worker
+            return False
+        return state is not None
+
+    async def release_lease(self) -> None:
+        await db.job_state.update_one(
+            {"_id": self.name, "lease_owner": WORKER_ID},
+            {"$set": {"lease_until": datetime.utcnow()}}
+        )
+
+    async def get_state(self) -> Dict[str, Any]:
+        return await db.job_state.find_one({"_id": self.name}) or {}
+
+    async def save_state(self, **fields) -> None:
+        await db.job_state.update_one(
+            {"_id": self.name},
+            {"$set": fields},
+            upsert=True
+        )
+
+    async def tick(self) -> bool:
+        """Run one iteration if this worker holds the lease."""
+        if self.exclusive and not await self.acquire_lease():
+            return False
+        await self.run_once()
+        return True
+
+    async def _loop(self):
+        while not self._stopping.is_set():
+            try:
+                await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"Error running job {self.name}: {str(e)}")
+
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopping.set()
+        try:
+            await asyncio.wait_for(self._task, timeout=10)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            self._task.cancel()
+        self._task = None
+        if not self.exclusive:
+            return
+        try:
+            await self.release_lease()
+        except Exception as e:
+            logger.error(f"Error releasing lease for {self.name}: {str(e)}")
@@ -0,0 +1,202 @@
+from typing import Optional, Dict, Any, List, Callable, Awaitable, Set, Tuple
+from datetime import datetime, timedelta
+import asyncio
+import heapq
+import logging
+
+from bson import ObjectId
+
+from ..database import db
+from ..config import settings
+from .scheduler import PeriodicJob
+
+logger = logging.getLogger(__name__)
+
+FIRST_RESPONSE = "first_response"
+RESOLUTION = "resolution"
+KINDS = [FIRST_RESPONSE, RESOLUTION]
+
+BreachHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+def to_millis(value: datetime) -> datetime:
+    """Truncate to the millisecond precision Mongo stores dates with.
+
+    Deadlines are matched by equality when they fire, so the value kept in
+    memory has to be the one that comes back from Mongo.
+    """
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+
+def build_sla(created_at: datetime) -> Dict[str, Any]:
+    """Initial SLA state stored on a new conversation."""
+    return {
+        "first_response_due": to_millis(created_at + timedelta(minutes=settings.SLA_FIRST_RESPONSE_MINUTES)),
+        "first_response_pending": True,
+        "resolution_due": to_millis(created_at + timedelta(minutes=settings.SLA_RESOLUTION_MINUTES)),
+        "resolution_pending": True
+    }
+
+
+async def record_breach(event: Dict[str, Any]):
+    """Default breach handler: keep a record for reporting."""
+    await db.sla_breaches.insert_one(event)
+    logger.info(f"SLA breach: {event['kind']} for conversation {event['conversation_id']}")
+
+
+class SlaScheduler(PeriodicJob):
+    """Fires SLA breach events for conversation deadlines.
+
+    Deadlines are persisted on the conversation (`sla.*_due` plus a
+    `*_pending` flag) so they survive restarts. Timers work on two levels:
+    the partial indexes on those fields hold every outstanding deadline,
+    and each refill moves the ones due within the next horizon into an
+    in-memory heap that a single task sleeps on. Firing is a conditional
+    update on the pending flag, so a deadline cleared by any worker (or
+    fired by a previous leader) is never reported twice.
+    """
+
+    name = "sla_scheduler"
+
+    def __init__(self):
+        super().__init__(interval=settings.SLA_REFILL_INTERVAL_SECONDS)
+        self.horizon = timedelta(seconds=settings.SLA_HORIZON_SECONDS)
+        self.handlers: List[BreachHandler] = [record_breach]
+        self._heap: List[Tuple[datetime, str, str]] = []
+        self._scheduled: Set[Tuple[datetime, str, str]] = set()
+        self._wakeup = asyncio.Event()
+        self._fire_task: Optional[asyncio.Task] = None
+
+    def add_handler(self, handler: BreachHandler):
+        self.handlers.append(handler)
+
+    def track(self, conversation_id: str, kind: str, due: datetime):
+        """Add a deadline to the in-memory level if it falls within the horizon."""
+        due = to_millis(due)
+        entry = (due, conversation_id, kind)
+        if entry in self._scheduled or due > datetime.utcnow() + self.horizon:
+            return
+        self._scheduled.add(entry)
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wakeup.set()
+
+    def track_conversation(self, conversation_id: str, sla: Dict[str, Any]):
+        for kind in KINDS:
+            if sla.get(f"{kind}_pending"):
+                self.track(conversation_id, kind, sla[f"{kind}_due"])
+
+    async def run_once(self):
+        """Load deadlines due within the horizon from Mongo."""
+        until = datetime.utcnow() + self.horizon
+        for kind in KINDS:
+            cursor = db.conversations.find(
+                {
+                    f"sla.{kind}_pending": True,
+                    f"sla.{kind}_due": {"$lte": until}
+                },
+                projection={f"sla.{kind}_due": 1}
+            )
+            async for conversation in cursor:
+                self.track(str(conversation["_id"]), kind, conversation["sla"][f"{kind}_due"])
+
+    async def on_message(self, conversation_id: str, sender_type: str, created_at: Optional[datetime] = None):
+        """A reply from an assistant or team member satisfies the first-response SLA."""
+        if sender_type not in ("assistant", "team"):
+            return
+        await db.conversations.update_one(
+            {"_id": ObjectId(conversation_id), "sla.first_response_pending": True},
+            {"$set": {
+                "sla.first_response_pending": False,
+                "sla.first_response_at": created_at or datetime.utcnow()
+            }}
+        )
+
+    async def on_status(self, conversation_id: str, status: str):
+        """Resolving stops the resolution timer; reopening starts a new one."""
+        if status == "resolved":
+            await db.conversations.update_one(
+                {"_id": ObjectId(conversation_id)},
+                {"$set": {"sla.resolution_pending": False}}
+            )
+            return
+
+        due = to_millis(datetime.utcnow() + timedelta(minutes=settings.SLA_RESOLUTION_MINUTES))
+        result = await db.conversations.update_one(
+            {"_id": ObjectId(conversation_id), "sla.resolution_pending": {"$ne": True}},
+            {"$set": {"sla.resolution_pending": True, "sla.resolution_due": due}}
+        )
+        if result.modified_count:
+            self.track(conversation_id, RESOLUTION, due)
+
+    async def _fire(self, due: datetime, conversation_id: str, kind: str):
+        now = datetime.utcnow()
+        conversation = await db.conversations.find_one_and_update(
+            {
+                "_id": ObjectId(conversation_id),
+                f"sla.{kind}_pending": True,
+                f"sla.{kind}_due": due
+            },
+            {"$set": {
+                f"sla.{kind}_pending": False,
+                f"sla.{kind}_breached": True,
+                f"sla.{kind}_breached_at": now
+            }},
+            projection={"organization_id": 1, "assigned_to": 1, "channel": 1}
+        )
+        if not conversation:
+            # Satisfied, rescheduled or already fired elsewhere
+            return
+
+        event = {
+            "conversation_id": conversation_id,
+            "organization_id": conversation.get("organization_id"),
+            "assigned_to": conversation.get("assigned_to"),
+            "channel": conversation.get("channel"),
+            "kind": kind,
+            "due_at": due,
+            "breached_at": now
+        }
+        for handler in self.handlers:
+            try:
+                await handler(dict(event))
+            except Exception as e:
+                logger.exception(f"Error in SLA breach handler: {str(e)}")
+
+    async def _fire_loop(self):
+        while not self._stopping.is_set():
+            now = datetime.utcnow()
+            while self._heap and self._heap[0][0] <= now:
+                entry = heapq.heappop(self._heap)
+                self._scheduled.discard(entry)
+                try:
+                    await self._fire(*entry)
+                except Exception as e:
+                    logger.exception(f"Error firing SLA deadline: {str(e)}")
+
+            timeout = (self._heap[0][0] - now).total_seconds() if self._heap else self.horizon.total_seconds()
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        super().start()
+        if self._fire_task is None or self._fire_task.done():
+            self._wakeup = asyncio.Event()
+            self._fire_task = asyncio.create_task(self._fire_loop())
+
+    async def stop(self):
+        if self._fire_task is not None:
+            self._fire_task.cancel()
+            try:
+                await self._fire_task
+            except asyncio.CancelledError:
+                pass
+            self._fire_task = None
+        await super().stop()
+
+
+# Create a global instance
+sla_scheduler = SlaScheduler()
@@ -0,0 +1,40 @@
+import logging
+
+from ..config import settings
+from ..database import get_database
+from ..utils.slow_queries import slow_query_log, summarize_explain
+from .scheduler import PeriodicJob
+
+logger = logging.getLogger(__name__)
+
+
+class SlowQueryExplainer(PeriodicJob):
+    """Runs `explain` for the slow query shapes sampled by this worker's listener."""
+
+    name = "slow_query_explainer"
+    exclusive = False
+
+    def __init__(self):
+        super().__init__(interval=settings.SLOW_QUERY_EXPLAIN_POLL_SECONDS)
+
+    async def run_once(self):
+        queue = slow_query_log.explain_queue
+        while queue and not self._stopping.is_set():
+            key, database, command = queue.popleft()
+            try:
+                explain = await get_database().client[database].command(
+                    {"explain": command, "verbosity": "executionStats"}
+                )
+            except Exception as e:
+                logger.warning(f"Error explaining slow query {key}: {str(e)}")
+                continue
+            summary = summarize_explain(explain)
+            slow_query_log.set_explain(key, summary)
+            logger.info(
+                f"Slow query plan: {summary['plan']} examined {summary['docs_examined']} docs / "
+                f"{summary['keys_examined']} keys for {summary['docs_returned']} returned: {key}"
+            )
+
+
+# Create a global instance
+slow_query_explainer = SlowQueryExplainer()
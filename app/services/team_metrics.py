@@ -0,0 +1,211 @@
+from typing import Dict, Any, List, Tuple
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from ..database import db
+from ..config import settings
+from ..utils.aggregation import response_time_stages, day_expr, ratio_expr, add_to_totals_stage
+from .scheduler import PeriodicJob
+
+# Counters kept per team member and per team member/day
+COUNTERS = [
+    "conversations_handled",
+    "conversations_resolved",
+    "satisfaction_sum",
+    "satisfaction_count",
+    "messages",
+    "response_time_sum",
+    "response_count"
+]
+
+DEFAULT_METRICS = {
+    "conversations_handled": 0,
+    "average_response_time": 0.0,
+    "customer_satisfaction": 0.0,
+    "resolution_rate": 0.0
+}
+
+
+class TeamMetricsJob(PeriodicJob):
+    """Maintains per-member daily rollups and TeamMemberMetrics on user documents.
+
+    Each run reads only the events that happened since the watermark:
+    conversations assigned to a member (by `assigned_at`), conversations
+    resolved (by `resolved_at`) and replies sent by members. The counters
+    are added to `team_member_metrics_daily` and to the running totals on the
+    member's user document, so the team leaderboard is a single indexed read.
+    Documents record the last window applied to them, so a window replayed
+    after a crash before the watermark was saved isn't counted twice.
+    """
+
+    name = "team_metrics"
+
+    def __init__(self):
+        super().__init__(interval=settings.TEAM_METRICS_INTERVAL_SECONDS)
+        self.settle = timedelta(seconds=settings.TEAM_METRICS_SETTLE_SECONDS)
+        self.max_window = timedelta(hours=settings.TEAM_METRICS_MAX_WINDOW_HOURS)
+
+    async def _initial_watermark(self) -> datetime:
+        assigned = {"assigned_to.team_member_id": {"$nin": [None, ""]}}
+        first_assigned = await db.conversations.find_one(
+            {**assigned, "assigned_at": {"$exists": True}},
+            sort=[("assigned_at", 1)],
+            projection={"assigned_at": 1}
+        )
+        first_legacy = await db.conversations.find_one(
+            {**assigned, "assigned_at": {"$exists": False}},
+            sort=[("created_at", 1)],
+            projection={"created_at": 1}
+        )
+        times = [
+            document[field]
+            for document, field in ((first_assigned, "assigned_at"), (first_legacy, "created_at"))
+            if document
+        ]
+        if not times:
+            return datetime.utcnow() - self.settle
+        return min(times) - timedelta(microseconds=1)
+
+    def assignment_pipeline(self, since: datetime, until: datetime) -> List[Dict[str, Any]]:
+        window = {"$gt": since, "$lte": until}
+        return [
+            {"$match": {
+                # Conversations from before assigned_at was stamped count by created_at
+                "$or": [
+                    {"assigned_at": window},
+                    {"assigned_at": {"$exists": False}, "created_at": window}
+                ],
+                "assigned_to.team_member_id": {"$nin": [None, ""]}
+            }},
+            {"$group": {
+                "_id": {
+                    "team_member_id": "$assigned_to.team_member_id",
+                    "date": day_expr({"$ifNull": ["$assigned_at", "$created_at"]})
+                },
+                "conversations_handled": {"$sum": 1}
+            }}
+        ]
+
+    def resolution_pipeline(self, since: datetime, until: datetime) -> List[Dict[str, Any]]:
+        return [
+            {"$match": {
+                "resolved_at": {"$gt": since, "$lte": until},
+                "assigned_to.team_member_id": {"$nin": [None, ""]}
+            }},
+            {"$group": {
+                "_id": {
+                    "team_member_id": "$assigned_to.team_member_id",
+                    "date": day_expr("$resolved_at")
+                },
+                "conversations_resolved": {"$sum": 1},
+                "satisfaction_sum": {"$sum": {"$ifNull": ["$metrics.customer_satisfaction", 0]}},
+                "satisfaction_count": {"$sum": {"$cond": [
+                    {"$isNumber": "$metrics.customer_satisfaction"}, 1, 0
+                ]}}
+            }}
+        ]
+
+    def message_pipeline(self, since: datetime, until: datetime) -> List[Dict[str, Any]]:
+        return [
+            {"$match": {
+                "sender.type": "team",
+                "created_at": {"$gt": since, "$lte": until}
+            }},
+            *response_time_stages(),
+            {"$group": {
+                "_id": {"team_member_id": "$sender.id", "date": day_expr()},
+                "messages": {"$sum": 1},
+                "response_time_sum": {"$sum": {"$ifNull": ["$response_time", 0]}},
+                "response_count": {"$sum": {"$cond": [
+                    {"$ne": [{"$ifNull": ["$response_time", None]}, None]}, 1, 0
+                ]}}
+            }}
+        ]
+
+    async def process_window(self, since: datetime, until: datetime) -> int:
+        """Aggregate one window of events and apply it. Returns the number of member/day buckets."""
+        buckets: Dict[Tuple[str, str], Dict[str, float]] = {}
+        sources = [
+            (db.conversations, self.assignment_pipeline(since, until)),
+            (db.conversations, self.resolution_pipeline(since, until)),
+            (db.messages, self.message_pipeline(since, until))
+        ]
+        for collection, pipeline in sources:
+            async for row in collection.aggregate(pipeline, allowDiskUse=True):
+                member_id = row["_id"]["team_member_id"]
+                if not member_id or not ObjectId.is_valid(member_id):
+                    continue
+                bucket = buckets.setdefault(
+                    (member_id, row["_id"]["date"]),
+                    dict.fromkeys(COUNTERS, 0)
+                )
+                for counter in COUNTERS:
+                    bucket[counter] += row.get(counter, 0)
+
+        if not buckets:
+            return 0
+
+        daily_ops = []
+        totals: Dict[str, Dict[str, float]] = {}
+        for (member_id, date), increments in buckets.items():
+            daily_ops.append(UpdateOne(
+                {"team_member_id": member_id, "date": date},
+                [add_to_totals_stage(None, increments, until), {"$set": {"updated_at": until}}],
+                upsert=True
+            ))
+            member_totals = totals.setdefault(member_id, dict.fromkeys(COUNTERS, 0))
+            for counter in COUNTERS:
+                member_totals[counter] += increments[counter]
+
+        await db.team_member_metrics_daily.bulk_write(daily_ops, ordered=False)
+
+        member_ops = [
+            UpdateOne(
+                {"_id": ObjectId(member_id)},
+                [
+                    add_to_totals_stage("metrics_totals", increments, until),
+                    {"$set": {
+                        "metrics.conversations_handled": "$metrics_totals.conversations_handled",
+                        "metrics.average_response_time": ratio_expr(
+                            "$metrics_totals.response_time_sum", "$metrics_totals.response_count"
+                        ),
+                        "metrics.customer_satisfaction": ratio_expr(
+                            "$metrics_totals.satisfaction_sum", "$metrics_totals.satisfaction_count"
+                        ),
+                        # Reopened conversations can be resolved more than once
+                        "metrics.resolution_rate": {"$min": [1.0, ratio_expr(
+                            "$metrics_totals.conversations_resolved",
+                            "$metrics_totals.conversations_handled"
+                        )]},
+                        "metrics_updated_at": until
+                    }}
+                ]
+            )
+            for member_id, increments in totals.items()
+        ]
+        await db.users.bulk_write(member_ops, ordered=False)
+
+        return len(buckets)
+
+    async def run_once(self):
+        state = await self.get_state()
+        since = state.get("watermark") or await self._initial_watermark()
+        # Leave a settle period so events still being written are picked up next run
+        until = datetime.utcnow() - self.settle
+
+        # A window interrupted before its watermark was saved is replayed with
+        # the same end, which the documents it already reached recognise
+        window_end = state.get("window_end")
+        while since < until:
+            if window_end is None or window_end <= since:
+                window_end = min(since + self.max_window, until)
+                await self.save_state(window_end=window_end)
+            await self.process_window(since, window_end)
+            # Advance the watermark only once the window has been applied
+            await self.save_state(watermark=window_end)
+            since, window_end = window_end, None
+
+
+# Create a global instance
+team_metrics_job = TeamMetricsJob()
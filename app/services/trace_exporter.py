@@ -0,0 +1,57 @@
+from typing import Optional, TYPE_CHECKING
+import logging
+
+from ..config import settings
+from ..utils.tracing import export_queue, otlp_payload
+from .scheduler import PeriodicJob
+
+logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    import httpx
+
+
+class TraceExporter(PeriodicJob):
+    """Posts finished sampled traces to an OTLP/HTTP collector (e.g. http://localhost:4318/v1/traces)."""
+
+    name = "trace_exporter"
+    exclusive = False
+
+    def __init__(self):
+        super().__init__(interval=settings.TRACING_EXPORT_INTERVAL_SECONDS)
+        self._client: Optional["httpx.AsyncClient"] = None
+
+    async def run_once(self):
+        while export_queue:
+            batch = [export_queue.popleft() for _ in range(min(len(export_queue), settings.TRACING_EXPORT_BATCH_SIZE))]
+            await self.export(batch)
+
+    async def export(self, batch):
+        import httpx
+
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=10.0)
+        try:
+            response = await self._client.post(settings.TRACING_OTLP_ENDPOINT, json=otlp_payload(batch))
+            if response.status_code >= 400:
+                logger.warning(f"Trace export failed with {response.status_code}: {response.text[:200]}")
+        except httpx.HTTPError as e:
+            # Traces are best effort; drop the batch rather than pile up
+            logger.warning(f"Trace export failed: {str(e)}")
+
+    def start(self):
+        if settings.TRACING_OTLP_ENDPOINT:
+            super().start()
+
+    async def stop(self):
+        await super().stop()
+        if self._client is not None:
+            try:
+                await self.run_once()
+            finally:
+                await self._client.aclose()
+                self._client = None
+
+
+# Create a global instance
+trace_exporter = TraceExporter()
@@ -0,0 +1,78 @@
+from typing import List, Dict, Any, Optional, Union
+from datetime import datetime
+
+
+def response_time_stages(field: str = "response_time") -> List[Dict[str, Any]]:
+    """Pipeline stages that add the reply delay (in seconds) to each message.
+
+    The delay is measured against the message immediately before it in the
+    same conversation, and only when that message came from the customer, so
+    follow-up replies are not counted twice. Uses the
+    (conversation_id, created_at) index on messages.
+    """
+    return [
+        {"$lookup": {
+            "from": "messages",
+            "let": {"conversation_id": "$conversation_id", "created_at": "$created_at"},
+            "pipeline": [
+                {"$match": {"$expr": {"$and": [
+                    {"$eq": ["$conversation_id", "$$conversation_id"]},
+                    {"$lt": ["$created_at", "$$created_at"]}
+                ]}}},
+                {"$sort": {"created_at": -1}},
+                {"$limit": 1},
+                {"$project": {"_id": 0, "sender.type": 1, "created_at": 1}}
+            ],
+            "as": "_previous_message"
+        }},
+        {"$addFields": {
+            field: {"$let": {
+                "vars": {"previous": {"$first": "$_previous_message"}},
+                "in": {"$cond": [
+                    {"$eq": ["$$previous.sender.type", "customer"]},
+                    {"$divide": [{"$subtract": ["$created_at", "$$previous.created_at"]}, 1000]},
+                    None
+                ]}
+            }}
+        }},
+        {"$project": {"_previous_message": 0}}
+    ]
+
+
+def day_expr(field: Union[str, Dict[str, Any]] = "$created_at") -> Dict[str, Any]:
+    """Expression formatting a date field (or date expression) as a YYYY-MM-DD bucket key."""
+    return {"$dateToString": {"format": "%Y-%m-%d", "date": field}}
+
+
+def ratio_expr(numerator: str, denominator: str) -> Dict[str, Any]:
+    """Expression dividing two fields, yielding 0.0 when the denominator is empty."""
+    return {"$cond": [
+        {"$gt": [denominator, 0]},
+        {"$divide": [numerator, denominator]},
+        0.0
+    ]}
+
+
+def add_to_totals_stage(
+    prefix: Optional[str],
+    increments: Dict[str, float],
+    window_end: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """Update-pipeline stage adding increments to counters stored under `prefix`.
+
+    With `window_end`, the document remembers the latest window applied to
+    it (in `applied_until`) and a window it has already applied leaves the
+    counters unchanged, so re-running a window after a crash is a no-op.
+    """
+    def path(name: str) -> str:
+        return f"{prefix}.{name}" if prefix else name
+
+    applied = {"$gte": [f"${path('applied_until')}", window_end]}
+    fields = {}
+    for counter, value in increments.items():
+        current = {"$ifNull": [f"${path(counter)}", 0]}
+        added = {"$add": [current, value]}
+        fields[path(counter)] = added if window_end is None else {"$cond": [applied, current, added]}
+    if window_end is not None:
+        fields[path("applied_until")] = {"$max": [f"${path('applied_until')}", window_end]}
+    return {"$set": fields}
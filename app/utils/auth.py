@@ -2,11 +2,15 @@ from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from ..config import settings
 from ..database import db
 from bson import ObjectId
+from .tracing import traced
+import logging
+
+logger = logging.getLogger(__name__)
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
@@ -23,7 +27,6 @@ def create_access_token(user_id: str) -> str:
         "exp": expire,
         "user_id": user_id
     }
-    print(f"Creating token with secret: {settings.JWT_SECRET[:5]}...")
     encoded_jwt = jwt.encode(
         to_encode, 
         settings.JWT_SECRET, 
@@ -31,27 +34,42 @@ def create_access_token(user_id: str) -> str:
     )
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
+@traced("authenticate")
+async def authenticate(token: str) -> dict:
+    """Decode a bearer token and load its user. Raises 401 if either fails."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        print(f"Decoding token with secret: {settings.JWT_SECRET[:5]}...")
         payload = jwt.decode(
             token, 
             settings.JWT_SECRET, 
             algorithms=[settings.JWT_ALGORITHM]
         )
         user_id: str = payload.get("user_id")
-        if user_id is None:
+        if user_id is None or not ObjectId.is_valid(user_id):
             raise credentials_exception
     except JWTError as e:
-        print(f"JWT Error: {str(e)}")
+        logger.debug(f"JWT Error: {str(e)}")
         raise credentials_exception
 
     user = await db.users.find_one({"_id": ObjectId(user_id)})
     if user is None:
         raise credentials_exception
-    return user 
\ No newline at end of file
+    return user
+
+@traced("get_current_user")
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)):
+    # The auth middleware has already loaded the user for this request
+    user = request.scope.get("state", {}).get("user")
+    if user is not None:
+        return user
+    return await authenticate(token)
+
+async def require_admin(current_user: dict = Depends(get_current_user)):
+    """Allow only platform operators listed in ADMIN_EMAILS."""
+    if current_user.get("email", "").lower() not in {email.lower() for email in settings.ADMIN_EMAILS}:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
@@ -1,5 +1,8 @@
 from ..database import db
 from motor.motor_asyncio import AsyncIOMotorClient
+import logging
+
+logger = logging.getLogger(__name__)
 
 async def init_db():
     # Create collections
@@ -28,4 +31,4 @@ async def init_db():
     await db.catalog.create_index([("organization_id", 1), ("name", 1)])
     await db.team.create_index([("organization_id", 1), ("email", 1)])
 
-    print("Database initialized successfully!") 
\ No newline at end of file
+    logger.info("Database initialized successfully!") 
\ No newline at end of file
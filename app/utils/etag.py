@@ -0,0 +1,56 @@
+"""Weak ETags for list endpoints.
+
+A list's validator is its document count plus the latest value of its
+timestamp fields, which an index on (organization_id, updated_at) answers
+without reading the documents. Every write that changes what a list
+returns must bump one of those timestamps. Clients that send a matching
+If-None-Match get a 304 before the list is fetched or serialized.
+"""
+from typing import Any, Dict, Iterable
+import asyncio
+import hashlib
+
+from fastapi import Request, Response
+
+# Browsers revalidate on every poll; shared caches never store per-user lists
+CACHE_CONTROL = "private, no-cache"
+
+
+async def list_etag(
+    collection,
+    query: Dict[str, Any],
+    *params: Any,
+    timestamp_fields: Iterable[str] = ("updated_at",)
+) -> str:
+    """Weak ETag for the documents matching `query`; `params` are anything else shaping the response (paging, filters)."""
+    timestamp_fields = list(timestamp_fields)
+    count, *latest = await asyncio.gather(
+        collection.count_documents(query),
+        *(
+            collection.find_one(query, projection={"_id": 0, field: 1}, sort=[(field, -1)])
+            for field in timestamp_fields
+        )
+    )
+    values = [doc.get(field) if doc else None for field, doc in zip(timestamp_fields, latest)]
+    key = repr((collection.name, sorted(query.items()), params, count, values))
+    return f'W/"{hashlib.blake2b(key.encode(), digest_size=12).hexdigest()}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match comparison; weak, as GET validation allows."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def set_validators(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
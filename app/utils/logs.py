@@ -0,0 +1,171 @@
+"""Non-blocking structured logging.
+
+Application threads only put records on an in-memory queue; a
+QueueListener thread formats them as JSON lines and writes them to
+stdout, so a slow terminal or log shipper never stalls the event loop.
+Levels come from LOG_LEVEL and per-logger LOG_LEVELS. Debug records are
+rate limited per call site (and optionally sampled) so turning on debug
+logging under load can't flood the output.
+"""
+from typing import Dict, Any, Optional, Tuple
+from datetime import datetime, timezone
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+
+from ..config import settings
+from .tracing import current_request_id
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+# Servers whose own handlers are replaced so their records go through the queue too
+SERVER_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in vars(record).items():
+            if key not in STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id"):
+            record.request_id = "-"
+        return super().format(record)
+
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that captures what only the calling thread knows.
+
+    The request ID lives in a context variable and tracebacks reference
+    live frames, so both are resolved here; JSON formatting and the write
+    happen on the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if not getattr(record, "request_id", None):
+            record.request_id = current_request_id()
+        return record
+
+
+class DebugRateLimitFilter(logging.Filter):
+    """Passes at most LOG_DEBUG_PER_MINUTE debug records per call site per minute.
+
+    The first record let through after a suppressed run carries the
+    number of records dropped as `suppressed`.
+    """
+
+    def __init__(self, per_minute: int, sample_rate: float):
+        super().__init__()
+        self.per_minute = per_minute
+        self.sample_rate = sample_rate
+        self._windows: Dict[Tuple[str, int], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return False
+
+        key = (record.pathname, record.lineno)
+        window = int(time.monotonic() // 60)
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None or state[0] != window:
+                suppressed = state[2] if state else 0
+                state = self._windows[key] = [window, 0, suppressed]
+            state[1] += 1
+            if state[1] > self.per_minute:
+                state[2] += 1
+                return False
+            suppressed, state[2] = state[2], 0
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging():
+    """Route all logging through the queue. Safe to call more than once."""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if settings.LOG_FORMAT == "json" else TextFormatter())
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = ContextQueueHandler(log_queue)
+    handler.addFilter(DebugRateLimitFilter(settings.LOG_DEBUG_PER_MINUTE, settings.LOG_DEBUG_SAMPLE_RATE))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(settings.LOG_LEVEL.upper())
+
+    for name in SERVER_LOGGERS:
+        server_logger = logging.getLogger(name)
+        for existing in list(server_logger.handlers):
+            server_logger.removeHandler(existing)
+        server_logger.propagate = True
+
+    for name, level in settings.LOG_LEVELS.items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=False)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Write out whatever is still queued and stop the listener thread.
+
+    Later records (e.g. the server's own shutdown messages) are written
+    directly, since uvicorn's worker processes exit without running atexit.
+    """
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, ContextQueueHandler):
+            root.removeHandler(handler)
+            for output in _listener.handlers:
+                output.filters = handler.filters
+                root.addHandler(output)
+    _listener = None
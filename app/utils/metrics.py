@@ -0,0 +1,267 @@
+"""Minimal Prometheus collectors.
+
+Writes are the hot path, so each thread updates its own shard without
+locking; only registering a new thread's shard takes a lock, once.
+Scrapes merge the shards. Values read mid-update may be a few
+increments behind, which is fine for monitoring.
+
+With several uvicorn workers, set METRICS_MULTIPROC_DIR to a directory
+shared by the workers (and emptied on deploy): each one periodically
+dumps its samples there and a scrape of any worker reports the sum over
+all of them.
+"""
+from typing import Dict, Tuple, List, Sequence, Callable, Any, Optional
+from bisect import bisect_left
+from contextvars import ContextVar
+import json
+import math
+import os
+import threading
+import time
+
+from ..config import settings
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[Dict[LabelValues, Any]] = []
+        self._shards_lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _shard(self) -> Dict[LabelValues, Any]:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def samples(self) -> Dict[LabelValues, Any]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, labels: LabelValues = (), amount: float = 1.0):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0.0) + amount
+
+    def samples(self) -> Dict[LabelValues, float]:
+        merged: Dict[LabelValues, float] = {}
+        for shard in list(self._shards):
+            for labels, value in list(shard.items()):
+                merged[labels] = merged.get(labels, 0.0) + value
+        return merged
+
+
+class Gauge(Counter):
+    """Summed across shards, so inc/dec may come from different threads."""
+
+    kind = "gauge"
+
+    def dec(self, labels: LabelValues = (), amount: float = 1.0):
+        self.inc(labels, -amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, labels: LabelValues = ()):
+        shard = self._shard()
+        state = shard.get(labels)
+        if state is None:
+            # Per-bucket (non-cumulative) counts, then sum and count
+            state = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        state[bisect_left(self.buckets, value)] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    def samples(self) -> Dict[LabelValues, list]:
+        merged: Dict[LabelValues, list] = {}
+        for shard in list(self._shards):
+            for labels, state in list(shard.items()):
+                current = merged.get(labels)
+                if current is None:
+                    merged[labels] = list(state)
+                else:
+                    merged[labels] = [a + b for a, b in zip(current, state)]
+        return merged
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric):
+        self.metrics.append(metric)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "updated_at": time.time(),
+            "metrics": {
+                metric.name: [[list(labels), value] for labels, value in metric.samples().items()]
+                for metric in self.metrics
+            }
+        }
+
+    def _merged(self) -> Dict[str, Dict[LabelValues, Any]]:
+        directory = settings.METRICS_MULTIPROC_DIR
+        if not directory:
+            return {metric.name: metric.samples() for metric in self.metrics}
+
+        # Our own file is rewritten first so this worker's numbers are current
+        dump_snapshot()
+        merged: Dict[str, Dict[LabelValues, Any]] = {metric.name: {} for metric in self.metrics}
+        kinds = {metric.name: metric.kind for metric in self.metrics}
+        now = time.time()
+        for filename in os.listdir(directory):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(directory, filename)) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            stale = now - snapshot.get("updated_at", 0) > 3 * settings.METRICS_FLUSH_SECONDS
+            for name, samples in snapshot.get("metrics", {}).items():
+                if name not in merged or (stale and kinds[name] == "gauge"):
+                    # Gauges of workers that went away are no longer true
+                    continue
+                for labels, value in samples:
+                    labels = tuple(labels)
+                    current = merged[name].get(labels)
+                    if current is None:
+                        merged[name][labels] = value
+                    elif isinstance(value, list):
+                        merged[name][labels] = [a + b for a, b in zip(current, value)]
+                    else:
+                        merged[name][labels] = current + value
+        return merged
+
+    def render(self) -> str:
+        lines: List[str] = []
+        merged = self._merged()
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for labels, value in sorted(merged.get(metric.name, {}).items()):
+                if metric.kind == "histogram":
+                    cumulative = 0
+                    for bound, count in zip(list(metric.buckets) + [math.inf], value):
+                        cumulative += count
+                        le = "+Inf" if bound == math.inf else repr(bound)
+                        lines.append(f"{metric.name}_bucket{format_labels(metric.labelnames + ('le',), labels + (le,))} {cumulative}")
+                    lines.append(f"{metric.name}_sum{format_labels(metric.labelnames, labels)} {value[-2]}")
+                    lines.append(f"{metric.name}_count{format_labels(metric.labelnames, labels)} {value[-1]}")
+                else:
+                    lines.append(f"{metric.name}{format_labels(metric.labelnames, labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def dump_snapshot():
+    """Write this worker's samples to METRICS_MULTIPROC_DIR for the other workers to merge."""
+    directory = settings.METRICS_MULTIPROC_DIR
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(REGISTRY.snapshot(), f)
+    os.replace(f"{path}.tmp", path)
+
+
+REGISTRY = Registry()
+
+# Requests that matched no route share one label, so scanners probing
+# random URLs can't blow up the number of series
+UNMATCHED = "unmatched"
+
+# ASGI scope of the request being served. Motor copies the context into
+# its executor threads, so Mongo listeners can tell which route issued a command.
+current_scope: ContextVar[Optional[Dict[str, Any]]] = ContextVar("current_scope", default=None)
+
+_templates: Dict[Callable, str] = {}
+
+
+def route_template(scope: Optional[Dict[str, Any]]) -> str:
+    """Path template of the route that matched (e.g. /api/conversations/{conversation_id})."""
+    endpoint = scope.get("endpoint") if scope else None
+    if endpoint is None:
+        return UNMATCHED
+    template = _templates.get(endpoint)
+    if template is None:
+        for route in scope["app"].routes:
+            if getattr(route, "endpoint", None) is not None:
+                _templates.setdefault(route.endpoint, route.path)
+        template = _templates.setdefault(endpoint, UNMATCHED)
+    return template
+
+# HTTP
+http_requests_total = Counter(
+    "http_requests_total",
+    "HTTP requests by route template, method and status.",
+    ("method", "route", "status")
+)
+http_request_duration_seconds = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template and method.",
+    ("method", "route")
+)
+http_requests_in_flight = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being served."
+)
+
+# MongoDB
+mongo_command_duration_seconds = Histogram(
+    "mongo_command_duration_seconds",
+    "MongoDB command latency by collection and command.",
+    ("collection", "command"),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+mongo_command_failures_total = Counter(
+    "mongo_command_failures_total",
+    "Failed MongoDB commands by collection and command.",
+    ("collection", "command")
+)
+mongo_pool_connections_open = Gauge(
+    "mongo_pool_connections_open",
+    "Open connections in the Mongo connection pools."
+)
+mongo_pool_connections_checked_out = Gauge(
+    "mongo_pool_connections_checked_out",
+    "Connections checked out of the Mongo connection pools."
+)
+mongo_pool_checkouts_total = Counter(
+    "mongo_pool_checkouts_total",
+    "Mongo connection checkouts."
+)
+mongo_pool_checkout_wait_seconds_total = Counter(
+    "mongo_pool_checkout_wait_seconds_total",
+    "Time spent waiting for a pooled Mongo connection, including failed checkouts."
+)
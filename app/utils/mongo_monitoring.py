@@ -0,0 +1,188 @@
+from typing import Dict, Any
+from collections import deque
+import os
+import threading
+import time
+
+from pymongo import monitoring
+
+from .metrics import (
+    mongo_command_duration_seconds,
+    mongo_command_failures_total,
+    mongo_pool_connections_open,
+    mongo_pool_connections_checked_out,
+    mongo_pool_checkouts_total,
+    mongo_pool_checkout_wait_seconds_total
+)
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool statistics for this worker's Mongo client.
+
+    pymongo calls these hooks on whichever thread checks a connection out,
+    so checkout wait time is measured with a thread-local start time and
+    the counters are guarded by a lock. The totals are also kept in
+    registered metrics so /metrics can merge them across workers.
+    """
+
+    def __init__(self, window_seconds: float = 60.0, samples: int = 1000):
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._waits: deque = deque(maxlen=samples)
+        self._created_at: deque = deque()
+        self.pools: Dict[str, Dict[str, int]] = {}
+        self.checkouts = 0
+        self.checkout_failures: Dict[str, int] = {}
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _pool(self, address) -> Dict[str, int]:
+        key = f"{address[0]}:{address[1]}"
+        pool = self.pools.get(key)
+        if pool is None:
+            pool = self.pools[key] = {"open": 0, "checked_out": 0, "created": 0, "closed": 0, "cleared": 0}
+        return pool
+
+    def pool_created(self, event):
+        with self._lock:
+            self._pool(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._pool(event.address)["cleared"] += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        now = time.monotonic()
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["open"] += 1
+            pool["created"] += 1
+            self._created_at.append(now)
+            self._prune_created(now)
+        mongo_pool_connections_open.inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["open"] -= 1
+            pool["closed"] += 1
+        mongo_pool_connections_open.dec()
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        started = getattr(self._local, "started", None)
+        with self._lock:
+            self.checkout_failures[event.reason] = self.checkout_failures.get(event.reason, 0) + 1
+            if started is not None:
+                self._record_wait(time.perf_counter() - started)
+
+    def connection_checked_out(self, event):
+        started = getattr(self._local, "started", None)
+        with self._lock:
+            self.checkouts += 1
+            self._pool(event.address)["checked_out"] += 1
+            if started is not None:
+                self._record_wait(time.perf_counter() - started)
+        mongo_pool_checkouts_total.inc()
+        mongo_pool_connections_checked_out.inc()
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self._pool(event.address)["checked_out"] -= 1
+        mongo_pool_connections_checked_out.dec()
+
+    def _prune_created(self, now: float):
+        """Drop creation times older than the window; called with the lock held."""
+        while self._created_at and now - self._created_at[0] > self.window_seconds:
+            self._created_at.popleft()
+
+    def _record_wait(self, seconds: float):
+        self._waits.append(seconds)
+        self.wait_seconds_total += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+        mongo_pool_checkout_wait_seconds_total.inc(amount=seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            self._prune_created(now)
+            waits = sorted(self._waits)
+            pools = {address: dict(pool) for address, pool in self.pools.items()}
+            created_recently = len(self._created_at)
+            checkouts = self.checkouts
+            failures = dict(self.checkout_failures)
+            wait_total = self.wait_seconds_total
+            wait_max = self.wait_seconds_max
+        attempts = checkouts + sum(failures.values())
+
+        def percentile(q: float) -> float:
+            if not waits:
+                return 0.0
+            return waits[min(int(q * len(waits)), len(waits) - 1)] * 1000
+
+        return {
+            "pid": os.getpid(),
+            "pools": pools,
+            "checked_out": sum(pool["checked_out"] for pool in pools.values()),
+            "open": sum(pool["open"] for pool in pools.values()),
+            "checkouts": checkouts,
+            "checkout_failures": failures,
+            "connections_created_per_minute": created_recently * 60 / self.window_seconds,
+            "wait_ms": {
+                # Failed checkouts waited too, so they count in the mean
+                "mean": wait_total / attempts * 1000 if attempts else 0.0,
+                "p50": percentile(0.5),
+                "p99": percentile(0.99),
+                "max": wait_max * 1000
+            }
+        }
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Command latency per collection and command name.
+
+    Succeeded/failed events carry the duration but not the collection, so
+    the collection is remembered from the started event, keyed by request
+    and connection. Single dict operations are atomic, so no lock.
+    """
+
+    def __init__(self):
+        self._collections: Dict[Any, str] = {}
+
+    @staticmethod
+    def collection_of(event) -> str:
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        return target if isinstance(target, str) else "-"
+
+    def started(self, event):
+        self._collections[(event.request_id, event.connection_id)] = self.collection_of(event)
+
+    def succeeded(self, event):
+        collection = self._collections.pop((event.request_id, event.connection_id), "-")
+        mongo_command_duration_seconds.observe(event.duration_micros / 1e6, (collection, event.command_name))
+
+    def failed(self, event):
+        collection = self._collections.pop((event.request_id, event.connection_id), "-")
+        labels = (collection, event.command_name)
+        mongo_command_duration_seconds.observe(event.duration_micros / 1e6, labels)
+        mongo_command_failures_total.inc(labels)
+
+
+# Shared by the Mongo client of this process
+pool_metrics = PoolMetrics()
+command_metrics = CommandMetrics()
+
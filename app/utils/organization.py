@@ -0,0 +1,90 @@
+from typing import Optional
+from fastapi import Depends, HTTPException
+from bson import ObjectId
+
+from ..config import settings
+from ..database import db
+from .auth import get_current_user
+from .cache import TTLCache
+
+# organization id -> organization document
+organization_cache = TTLCache(
+    maxsize=settings.ORGANIZATION_CACHE_SIZE,
+    ttl=settings.ORGANIZATION_CACHE_TTL_SECONDS
+)
+# user id -> organization id
+user_organization_cache = TTLCache(
+    maxsize=settings.ORGANIZATION_CACHE_SIZE,
+    ttl=settings.ORGANIZATION_CACHE_TTL_SECONDS
+)
+
+
+def _member_organization_id(user: dict) -> Optional[str]:
+    """Organization a user belongs to as a team member."""
+    if user.get("organization_id"):
+        return user["organization_id"]
+    for membership in user.get("organizations") or []:
+        if membership.get("organization_id"):
+            return membership["organization_id"]
+    return None
+
+
+async def get_organization_by_id(organization_id: str) -> Optional[dict]:
+    organization = organization_cache.get(organization_id)
+    if organization is not None:
+        return organization
+    if not ObjectId.is_valid(organization_id):
+        return None
+
+    organization = await db.organizations.find_one({"_id": ObjectId(organization_id)})
+    if organization:
+        organization_cache.set(organization_id, organization)
+    return organization
+
+
+async def find_user_organization(user: dict) -> Optional[dict]:
+    """Resolve the organization a user owns or is a member of."""
+    user_id = str(user["_id"])
+    organization_id = user_organization_cache.get(user_id)
+    if organization_id:
+        organization = await get_organization_by_id(organization_id)
+        if organization:
+            return organization
+
+    # Owners first, then membership
+    organization = await db.organizations.find_one({"owner_id": user["_id"]})
+    if not organization:
+        member_organization_id = _member_organization_id(user)
+        if member_organization_id:
+            organization = await get_organization_by_id(member_organization_id)
+
+    if organization:
+        organization_id = str(organization["_id"])
+        organization_cache.set(organization_id, organization)
+        user_organization_cache.set(user_id, organization_id)
+    return organization
+
+
+def invalidate_organization(organization_id: Optional[str] = None, user_id: Optional[str] = None):
+    """Drop cached entries after an organization is created or changed."""
+    if organization_id:
+        organization_cache.delete(organization_id)
+    if user_id:
+        user_organization_cache.delete(user_id)
+
+
+async def get_current_organization(current_user: dict = Depends(get_current_user)) -> Optional[dict]:
+    """Dependency returning the current user's organization, or None before onboarding."""
+    organization = await find_user_organization(current_user)
+    # Callers get their own copy so they can't corrupt the cache
+    return dict(organization) if organization else None
+
+
+async def require_organization(organization: Optional[dict] = Depends(get_current_organization)) -> dict:
+    """Dependency for routes that only make sense once onboarding is complete."""
+    if not organization:
+        raise HTTPException(
+            status_code=400,
+            detail="Please complete organization setup in onboarding"
+        )
+    return organization
@@ -0,0 +1,75 @@
+from typing import Optional
+from datetime import datetime, timedelta
+import asyncio
+import time
+
+from pymongo.errors import DuplicateKeyError
+
+from ..database import db
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursting up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def delay_for(self, tokens: float = 1) -> float:
+        """Seconds until `tokens` would be available."""
+        self._refill()
+        return max(0.0, (tokens - self.tokens) / self.rate)
+
+    async def acquire(self, tokens: float = 1):
+        """Wait until `tokens` are available and take them. Waiters are served in order."""
+        async with self._lock:
+            while not self.try_acquire(tokens):
+                await asyncio.sleep(self.delay_for(tokens))
+
+
+class SharedRateLimit:
+    """Per-second budget per key, shared by every worker through Mongo.
+
+    Each key and second is one counter document in `rate_limits`. Taking
+    units is an `$inc` upsert that only matches while that second has room;
+    once it is full, the upsert collides with the existing document and the
+    request is refused. Counters are removed by a TTL index.
+    """
+
+    def __init__(self, name: str, rate: float):
+        self.name = name
+        self.rate = rate
+
+    async def try_acquire(self, key: str, units: float = 1) -> bool:
+        second = int(time.time())
+        try:
+            await db.rate_limits.update_one(
+                {"_id": f"{self.name}:{key}:{second}", "units": {"$lte": self.rate - units}},
+                {
+                    "$inc": {"units": units},
+                    "$setOnInsert": {"expires_at": datetime.utcfromtimestamp(second) + timedelta(minutes=1)}
+                },
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    def delay(self) -> float:
+        """Seconds until the next window starts."""
+        return 1 - time.time() % 1
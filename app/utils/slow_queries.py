@@ -0,0 +1,252 @@
+from typing import Dict, Any, Optional, List, Tuple
+from collections import deque
+from datetime import datetime
+import json
+import logging
+import random
+import threading
+import time
+
+from pymongo import monitoring
+
+from ..config import settings
+from .metrics import current_scope, route_template
+
+logger = logging.getLogger(__name__)
+
+# Commands whose plans are worth explaining; writes are explained without executing
+EXPLAINABLE = {"find", "aggregate", "count", "distinct", "findAndModify", "update", "delete"}
+
+# Session and transport fields that can't be sent inside an explain
+NON_EXPLAIN_FIELDS = {
+    "lsid", "$clusterTime", "$db", "$readPreference", "txnNumber", "autocommit",
+    "startTransaction", "readConcern", "writeConcern", "signature"
+}
+
+
+def normalize(value: Any) -> Any:
+    """Replace literal values with "?", keeping field names and operators."""
+    if isinstance(value, dict):
+        return {key: normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, dict) for item in value):
+            return [normalize(item) for item in value]
+        return ["?"] if value else []
+    return "?"
+
+
+def query_shape(command_name: str, command: Dict[str, Any]) -> Dict[str, Any]:
+    """The parts of a command that determine its plan, with values stripped."""
+    if command_name == "find":
+        shape = {"filter": normalize(command.get("filter", {}))}
+        if command.get("sort"):
+            shape["sort"] = dict(command["sort"])
+        if command.get("projection"):
+            shape["projection"] = sorted(command["projection"])
+        return shape
+    if command_name == "aggregate":
+        # Keep literal stage names and $sort/$group keys; strip everything else
+        return {"pipeline": [
+            {stage: dict(spec) if stage == "$sort" else normalize(spec) for stage, spec in step.items()}
+            for step in command.get("pipeline", [])
+        ]}
+    if command_name in ("count", "distinct"):
+        shape = {"query": normalize(command.get("query", {}))}
+        if command_name == "distinct":
+            shape["key"] = command.get("key")
+        return shape
+    if command_name == "findAndModify":
+        return {"query": normalize(command.get("query", {})), "sort": dict(command.get("sort") or {})}
+    if command_name == "update":
+        return {"q": [normalize(update.get("q", {})) for update in command.get("updates", [])[:1]]}
+    if command_name == "delete":
+        return {"q": [normalize(delete.get("q", {})) for delete in command.get("deletes", [])[:1]]}
+    return {}
+
+
+def docs_returned(command_name: str, reply: Dict[str, Any]) -> Optional[int]:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        batch = cursor.get("firstBatch", cursor.get("nextBatch"))
+        if batch is not None:
+            return len(batch)
+    if command_name == "distinct":
+        return len(reply.get("values", []))
+    if "n" in reply:
+        return reply["n"]
+    return None
+
+
+def explain_command(command_name: str, command: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Command to pass to `explain`, or None if this command shouldn't be explained."""
+    if command_name not in EXPLAINABLE:
+        return None
+    if command_name == "aggregate" and any(
+        "$out" in step or "$merge" in step for step in command.get("pipeline", [])
+    ):
+        return None
+    explained = {key: value for key, value in command.items() if key not in NON_EXPLAIN_FIELDS}
+    # explain takes a single statement
+    if command_name == "update":
+        explained["updates"] = explained.get("updates", [])[:1]
+    if command_name == "delete":
+        explained["deletes"] = explained.get("deletes", [])[:1]
+    return explained
+
+
+def find_key(document: Any, key: str) -> Any:
+    """First value stored under `key` anywhere in a nested explain document."""
+    if isinstance(document, dict):
+        if key in document:
+            return document[key]
+        values = document.values()
+    elif isinstance(document, list):
+        values = document
+    else:
+        return None
+    for value in values:
+        found = find_key(value, key)
+        if found is not None:
+            return found
+    return None
+
+
+def plan_summary(plan: Optional[Dict[str, Any]]) -> str:
+    """Stage chain of a winning plan, e.g. "FETCH <- IXSCAN(organization_id_1)"."""
+    stages = []
+    while isinstance(plan, dict):
+        stage = plan.get("stage", "?")
+        if plan.get("indexName"):
+            stage = f"{stage}({plan['indexName']})"
+        stages.append(stage)
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return " <- ".join(stages)
+
+
+def summarize_explain(explain: Dict[str, Any]) -> Dict[str, Any]:
+    stats = find_key(explain, "executionStats") or {}
+    winning_plan = find_key(explain, "winningPlan")
+    # Newer servers nest the classic plan under queryPlan
+    if isinstance(winning_plan, dict) and "queryPlan" in winning_plan:
+        winning_plan = winning_plan["queryPlan"]
+    return {
+        "plan": plan_summary(winning_plan),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "docs_returned": stats.get("nReturned"),
+        "execution_ms": stats.get("executionTimeMillis"),
+        "captured_at": datetime.utcnow()
+    }
+
+
+class SlowQueryLog(monitoring.CommandListener):
+    """Logs Mongo commands slower than SLOW_QUERY_THRESHOLD_MS and aggregates them by shape.
+
+    Only slow commands do any work beyond remembering the started event.
+    A sample of slow shapes is queued for `explain`, which SlowQueryExplainer
+    runs on the event loop, off the request path.
+    """
+
+    def __init__(self):
+        self._started: Dict[Any, Tuple[str, str, Dict[str, Any], str]] = {}
+        self._lock = threading.Lock()
+        self.shapes: Dict[str, Dict[str, Any]] = {}
+        self.explain_queue: deque = deque(maxlen=100)
+        self._explained_at: Dict[str, float] = {}
+
+    def started(self, event):
+        if event.command_name in ("explain", "getMore", "hello", "isMaster", "ping", "endSessions"):
+            return
+        scope = current_scope.get()
+        route = route_template(scope) if scope else "background"
+        self._started[(event.request_id, event.connection_id)] = (
+            event.database_name, event.command_name, event.command, route
+        )
+
+    def succeeded(self, event):
+        started = self._started.pop((event.request_id, event.connection_id), None)
+        if started is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        if duration_ms < settings.SLOW_QUERY_THRESHOLD_MS:
+            return
+        database, command_name, command, route = started
+        self.record(database, command_name, command, route, duration_ms, docs_returned(command_name, event.reply))
+
+    def failed(self, event):
+        self._started.pop((event.request_id, event.connection_id), None)
+
+    def record(
+        self,
+        database: str,
+        command_name: str,
+        command: Dict[str, Any],
+        route: str,
+        duration_ms: float,
+        returned: Optional[int]
+    ):
+        collection = command.get(command_name)
+        collection = collection if isinstance(collection, str) else "-"
+        shape = query_shape(command_name, command)
+        key = json.dumps([database, collection, command_name, shape], sort_keys=True, default=str)
+
+        logger.warning(
+            f"Slow query: {duration_ms:.1f} ms {command_name} {database}.{collection}",
+            extra={"shape": shape, "route": route, "duration_ms": duration_ms, "docs_returned": returned}
+        )
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self.shapes.get(key)
+            if entry is None:
+                if len(self.shapes) >= settings.SLOW_QUERY_MAX_SHAPES:
+                    # Make room by dropping the shape costing the least time overall
+                    del self.shapes[min(self.shapes, key=lambda k: self.shapes[k]["total_ms"])]
+                entry = self.shapes[key] = {
+                    "collection": collection,
+                    "command": command_name,
+                    "shape": shape,
+                    "routes": {},
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "docs_returned": 0,
+                    "first_seen": datetime.utcnow(),
+                    "explain": None
+                }
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            entry["docs_returned"] += returned or 0
+            entry["last_seen"] = datetime.utcnow()
+            entry["routes"][route] = entry["routes"].get(route, 0) + 1
+
+            explained = explain_command(command_name, command)
+            if (
+                explained is not None
+                and random.random() < settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE
+                and now - self._explained_at.get(key, float("-inf")) >= settings.SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS
+            ):
+                self._explained_at[key] = now
+                self.explain_queue.append((key, database, explained))
+
+    def set_explain(self, key: str, summary: Dict[str, Any]):
+        with self._lock:
+            if key in self.shapes:
+                self.shapes[key]["explain"] = summary
+
+    def top(self, limit: int = 20, sort: str = "total_ms") -> List[Dict[str, Any]]:
+        with self._lock:
+            entries = [dict(entry, routes=dict(entry["routes"])) for entry in self.shapes.values()]
+        for entry in entries:
+            entry["mean_ms"] = entry["total_ms"] / entry["count"]
+        return sorted(entries, key=lambda entry: entry[sort], reverse=True)[:limit]
+
+    def reset(self):
+        with self._lock:
+            self.shapes.clear()
+            self._explained_at.clear()
+
+
+# Shared by the Mongo client of this process
+slow_query_log = SlowQueryLog()
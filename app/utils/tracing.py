@@ -0,0 +1,248 @@
+"""Request IDs and lightweight spans.
+
+Every request gets a request ID (echoed in X-Request-ID). A sampled
+fraction also records spans for the stages it goes through: middleware,
+auth, Mongo commands and Gmail calls. Finished traces are logged as one
+JSON line and, when TRACING_OTLP_ENDPOINT is set, exported as OTLP/HTTP
+JSON by TraceExporter.
+
+For unsampled requests `span()` costs a context variable lookup and
+returns a shared no-op, so instrumented code needs no guards.
+"""
+from typing import Optional, Dict, Any, List
+from collections import deque
+from contextvars import ContextVar
+from functools import wraps
+import logging
+import os
+import random
+import re
+import time
+
+from pymongo import monitoring
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_RE = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class Trace:
+    __slots__ = ("trace_id", "request_id", "parent_id", "sampled", "spans")
+
+    def __init__(self, trace_id: str, request_id: str, parent_id: Optional[str], sampled: bool):
+        self.trace_id = trace_id
+        self.request_id = request_id
+        self.parent_id = parent_id
+        self.sampled = sampled
+        # Appended from Motor's executor threads too; list.append is atomic
+        self.spans: List[Dict[str, Any]] = []
+
+
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+current_span_id: ContextVar[Optional[str]] = ContextVar("current_span_id", default=None)
+
+
+def new_id(length: int = 16) -> str:
+    return os.urandom(length // 2).hex()
+
+
+def start_trace(headers: Dict[str, str]) -> Trace:
+    """Trace for an incoming request, continuing a W3C traceparent if one was sent."""
+    request_id = headers.get("x-request-id", "")
+    if not REQUEST_ID_RE.match(request_id):
+        request_id = new_id(32)
+    match = TRACEPARENT_RE.match(headers.get("traceparent", ""))
+    if match:
+        trace_id, parent_id, flags = match.groups()
+        # Untrusted callers could otherwise force every request to be traced
+        parent_sampled = settings.TRACING_TRUST_PARENT and bool(int(flags, 16) & 1)
+        sampled = parent_sampled or random.random() < settings.TRACING_SAMPLE_RATE
+        return Trace(trace_id, request_id, parent_id, sampled)
+    return Trace(new_id(32), request_id, None, random.random() < settings.TRACING_SAMPLE_RATE)
+
+
+def current_request_id() -> Optional[str]:
+    trace = current_trace.get()
+    return trace.request_id if trace else None
+
+
+class Span:
+    __slots__ = ("trace", "name", "kind", "attributes", "span_id", "parent_id", "start_ns", "end_ns", "_token")
+
+    def __init__(self, trace: Trace, name: str, kind: str, attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.span_id = new_id()
+        self.parent_id = current_span_id.get() or self.trace.parent_id
+        self._token = current_span_id.set(self.span_id)
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = end_ns = time.time_ns()
+        current_span_id.reset(self._token)
+        if exc is not None:
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"
+        self.trace.spans.append({
+            "name": self.name,
+            "kind": self.kind,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": end_ns,
+            "attributes": self.attributes
+        })
+        return False
+
+
+class NoopSpan:
+    def set(self, key: str, value: Any):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = NoopSpan()
+
+
+def span(name: str, kind: str = "internal", **attributes):
+    """Context manager timing a stage of the current request, if it is sampled."""
+    trace = current_trace.get()
+    if trace is None or not trace.sampled:
+        return NOOP_SPAN
+    return Span(trace, name, kind, attributes)
+
+
+def traced(name: str, kind: str = "internal"):
+    """Decorator recording a span around an async function."""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(name, kind):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_span(name: str, kind: str, start_ns: int, end_ns: int, attributes: Dict[str, Any]):
+    """Add an already-timed span (e.g. from a monitoring event) to the current trace."""
+    trace = current_trace.get()
+    if trace is None or not trace.sampled:
+        return
+    trace.spans.append({
+        "name": name,
+        "kind": kind,
+        "span_id": new_id(),
+        "parent_id": current_span_id.get() or trace.parent_id,
+        "start_ns": start_ns,
+        "end_ns": end_ns,
+        "attributes": attributes
+    })
+
+
+class MongoSpans(monitoring.CommandListener):
+    """Mongo commands as client spans of the request that issued them."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, None)
+
+    def failed(self, event):
+        self._record(event, str(event.failure))
+
+    def _record(self, event, error: Optional[str]):
+        trace = current_trace.get()
+        if trace is None or not trace.sampled:
+            return
+        end_ns = time.time_ns()
+        attributes = {"db.system": "mongodb", "db.operation": event.command_name, "db.name": event.database_name}
+        if error:
+            attributes["error"] = error
+        record_span(f"mongo.{event.command_name}", "client", end_ns - event.duration_micros * 1000, end_ns, attributes)
+
+
+# Finished sampled traces waiting for TraceExporter
+export_queue: deque = deque(maxlen=10000)
+
+
+def finish_trace(trace: Trace, root: Span):
+    """Log a sampled trace once its root span has ended, and queue it for export."""
+    logger.info("trace %s %s", root.attributes.get("http.route", root.name), trace.trace_id, extra={
+        "trace_id": trace.trace_id,
+        "request_id": trace.request_id,
+        "duration_ms": (root.end_ns - root.start_ns) / 1e6,
+        "attributes": root.attributes,
+        "spans": [
+            {
+                "name": item["name"],
+                "span_id": item["span_id"],
+                "parent_id": item["parent_id"],
+                "offset_ms": (item["start_ns"] - root.start_ns) / 1e6,
+                "duration_ms": (item["end_ns"] - item["start_ns"]) / 1e6,
+                **({"attributes": item["attributes"]} if item["attributes"] else {})
+            }
+            for item in sorted(trace.spans, key=lambda item: item["start_ns"])
+        ]
+    })
+    if settings.TRACING_OTLP_ENDPOINT:
+        export_queue.append(trace)
+
+
+OTLP_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+
+def otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_payload(traces: List[Trace]) -> Dict[str, Any]:
+    """OTLP/HTTP JSON body (ExportTraceServiceRequest) for finished traces."""
+    spans = []
+    for trace in traces:
+        for item in trace.spans:
+            spans.append({
+                "traceId": trace.trace_id,
+                "spanId": item["span_id"],
+                "parentSpanId": item["parent_id"] or "",
+                "name": item["name"],
+                "kind": OTLP_KINDS[item["kind"]],
+                "startTimeUnixNano": str(item["start_ns"]),
+                "endTimeUnixNano": str(item["end_ns"]),
+                "attributes": [
+                    {"key": key, "value": otlp_value(value)}
+                    for key, value in item["attributes"].items()
+                ],
+                "status": {"code": 2 if "error" in item["attributes"] else 1}
+            })
+    return {"resourceSpans": [{
+        "resource": {"attributes": [
+            {"key": "service.name", "value": {"stringValue": settings.TRACING_SERVICE_NAME}}
+        ]},
+        "scopeSpans": [{"scope": {"name": "app.utils.tracing"}, "spans": spans}]
+    }]}
+
+
+# Shared by the Mongo client of this process
+mongo_spans = MongoSpans()
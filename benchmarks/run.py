@@ -0,0 +1,286 @@
+"""Throughput and latency benchmarks for the API's hot paths.
+
+Runs the FastAPI app in-process through httpx's ASGI transport (no
+server, no network), against mongomock-motor by default or a real
+MongoDB with --mongodb-url. Seeds synthetic organizations, then drives
+each scenario with a fixed number of concurrent clients:
+
+    python -m benchmarks.run
+    python -m benchmarks.run --organizations 20 --conversations 1000 --requests 2000 --concurrency 32
+    python -m benchmarks.run --mongodb-url mongodb://localhost:27017 --json results.json
+
+Compare against a stored run; exits with status 1 if any scenario
+regressed by more than --threshold percent:
+
+    python -m benchmarks.run --json baseline.json
+    python -m benchmarks.run --baseline baseline.json
+
+Background jobs are not started (the app's lifespan doesn't run), so
+numbers cover request handling only. A real MongoDB gives the meaningful
+absolute numbers; mongomock is for quick relative comparisons.
+"""
+from typing import Dict, Any, List, Callable, Awaitable, Optional
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+# The app reads its settings at import; give it what it needs to start
+BENCH_ENV = {
+    "MONGODB_URL": "mongodb://localhost:27017",
+    "DATABASE_NAME": "muntu_bench",
+    "JWT_SECRET": "bench-secret",
+    "GOOGLE_CLIENT_ID": "bench-client-id",
+    "GOOGLE_CLIENT_SECRET": "bench-client-secret",
+    "GOOGLE_OAUTH_REDIRECT_URI": "http://localhost:8000/api/integrations/email/oauth/callback/gmail",
+    "GOOGLE_CLOUD_PROJECT": "bench",
+    "GOOGLE_API_KEY": "bench",
+    "AGENT_EMAIL_ADDRESS": "agent@bench.example.com",
+    "LOG_LEVEL": "WARNING"
+}
+
+SCENARIOS = ["login", "inbox", "messages", "contacts", "catalog"]
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile of sorted samples."""
+    if not samples:
+        return 0.0
+    return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+
+def summarize(latencies: List[float], errors: int, wall_seconds: float) -> Dict[str, Any]:
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        "requests": count,
+        "errors": errors,
+        "throughput_rps": count / wall_seconds if wall_seconds else 0.0,
+        "mean_ms": sum(latencies) / count * 1000 if count else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": latencies[-1] * 1000 if count else 0.0
+    }
+
+
+async def run_scenario(
+    request: Callable[[], Awaitable[int]],
+    total: int,
+    concurrency: int,
+    warmup: int
+) -> Dict[str, Any]:
+    """Issue `total` requests from `concurrency` workers and time each one."""
+    for _ in range(warmup):
+        await request()
+
+    latencies: List[float] = []
+    errors = 0
+    remaining = total
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            status = await request()
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def build_scenarios(client, organizations, tokens: Dict[str, str], rng: random.Random) -> Dict[str, Callable[[], Awaitable[int]]]:
+    from .seed import BENCH_PASSWORD
+
+    def pick():
+        organization = rng.choice(organizations)
+        return organization, {"Authorization": f"Bearer {tokens[organization.email]}"}
+
+    async def login():
+        organization = rng.choice(organizations)
+        response = await client.post("/api/auth/login", json={"email": organization.email, "password": BENCH_PASSWORD})
+        return response.status_code
+
+    async def inbox():
+        _, headers = pick()
+        response = await client.get("/api/conversations/", params={"limit": 20}, headers=headers)
+        return response.status_code
+
+    async def messages():
+        organization, headers = pick()
+        conversation_id = rng.choice(organization.conversation_ids)
+        response = await client.get(f"/api/conversations/{conversation_id}/messages", params={"limit": 50}, headers=headers)
+        return response.status_code
+
+    async def contacts():
+        _, headers = pick()
+        response = await client.get("/api/contacts/", headers=headers)
+        return response.status_code
+
+    async def catalog():
+        _, headers = pick()
+        path = rng.choice(["/api/catalog/", "/api/products/"])
+        response = await client.get(path, headers=headers)
+        return response.status_code
+
+    return {"login": login, "inbox": inbox, "messages": messages, "contacts": contacts, "catalog": catalog}
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Scenarios whose latency rose, or throughput fell, by more than `threshold` percent."""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms"):
+            if previous[metric] and (current[metric] - previous[metric]) / previous[metric] * 100 > threshold:
+                regressions.append(f"{name}: {metric} {previous[metric]:.2f} -> {current[metric]:.2f}")
+        if previous["throughput_rps"] and (previous["throughput_rps"] - current["throughput_rps"]) / previous["throughput_rps"] * 100 > threshold:
+            regressions.append(f"{name}: throughput {previous['throughput_rps']:.0f} -> {current['throughput_rps']:.0f} req/s")
+        if current["errors"] > previous.get("errors", 0):
+            regressions.append(f"{name}: errors {previous.get('errors', 0)} -> {current['errors']}")
+    return regressions
+
+
+def print_report(results: Dict[str, Any], baseline: Optional[Dict[str, Any]]):
+    meta = results["meta"]
+    print(f"\n{meta['backend']} backend, {meta['seed']['organizations']} orgs x {meta['seed']['conversations']} conversations, "
+          f"{meta['requests']} requests per scenario at concurrency {meta['concurrency']}\n")
+    print(f"{'scenario':<10} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>7}")
+    for name, stats in results["scenarios"].items():
+        line = (f"{name:<10} {stats['throughput_rps']:>9.0f} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+                f"{stats['p99_ms']:>9.2f} {stats['max_ms']:>9.2f} {stats['errors']:>7}")
+        previous = (baseline or {}).get("scenarios", {}).get(name)
+        if previous and previous["p95_ms"]:
+            line += f"   p95 {(stats['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] * 100:+.1f}%"
+        print(line)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+async def run(args) -> Dict[str, Any]:
+    for key, value in BENCH_ENV.items():
+        os.environ.setdefault(key, value)
+    if args.mongodb_url:
+        os.environ["MONGODB_URL"] = args.mongodb_url
+
+    import httpx
+    from app import database
+    from app.main import app
+    from app.utils.auth import get_password_hash, create_access_token
+    from .seed import SeedConfig, seed, BENCH_PASSWORD
+
+    if args.mongodb_url:
+        mongo = database.connect()
+        await mongo.drop_database(database.settings.DATABASE_NAME)
+        await database.init_db(mongo)
+        backend = "mongodb"
+    else:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            sys.exit("mongomock-motor is not installed; pip install mongomock-motor or pass --mongodb-url")
+        database.client = AsyncMongoMockClient()
+        backend = "mongomock"
+
+    rng = random.Random(args.seed)
+    config = SeedConfig(
+        organizations=args.organizations,
+        conversations=args.conversations,
+        messages=args.messages,
+        contacts=args.contacts,
+        products=args.products,
+        customers=args.customers
+    )
+    started = time.perf_counter()
+    # bcrypt is slow on purpose; every seeded user shares one hash
+    organizations = await seed(database.get_database(), config, get_password_hash(BENCH_PASSWORD), rng)
+    print(f"Seeded {config.organizations} organizations in {time.perf_counter() - started:.1f}s")
+
+    users = {user["email"]: str(user["_id"]) async for user in database.get_database().users.find({}, {"email": 1})}
+    tokens = {email: create_access_token(user_id) for email, user_id in users.items()}
+
+    results: Dict[str, Any] = {
+        "meta": {
+            "backend": backend,
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": vars(config)
+        },
+        "scenarios": {}
+    }
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        scenarios = build_scenarios(client, organizations, tokens, rng)
+        for name in args.scenarios:
+            # Login verifies a bcrypt hash per request; fewer requests keep runs short
+            total = max(args.requests // 10, 1) if name == "login" else args.requests
+            results["scenarios"][name] = await run_scenario(scenarios[name], total, args.concurrency, args.warmup)
+
+    if args.mongodb_url:
+        await database.connect().drop_database(database.settings.DATABASE_NAME)
+        database.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API's hot paths in-process")
+    parser.add_argument("--mongodb-url", help="Benchmark against this MongoDB instead of mongomock (its bench database is dropped)")
+    parser.add_argument("--organizations", type=int, default=5)
+    parser.add_argument("--conversations", type=int, default=200, help="Per organization")
+    parser.add_argument("--messages", type=int, default=20, help="Per conversation")
+    parser.add_argument("--contacts", type=int, default=500, help="Per organization")
+    parser.add_argument("--products", type=int, default=100, help="Per organization")
+    parser.add_argument("--customers", type=int, default=100, help="Per organization")
+    parser.add_argument("--requests", type=int, default=500, help="Per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Compare with results previously written by --json")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Regression threshold in percent")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.json}")
+
+    if baseline:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nRegressions over {args.threshold:.0f}%:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions over {args.threshold:.0f}% against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Synthetic organizations for the benchmarks.
+
+Every organization gets an owner who can log in, customers, conversations
+with message histories, contacts and products, shaped like the documents
+the API and the Gmail ingest write.
+"""
+from typing import Dict, Any, List
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+import random
+
+from bson import ObjectId
+
+BENCH_PASSWORD = "bench-password"
+BATCH_SIZE = 1000
+
+
+@dataclass
+class SeedConfig:
+    organizations: int = 5
+    conversations: int = 200
+    messages: int = 20
+    contacts: int = 500
+    products: int = 100
+    customers: int = 100
+
+
+@dataclass
+class SeededOrganization:
+    organization_id: str
+    email: str
+    conversation_ids: List[str] = field(default_factory=list)
+
+
+async def insert_batched(collection, documents: List[Dict[str, Any]]):
+    for start in range(0, len(documents), BATCH_SIZE):
+        await collection.insert_many(documents[start:start + BATCH_SIZE], ordered=False)
+
+
+async def seed(db, config: SeedConfig, password_hash: str, rng: random.Random) -> List[SeededOrganization]:
+    """Insert `config.organizations` organizations into `db`. Returns what the scenarios need."""
+    now = datetime.utcnow()
+    seeded = []
+    for index in range(config.organizations):
+        user_id = ObjectId()
+        organization_id = ObjectId()
+        email = f"owner{index}@bench.example.com"
+        await db.users.insert_one({
+            "_id": user_id,
+            "email": email,
+            "first_name": "Bench",
+            "last_name": f"Owner {index}",
+            "hashed_password": password_hash,
+            "status": "active",
+            "organizations": [],
+            "preferences": {"theme": "light", "language": "en", "notifications": {}},
+            "created_at": now,
+            "updated_at": now
+        })
+        await db.organizations.insert_one({
+            "_id": organization_id,
+            "name": f"Bench Org {index}",
+            "industry": "retail",
+            "business_type": "b2c",
+            "size": "11-50",
+            "owner_id": user_id,
+            "created_at": now,
+            "updated_at": now
+        })
+        org = str(organization_id)
+        organization = SeededOrganization(organization_id=org, email=email)
+
+        customers = [
+            {
+                "_id": ObjectId(),
+                "organization_id": org,
+                "name": f"Customer {i}",
+                "email": f"customer{i}.{index}@mail.example.com",
+                "channels": [{"type": "email", "identifier": f"customer{i}.{index}@mail.example.com", "verified": False}],
+                "created_at": now,
+                "updated_at": now
+            }
+            for i in range(config.customers)
+        ]
+        await insert_batched(db.customers, customers)
+
+        conversations = []
+        messages = []
+        for i in range(config.conversations):
+            conversation_id = ObjectId()
+            customer = rng.choice(customers)
+            started = now - timedelta(minutes=rng.randint(60, 60 * 24 * 90))
+            conversations.append({
+                "_id": conversation_id,
+                "organization_id": org,
+                "customer_id": str(customer["_id"]),
+                "assigned_to": {"assistant_id": "", "team_member_id": ""},
+                "channel": {"type": "email", "identifier": customer["email"]},
+                "status": rng.choice(["active", "active", "pending", "resolved"]),
+                "metrics": {"response_time": 0.0, "resolution_time": 0.0, "customer_satisfaction": None},
+                "created_at": started,
+                "updated_at": started + timedelta(minutes=config.messages * 5)
+            })
+            for m in range(config.messages):
+                inbound = m % 2 == 0
+                messages.append({
+                    "conversation_id": str(conversation_id),
+                    "sender": {"type": "customer" if inbound else "team", "id": str(customer["_id"]) if inbound else str(user_id)},
+                    "content": {
+                        "type": "text",
+                        "body": f"Message {m} about order #{rng.randint(1000, 9999)}. " * rng.randint(1, 8),
+                        "attachments": []
+                    },
+                    "status": "delivered" if inbound else "sent",
+                    "created_at": started + timedelta(minutes=m * 5)
+                })
+            organization.conversation_ids.append(str(conversation_id))
+        await insert_batched(db.conversations, conversations)
+        await insert_batched(db.messages, messages)
+
+        await insert_batched(db.contacts, [
+            {
+                "name": f"Contact {i}",
+                "email": f"contact{i}.{index}@mail.example.com",
+                "phone": f"+1555{i:07d}",
+                "company": f"Company {i % 50}",
+                "notes": "",
+                "organization_id": org,
+                "status": "active",
+                "type": rng.choice(["lead", "customer"]),
+                "created_at": now,
+                "updated_at": now
+            }
+            for i in range(config.contacts)
+        ])
+
+        await insert_batched(db.products, [
+            {
+                "name": f"Product {i}",
+                "category": rng.choice(["product", "service"]),
+                "short_description": f"Product {i} for benchmarking",
+                "price_type": "fixed",
+                "price": round(rng.uniform(5, 500), 2),
+                "organization_id": org,
+                "status": "active",
+                "created_at": now,
+                "updated_at": now
+            }
+            for i in range(config.products)
+        ])
+        seeded.append(organization)
+    return seeded
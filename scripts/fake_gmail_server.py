@@ -0,0 +1,417 @@
+"""Local stand-in for the Google OAuth and Gmail endpoints the backend uses.
+
+Serves a synthetic mailbox per connected address so the Gmail integration
+(connect, watch, sync, backfill, send) can be exercised and load-tested
+without a network. Point the backend at it with:
+
+    GMAIL_API_BASE_URL=http://localhost:8025/gmail/v1
+    GOOGLE_TOKEN_URI=http://localhost:8025/token
+    GOOGLE_AUTH_URI=http://localhost:8025/o/oauth2/auth
+
+and run:
+
+    python scripts/fake_gmail_server.py --messages 100000 --latency-ms 50 --error-rate 0.01
+
+Latency and error injection can be changed at runtime through
+`PUT /_fake/config`. `POST /_fake/mailboxes/{email}/messages` delivers new
+mail and, with --push-url, posts a Pub/Sub-style notification to the
+backend webhook.
+"""
+from typing import Optional, Dict, Any, List
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+import argparse
+import asyncio
+import base64
+import json
+import random
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request, HTTPException, Form, Query
+from fastapi.responses import JSONResponse, RedirectResponse, Response
+from pydantic import BaseModel
+
+# Last history id kept; older startHistoryIds get a 404 like real Gmail
+HISTORY_RETENTION = 100000
+
+
+class FakeConfig(BaseModel):
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+    rate_limit_rate: float = 0.0
+    messages: int = 1000
+    threads: int = 200
+    attachment_rate: float = 0.05
+    attachment_bytes: int = 256 * 1024
+    default_email: str = "support@example.com"
+    push_url: Optional[str] = None
+    seed: int = 42
+
+
+def encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+class Mailbox:
+    """A synthetic mailbox with a linear history of added messages."""
+
+    def __init__(self, email: str, config: FakeConfig):
+        self.email = email
+        self.config = config
+        self.random = random.Random(f"{config.seed}:{email}")
+        self.messages: Dict[str, Dict[str, Any]] = {}
+        self.order: List[str] = []
+        self.history: List[Dict[str, Any]] = []
+        self.history_id = 1000
+        # Spread the generated mail over the last 60 days
+        start = datetime.utcnow() - timedelta(days=60)
+        step = timedelta(days=60) / max(config.messages, 1)
+        for index in range(config.messages):
+            self.add_inbound(
+                thread=f"t{self.random.randrange(config.threads):06d}",
+                sent_at=start + step * index
+            )
+
+    def add_message(self, message: Dict[str, Any]):
+        self.history_id += 1
+        message["historyId"] = str(self.history_id)
+        self.messages[message["id"]] = message
+        self.order.append(message["id"])
+        self.history.append({
+            "id": str(self.history_id),
+            "messagesAdded": [{"message": {"id": message["id"], "threadId": message["threadId"]}}]
+        })
+        if len(self.history) > HISTORY_RETENTION:
+            self.history = self.history[-HISTORY_RETENTION:]
+
+    def add_inbound(self, thread: Optional[str] = None, sent_at: Optional[datetime] = None, subject: Optional[str] = None, body: Optional[str] = None) -> Dict[str, Any]:
+        index = len(self.order)
+        customer = self.random.randrange(max(self.config.threads // 2, 1))
+        sent_at = sent_at or datetime.utcnow()
+        thread = thread or f"t{index:06d}n"
+        message_id = f"{index:08x}{self.random.getrandbits(32):08x}"
+        text = body or f"Hello, this is message {index} about order #{self.random.randrange(100000)}."
+        parts = [{
+            "partId": "0",
+            "mimeType": "text/plain",
+            "filename": "",
+            "headers": [{"name": "Content-Type", "value": "text/plain; charset=UTF-8"}],
+            "body": {"size": len(text), "data": encode(text.encode())}
+        }]
+        if self.random.random() < self.config.attachment_rate:
+            parts.append({
+                "partId": "1",
+                "mimeType": "application/pdf",
+                "filename": f"invoice-{index}.pdf",
+                "headers": [],
+                "body": {"size": self.config.attachment_bytes, "attachmentId": f"att-{message_id}"}
+            })
+
+        message = {
+            "id": message_id,
+            "threadId": thread,
+            "labelIds": ["INBOX", "UNREAD"],
+            "snippet": text[:100],
+            "internalDate": str(int(sent_at.timestamp() * 1000)),
+            "sizeEstimate": len(text),
+            "payload": {
+                "mimeType": "multipart/mixed",
+                "filename": "",
+                "headers": [
+                    {"name": "From", "value": f"Customer {customer} <customer{customer}@example.net>"},
+                    {"name": "To", "value": self.email},
+                    {"name": "Subject", "value": subject or f"Question {thread}"},
+                    {"name": "Message-ID", "value": f"<{message_id}@example.net>"},
+                    {"name": "Date", "value": sent_at.strftime("%a, %d %b %Y %H:%M:%S +0000")}
+                ],
+                "body": {"size": 0},
+                "parts": parts
+            }
+        }
+        self.add_message(message)
+        return message
+
+    def add_sent(self, raw: str, thread_id: Optional[str]) -> Dict[str, Any]:
+        index = len(self.order)
+        message = {
+            "id": f"{index:08x}{self.random.getrandbits(32):08x}",
+            "threadId": thread_id or f"t{index:06d}s",
+            "labelIds": ["SENT"],
+            "snippet": "",
+            "internalDate": str(int(time.time() * 1000)),
+            "sizeEstimate": len(raw),
+            "payload": {
+                "mimeType": "text/plain",
+                "filename": "",
+                "headers": [{"name": "From", "value": self.email}],
+                "body": {"size": len(raw), "data": raw}
+            }
+        }
+        self.add_message(message)
+        return message
+
+
+class FakeGmail:
+    def __init__(self, config: FakeConfig):
+        self.config = config
+        self.mailboxes: Dict[str, Mailbox] = {}
+        self.stats: Dict[str, int] = {}
+
+    def mailbox(self, email: str) -> Mailbox:
+        if email not in self.mailboxes:
+            self.mailboxes[email] = Mailbox(email, self.config)
+        return self.mailboxes[email]
+
+    def issue_tokens(self, email: str) -> Dict[str, Any]:
+        return {
+            "access_token": f"fake-access.{email}.{random.getrandbits(64):016x}",
+            "refresh_token": f"fake-refresh.{email}",
+            "expires_in": 3599,
+            "scope": "https://www.googleapis.com/auth/gmail.modify",
+            "token_type": "Bearer"
+        }
+
+    def authorize(self, request: Request) -> Mailbox:
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        # Tokens carry their mailbox, so they stay valid across server restarts
+        prefix, _, rest = token.partition(".")
+        email = rest.rpartition(".")[0]
+        if prefix != "fake-access" or not email:
+            raise HTTPException(status_code=401, detail="Invalid Credentials")
+        return self.mailbox(email)
+
+
+def create_app(config: FakeConfig) -> FastAPI:
+    app = FastAPI(title="Fake Gmail")
+    fake = FakeGmail(config)
+    app.state.fake = fake
+
+    @app.middleware("http")
+    async def inject_faults(request: Request, call_next):
+        fake.stats[request.url.path] = fake.stats.get(request.url.path, 0) + 1
+        if request.url.path.startswith("/_fake"):
+            return await call_next(request)
+
+        delay = config.latency_ms + random.uniform(0, config.jitter_ms)
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        roll = random.random()
+        if roll < config.rate_limit_rate:
+            return JSONResponse(
+                status_code=429,
+                headers={"Retry-After": "1"},
+                content={"error": {"code": 429, "message": "User-rate limit exceeded"}}
+            )
+        if roll < config.rate_limit_rate + config.error_rate:
+            return JSONResponse(
+                status_code=config.error_status,
+                content={"error": {"code": config.error_status, "message": "Injected failure"}}
+            )
+        return await call_next(request)
+
+    @app.exception_handler(HTTPException)
+    async def gmail_error(request: Request, exc: HTTPException):
+        # Gmail-shaped error bodies
+        return JSONResponse(
+            status_code=exc.status_code,
+            content={"error": {"code": exc.status_code, "message": exc.detail}}
+        )
+
+    # OAuth
+
+    @app.get("/o/oauth2/auth")
+    async def authorize(
+        redirect_uri: str,
+        state: Optional[str] = None,
+        login_hint: Optional[str] = None
+    ):
+        """Consent screen that approves immediately."""
+        params = {"code": f"fake-code.{login_hint or config.default_email}"}
+        if state:
+            params["state"] = state
+        return RedirectResponse(f"{redirect_uri}?{urlencode(params)}")
+
+    @app.post("/token")
+    async def token(
+        grant_type: str = Form(...),
+        code: Optional[str] = Form(None),
+        refresh_token: Optional[str] = Form(None)
+    ):
+        if grant_type == "authorization_code" and code and code.startswith("fake-code."):
+            return fake.issue_tokens(code.removeprefix("fake-code."))
+        if grant_type == "refresh_token" and refresh_token and refresh_token.startswith("fake-refresh."):
+            return fake.issue_tokens(refresh_token.removeprefix("fake-refresh."))
+        return JSONResponse(
+            status_code=400,
+            content={"error": "invalid_grant", "error_description": "Token has been expired or revoked."}
+        )
+
+    # Gmail API
+
+    @app.get("/gmail/v1/users/me/profile")
+    async def profile(request: Request):
+        mailbox = fake.authorize(request)
+        return {
+            "emailAddress": mailbox.email,
+            "messagesTotal": len(mailbox.order),
+            "threadsTotal": config.threads,
+            "historyId": str(mailbox.history_id)
+        }
+
+    @app.post("/gmail/v1/users/me/watch")
+    async def watch(request: Request):
+        mailbox = fake.authorize(request)
+        expiration = datetime.utcnow() + timedelta(days=7)
+        return {
+            "historyId": str(mailbox.history_id),
+            "expiration": str(int(expiration.timestamp() * 1000))
+        }
+
+    @app.post("/gmail/v1/users/me/stop")
+    async def stop(request: Request):
+        fake.authorize(request)
+        return Response(status_code=204)
+
+    @app.get("/gmail/v1/users/me/history")
+    async def history(
+        request: Request,
+        startHistoryId: int,
+        pageToken: Optional[str] = None,
+        maxResults: int = Query(100, le=500)
+    ):
+        mailbox = fake.authorize(request)
+        if mailbox.history and startHistoryId < int(mailbox.history[0]["id"]) - 1:
+            raise HTTPException(status_code=404, detail="Requested entity was not found.")
+        records = [record for record in mailbox.history if int(record["id"]) > startHistoryId]
+        offset = int(pageToken or 0)
+        page = records[offset:offset + maxResults]
+        response = {"history": page, "historyId": str(mailbox.history_id)}
+        if offset + maxResults < len(records):
+            response["nextPageToken"] = str(offset + maxResults)
+        return response
+
+    @app.get("/gmail/v1/users/me/messages")
+    async def list_messages(
+        request: Request,
+        q: Optional[str] = None,
+        pageToken: Optional[str] = None,
+        maxResults: int = Query(100, le=500)
+    ):
+        mailbox = fake.authorize(request)
+        offset = int(pageToken or 0)
+        # Newest first, like Gmail; the search query is ignored
+        ids = mailbox.order[::-1][offset:offset + maxResults]
+        response = {
+            "messages": [{"id": message_id, "threadId": mailbox.messages[message_id]["threadId"]} for message_id in ids],
+            "resultSizeEstimate": len(mailbox.order)
+        }
+        if offset + maxResults < len(mailbox.order):
+            response["nextPageToken"] = str(offset + maxResults)
+        return response
+
+    @app.get("/gmail/v1/users/me/messages/{message_id}")
+    async def get_message(request: Request, message_id: str, format: str = "full"):
+        mailbox = fake.authorize(request)
+        message = mailbox.messages.get(message_id)
+        if not message:
+            raise HTTPException(status_code=404, detail="Requested entity was not found.")
+        if format == "minimal":
+            return {key: message[key] for key in ("id", "threadId", "labelIds", "historyId", "internalDate")}
+        return message
+
+    @app.get("/gmail/v1/users/me/messages/{message_id}/attachments/{attachment_id}")
+    async def get_attachment(request: Request, message_id: str, attachment_id: str):
+        mailbox = fake.authorize(request)
+        if message_id not in mailbox.messages or attachment_id != f"att-{message_id}":
+            raise HTTPException(status_code=404, detail="Requested entity was not found.")
+        data = random.Random(attachment_id).randbytes(config.attachment_bytes)
+        return {"attachmentId": attachment_id, "size": len(data), "data": encode(data)}
+
+    @app.post("/gmail/v1/users/me/messages/send")
+    async def send(request: Request):
+        mailbox = fake.authorize(request)
+        body = await request.json()
+        if not body.get("raw"):
+            raise HTTPException(status_code=400, detail="Invalid raw message")
+        message = mailbox.add_sent(body["raw"], body.get("threadId"))
+        return {"id": message["id"], "threadId": message["threadId"], "labelIds": message["labelIds"]}
+
+    # Test controls
+
+    @app.get("/_fake/config")
+    async def get_config():
+        return config
+
+    @app.put("/_fake/config")
+    async def update_config(updates: Dict[str, Any]):
+        for key, value in updates.items():
+            if hasattr(config, key):
+                setattr(config, key, value)
+        return config
+
+    @app.get("/_fake/stats")
+    async def stats():
+        return {
+            "requests": fake.stats,
+            "mailboxes": {email: len(mailbox.order) for email, mailbox in fake.mailboxes.items()}
+        }
+
+    @app.post("/_fake/mailboxes/{email}/messages")
+    async def deliver(email: str, count: int = Query(1, ge=1, le=10000), thread_id: Optional[str] = None):
+        """Deliver new inbound mail and notify the backend like Pub/Sub would."""
+        mailbox = fake.mailbox(email)
+        messages = [mailbox.add_inbound(thread=thread_id) for _ in range(count)]
+        if config.push_url:
+            data = json.dumps({"emailAddress": email, "historyId": mailbox.history_id})
+            envelope = {
+                "message": {"data": base64.b64encode(data.encode()).decode(), "messageId": str(mailbox.history_id)},
+                "subscription": "projects/fake/subscriptions/gmail"
+            }
+            async with httpx.AsyncClient() as client:
+                await client.post(config.push_url, json=envelope)
+        return {"delivered": [message["id"] for message in messages], "historyId": str(mailbox.history_id)}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Gmail and Google OAuth server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--messages", type=int, default=1000, help="Messages generated per mailbox")
+    parser.add_argument("--threads", type=int, default=200, help="Threads per mailbox")
+    parser.add_argument("--attachment-rate", type=float, default=0.05)
+    parser.add_argument("--attachment-bytes", type=int, default=256 * 1024)
+    parser.add_argument("--email", default="support@example.com", help="Mailbox granted by the consent screen")
+    parser.add_argument("--push-url", help="Backend webhook, e.g. http://localhost:8000/api/webhooks/gmail?token=...")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    config = FakeConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        rate_limit_rate=args.rate_limit_rate,
+        messages=args.messages,
+        threads=args.threads,
+        attachment_rate=args.attachment_rate,
+        attachment_bytes=args.attachment_bytes,
+        default_email=args.email,
+        push_url=args.push_url,
+        seed=args.seed
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Profile the API's cold start with `python -X importtime`.
+
+Imports the app in a fresh interpreter (several times, to smooth out disk
+cache effects) and reports the slowest modules by cumulative and self
+time, plus totals per top-level package:
+
+    python scripts/import_profile.py
+    python scripts/import_profile.py --module app.main --runs 5 --top 30 --json import_profile.json
+
+The app's settings must be resolvable (e.g. a .env file), as for a normal start.
+"""
+from typing import Dict, List, Any
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+def profile_once(module: str) -> Dict[str, Any]:
+    """Import `module` in a child interpreter and parse its importtime output."""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    modules: Dict[str, Dict[str, int]] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        modules[name] = {"self_us": int(self_us), "cumulative_us": int(cumulative_us)}
+    return {"wall_seconds": wall, "modules": modules}
+
+
+def summarize(runs: List[Dict[str, Any]], module: str, top: int) -> Dict[str, Any]:
+    names = set().union(*(run["modules"] for run in runs))
+    medians = {}
+    for name in names:
+        samples = [run["modules"][name] for run in runs if name in run["modules"]]
+        medians[name] = {
+            "self_ms": statistics.median(sample["self_us"] for sample in samples) / 1000,
+            "cumulative_ms": statistics.median(sample["cumulative_us"] for sample in samples) / 1000
+        }
+
+    packages: Dict[str, float] = {}
+    for name, timing in medians.items():
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0.0) + timing["self_ms"]
+
+    return {
+        "module": module,
+        "runs": len(runs),
+        "wall_ms": statistics.median(run["wall_seconds"] for run in runs) * 1000,
+        "import_ms": medians.get(module, {}).get("cumulative_ms", 0.0),
+        "modules_imported": len(names),
+        "slowest_cumulative": sorted(
+            ({"module": name, **timing} for name, timing in medians.items()),
+            key=lambda item: item["cumulative_ms"],
+            reverse=True
+        )[:top],
+        "slowest_self": sorted(
+            ({"module": name, **timing} for name, timing in medians.items()),
+            key=lambda item: item["self_ms"],
+            reverse=True
+        )[:top],
+        "packages": dict(sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top])
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"\nImport profile for {report['module']} (median of {report['runs']} runs)")
+    print(f"  interpreter start + import: {report['wall_ms']:.0f} ms")
+    print(f"  import {report['module']}: {report['import_ms']:.0f} ms across {report['modules_imported']} modules")
+
+    print("\nTop-level packages by self time:")
+    for package, ms in report["packages"].items():
+        print(f"  {ms:9.1f} ms  {package}")
+
+    print("\nSlowest modules, cumulative:")
+    for item in report["slowest_cumulative"]:
+        print(f"  {item['cumulative_ms']:9.1f} ms  {item['module']}")
+
+    print("\nSlowest modules, self:")
+    for item in report["slowest_self"]:
+        print(f"  {item['self_ms']:9.1f} ms  {item['module']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time profile of the API")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    runs = [profile_once(args.module) for _ in range(args.runs)]
+    report = summarize(runs, args.module, args.top)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
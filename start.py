@@ -1,36 +1,56 @@
 import os
 import sys
 import logging
+import importlib.util
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+def available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def worker_count() -> int:
+    """WEB_CONCURRENCY if set, else one worker per CPU this container may use."""
+    if os.getenv("WEB_CONCURRENCY"):
+        return max(int(os.environ["WEB_CONCURRENCY"]), 1)
+    try:
+        return max(len(os.sched_getaffinity(0)), 1)
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
 if __name__ == "__main__":
     try:
-        # Log the current directory and its contents
-        logger.info(f"Current directory: {os.getcwd()}")
-        logger.info("Directory contents:")
-        for file in os.listdir():
-            logger.info(f"- {file}")
-            
-        # Also log the contents of the app directory
-        logger.info("App directory contents:")
-        for file in os.listdir('app'):
-            logger.info(f"- {file}")
-        
         # Add the app directory to Python path
         sys.path.append(os.path.join(os.getcwd(), 'app'))
-        
+
         # Import uvicorn here to catch import errors
         import uvicorn
-        
+
         # Get the port number
         port = int(os.getenv("PORT", 8000))
-        logger.info(f"Starting server on port {port}")
-        
-        # Try to run the server with the correct path
-        uvicorn.run("app.main:app", host="0.0.0.0", port=port, reload=False)
+        workers = worker_count()
+        # Faster event loop and HTTP parser when installed (uvicorn[standard])
+        loop = "uvloop" if available("uvloop") else "asyncio"
+        http = "httptools" if available("httptools") else "h11"
+        graceful_timeout = int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", 30))
+        logger.info(f"Starting server on port {port} with {workers} workers ({loop}, {http})")
+
+        # Each worker imports the app itself and opens its own Mongo client in the lifespan
+        uvicorn.run(
+            "app.main:app",
+            host="0.0.0.0",
+            port=port,
+            workers=workers,
+            loop=loop,
+            http=http,
+            reload=False,
+            proxy_headers=True,
+            timeout_graceful_shutdown=graceful_timeout
+        )
     except Exception as e:
         logger.error(f"Failed to start server: {str(e)}")
-        sys.exit(1) 
\ No newline at end of file
+        sys.exit(1)